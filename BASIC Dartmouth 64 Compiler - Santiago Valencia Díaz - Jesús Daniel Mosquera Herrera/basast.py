@@ -108,6 +108,7 @@ class Def(Statement):
     fn: str
     ident: str
     expr: Expression
+    slot: Optional[int] = field(default=None, compare=False, repr=False)
 
 @dataclass
 class Call(Statement):
@@ -144,6 +145,7 @@ class Variable(Expression):
     var  : str
     dim1 : Optional[Expression] = None
     dim2 : Optional[Expression] = None
+    slot : Optional[int] = field(default=None, compare=False, repr=False)
 
 @dataclass
 class Bltin(Expression):
@@ -0,0 +1,535 @@
+# bascompile.py
+
+'''
+Compilador a clausuras para BASIC DARTMOUTH 64
+
+Recorre el AST una sola vez y convierte cada instrucción y cada expresión en
+una clausura de Python ya enlazada. El ciclo principal del intérprete solo
+tiene que llamar a esas clausuras, sin resolver el tipo del nodo (multimethod)
+en cada evaluación.
+'''
+
+import math
+import operator
+
+from typing import Union
+
+from basast import *
+from basinterp import BasicExit, BasicArray, LoopFrame, _enter_loop, _whole, _flatten
+from bastypes import TypeInference, NUM, STR, typeof
+
+# Tipos numéricos válidos para las operaciones aritméticas
+NUMERIC = (int, float)
+
+# Operadores numéricos
+NUMERIC_OPS = {
+    '+' : operator.add,
+    '-' : operator.sub,
+    '*' : operator.mul,
+    '/' : operator.truediv,
+    '^' : math.pow,
+    '=' : operator.eq,
+    '<>': operator.ne,
+    '<' : operator.lt,
+    '<=': operator.le,
+    '>' : operator.gt,
+    '>=': operator.ge,
+}
+
+# Operadores válidos entre strings
+STRING_OPS = {
+    '+' : operator.add,
+    '=' : operator.eq,
+    '<>': operator.ne,
+    '<' : operator.lt,
+    '<=': operator.le,
+    '>' : operator.gt,
+    '>=': operator.ge,
+}
+
+
+class Compiler(Visitor):
+    '''
+    Convierte el programa en una lista de clausuras, una por cada línea en
+    el orden de interp.stat. Las clausuras de expresiones devuelven su valor
+    y las de instrucciones modifican el estado del intérprete.
+    '''
+    def __init__(self, interp):
+        self.interp = interp
+        self.lineno = None
+        self.pc = None
+
+    @classmethod
+    def compile(cls, interp):
+        TypeInference.infer(interp.prog, interp.slicing)
+        compiler = cls(interp)
+        code = []
+        for pc, lineno in enumerate(interp.stat):
+            compiler.pc = pc
+            compiler.lineno = lineno
+            code.append(interp.prog[lineno].accept(compiler))
+        return code
+
+    # Asignaciones
+    def store(self, target: Variable):
+        '''
+        Devuelve una clausura que recibe un valor y lo guarda en la variable,
+        lista o tabla indicada por target
+        '''
+        interp = self.interp
+        lineno = self.lineno
+        name = target.var
+        slot = target.slot
+        slots = interp.slots
+        array_base = interp.array_base
+
+        if target.dim1 is None and target.dim2 is None:
+            def store_var(value):
+                slots[slot] = value
+            return store_var
+
+        # Si la lista o tabla no fue declarada con DIM, se crea de tamaño 10
+        elif target.dim2 is None:
+            dim1 = target.dim1.accept(self)
+            def store_list(value):
+                i = int(dim1()) - array_base
+                values = slots[slot]
+                if values is None:
+                    values = slots[slot] = BasicArray(name, array_base, 10)
+                if i < 0 or i >= values.rows:
+                    interp.error(f'Index of {name} is out of bounds at line {lineno}')
+                try:
+                    values.data[i] = value
+                except TypeError:
+                    interp.error(f"Type mismatch in {name} at line {lineno}")
+            return store_list
+
+        else:
+            dim1 = target.dim1.accept(self)
+            dim2 = target.dim2.accept(self)
+            def store_table(value):
+                i = int(dim1()) - array_base
+                j = int(dim2()) - array_base
+                table = slots[slot]
+                if table is None:
+                    table = slots[slot] = BasicArray(name, array_base, 10, 10)
+                if i < 0 or i >= table.rows or j < 0 or j >= table.cols:
+                    interp.error(f'Indexes of {name} are out of bounds at line {lineno}')
+                try:
+                    table.data[i * table.cols + j] = value
+                except TypeError:
+                    interp.error(f"Type mismatch in {name} at line {lineno}")
+            return store_table
+
+    # Instrucciones
+    def visit(self, instr: Let):
+        interp = self.interp
+        lineno = self.lineno
+        if interp.slicing:
+            def let():
+                interp.error(f"Cannot proceed with LET instruction at line {lineno}. String slicing might be enabled.")
+            return let
+
+        store = self.store(instr.var)
+        expr = instr.expr.accept(self)
+        def let():
+            store(expr())
+        return let
+
+    def visit(self, instr: Read):
+        interp = self.interp
+        lineno = self.lineno
+        targets = []
+        for target in instr.varlist:
+            targets.append((target.var[-1] == '$', self.store(target)))
+
+        def read():
+            for is_string, store in targets:
+                if interp.dc >= len(interp.data):
+                    # No hay más datos para procesar. El programa termina de ejecutarse
+                    raise BasicExit('out_of_data')
+                value = interp.data[interp.dc]
+                if is_string:
+                    if interp.slicing:
+                        interp.error(f"Cannot proceed with READ instruction at line {lineno}. String slicing might be enabled.")
+                    value = value if isinstance(value, str) else str(value)
+                else:
+                    try:
+                        value = float(value)
+                    except ValueError:
+                        interp.error(f"The value {value} could not be read.")
+                store(value)
+                interp.dc += 1
+        return read
+
+    def visit(self, instr: Restore):
+        interp = self.interp
+        def restore():
+            interp.dc = 0
+        return restore
+
+    def visit(self, instr: Union[Data, Remark]):
+        def nop():
+            pass
+        return nop
+
+    def visit(self, instr: Print):
+        interp = self.interp
+        lineno = self.lineno
+        tabs = interp.tabs
+        output = interp.output
+        write = output.write
+        pad = output.pad
+        items = _flatten(instr.plist)
+
+        parts = []
+        for pitem in items:
+            if not pitem:
+                continue
+            if pitem == ',':
+                parts.append((',', None))
+            elif pitem == ';':
+                continue  # ';' no agrega espacio
+            elif isinstance(pitem, str):
+                parts.append(('str', pitem))
+            else:
+                parts.append(('expr', pitem.accept(self)))
+
+        newline = (not instr.plist) or instr.plist[-1] not in (',', ';')
+
+        def print_():
+            for kind, value in parts:
+                if kind == 'expr':
+                    value = value()
+                    if isinstance(value, str):
+                        write(value)
+                    elif isinstance(value, NUMERIC):
+                        write(f'{value:g}')
+                    else:
+                        interp.error(f"Unexpected element {value} inside PRINT instruction at line {lineno}")
+                elif kind == 'str':
+                    write(value)
+                elif kind == ',':
+                    pad(tabs)
+            if newline:
+                output.newline()
+        return print_
+
+    def visit(self, instr: Input):
+        interp = self.interp
+        lineno = self.lineno
+        label = instr.label
+        targets = [(variable, self.store(variable)) for variable in instr.vlist]
+
+        def input_():
+            interp.input_prompt(label)
+            for variable, store in targets:
+                store(interp.input_value(variable.var, lineno))
+        return input_
+
+    def jump(self, newline):
+        '''
+        Devuelve una clausura que retorna el destino ya resuelto en interp.jumps
+        '''
+        interp = self.interp
+        lineno = self.lineno
+        target = interp.jumps[self.pc]
+        if target is None:
+            def undefined():
+                interp.error(f"Undefined line {newline} in GOTO instruction, located at line {lineno}")
+            return undefined
+
+        def jump():
+            return target
+        return jump
+
+    def visit(self, instr: Goto):
+        return self.jump(instr.lineno)
+
+    def visit(self, instr: IfStatement):
+        relexpr = instr.relexpr.accept(self)
+        jump = self.jump(instr.lineno)
+        def if_():
+            if relexpr():
+                return jump()
+        return if_
+
+    def visit(self, instr: For):
+        pc = self.pc
+        loopvar = instr.ident.slot
+        slots = self.interp.slots
+        initval = instr.low.accept(self)
+        finval = instr.top.accept(self)
+        stepval = instr.step.accept(self) if instr.step is not None else (lambda: 1)
+        loops = self.interp.loops
+
+        def for_():
+            # Límite y salto se evalúan una sola vez al entrar al ciclo
+            slots[loopvar] = initval()
+            _enter_loop(loops, LoopFrame(pc, loopvar, finval(), stepval()))
+        return for_
+
+    def visit(self, instr: Next):
+        interp = self.interp
+        lineno = self.lineno
+        nextvar = instr.ident.slot
+        slots = interp.slots
+        loops = interp.loops
+
+        def next_():
+            # Descartar los ciclos abandonados con GOTO hasta encontrar el FOR correspondiente
+            while loops and loops[-1].var != nextvar:
+                loops.pop()
+            if not loops:
+                interp.output.message(f"NEXT without FOR at line {lineno}")
+                return
+            frame = loops[-1]
+            newvalue = slots[nextvar] + frame.step
+            if (newvalue >= frame.limit) if frame.down else (newvalue <= frame.limit):
+                # Volver a la primera instrucción del cuerpo del ciclo
+                slots[nextvar] = newvalue
+                return frame.pc + 1
+            else:
+                # El ciclo se ha completado
+                loops.pop()
+        return next_
+
+    def visit(self, instr: Union[End, Stop]):
+        interp = self.interp
+        pc = self.pc
+        def end():
+            interp.pc = pc   # run_compiled lleva el contador en una variable local
+            interp.end_program()
+        return end
+
+    def visit(self, instr: Def):
+        interp = self.interp
+        fname = instr.fn
+        pslot = instr.slot
+        expr = instr.expr.accept(self)
+        slots = interp.slots
+        functions = interp.functions
+
+        def eval_func(pvalue):
+            slots[pslot] = pvalue # Asignar el parámetro a su valor respectivo
+            return expr()         # Evaluar la expresión de la función
+
+        def def_():
+            functions[fname] = eval_func
+        return def_
+
+    def visit(self, instr: GoSub):
+        interp = self.interp
+        lineno = self.lineno
+        retpc = self.pc + 1
+        jump = self.jump(instr.lineno)
+        stack = interp.gosub
+        depth = interp.gosub_depth
+        def gosub():
+            if len(stack) >= depth:
+                interp.error(f"GOSUB nested more than {depth} levels at line {lineno}")
+            target = jump()
+            stack.append(retpc)
+            return target
+        return gosub
+
+    def visit(self, instr: Return):
+        interp = self.interp
+        lineno = self.lineno
+        stack = interp.gosub
+        def return_():
+            if not stack:
+                interp.output.message(f"RETURN without GOSUB at line {lineno}")
+                return
+            return stack.pop()
+        return return_
+
+    def visit(self, instr: Dim):
+        interp = self.interp
+        lineno = self.lineno
+        items = []
+        for item in instr.dimlist:
+            dim1 = item.dim1.accept(self)
+            dim2 = item.dim2.accept(self) if item.dim2 is not None else None
+            items.append((item.var, item.slot, dim1, dim2))
+        slots = interp.slots
+        array_base = interp.array_base
+
+        def dim():
+            for name, slot, dim1, dim2 in items:
+                if interp.slicing:
+                    interp.error(f"The dimension at line {lineno} could not be initialized. String slicing might be enabled.")
+                if dim2 is None:
+                    # Variable de una dimensión
+                    slots[slot] = BasicArray(name, array_base, dim1())
+                else:
+                    # Variable de doble dimensión
+                    slots[slot] = BasicArray(name, array_base, dim1(), dim2())
+        return dim
+
+    # Expresiones
+    def visit(self, instr: Group):
+        # Los paréntesis no generan ninguna clausura adicional
+        return instr.expr.accept(self)
+
+    def visit(self, instr: Bltin):
+        interp = self.interp
+        name = instr.name
+        expr = instr.expr
+
+        # Implementación propia para MID$()
+        if name in ('MID$', 'mid$'):
+            if isinstance(expr, list) and len(expr) == 3:
+                str_val, start, length = (e.accept(self) for e in expr)
+                def mid():
+                    s = _whole(start())
+                    return str_val()[s - 1 : s - 1 + _whole(length())]
+                return mid
+            def mid():
+                interp.error("Incorrect parameters for MID$")
+            return mid
+
+        if name not in interp.functions:
+            def undefined():
+                interp.error(f"Undefined function {name}")
+            return undefined
+        func = interp.functions[name]
+
+        # Si la función no cuenta con argumentos, como la función TIME()
+        if expr is None:
+            return func
+
+        if isinstance(expr, Node):
+            expr = [expr]
+        args = [e.accept(self) for e in expr]
+        if len(args) == 1:
+            arg, = args
+            return lambda: func(arg())
+        if len(args) == 2:
+            arg1, arg2 = args
+            return lambda: func(arg1(), arg2())
+        return lambda: func(*[arg() for arg in args])
+
+    def visit(self, instr: Call):
+        interp = self.interp
+        name = instr.name
+        expr = instr.expr
+        if isinstance(expr, Node):
+            expr = [expr]
+        args = [e.accept(self) for e in expr]
+        functions = interp.functions
+
+        def call():
+            values = [arg() for arg in args]
+            if name not in functions:
+                interp.error(f"Undefined function {name}")
+            return functions[name](*values)
+        return call
+
+    def visit(self, instr: Variable):
+        interp = self.interp
+        lineno = self.lineno
+        name = instr.var
+        slot = instr.slot
+        slots = interp.slots
+
+        if instr.dim1 is None and instr.dim2 is None:
+            def load_var():
+                value = slots[slot]
+                if value is None:
+                    interp.error(f"Undefined variable '{name}' at line {lineno}")
+                return value
+            return load_var
+
+        # Evaluación de arreglo unidimensional (lista)
+        elif instr.dim2 is None:
+            dim1 = instr.dim1.accept(self)
+            array_base = interp.array_base
+            def load_list():
+                values = slots[slot]
+                if values is None:
+                    interp.error(f"Undefined variable '{name}' at line {lineno}")
+                i = int(dim1()) - array_base
+                if i < 0 or i >= values.rows:
+                    interp.error(f'Index of {name} is out of bounds at line {lineno}')
+                return values.data[i]
+            return load_list
+
+        else:
+            dim1 = instr.dim1.accept(self)
+            dim2 = instr.dim2.accept(self)
+            array_base = interp.array_base
+            def load_table():
+                table = slots[slot]
+                if table is None:
+                    interp.error(f"Undefined variable '{name}' at line {lineno}")
+                i = int(dim1()) - array_base
+                j = int(dim2()) - array_base
+                if i < 0 or i >= table.rows or j < 0 or j >= table.cols:
+                    interp.error(f'Indexes of {name} are out of bounds at line {lineno}')
+                return table.data[i * table.cols + j]
+            return load_table
+
+    def visit(self, instr: Union[Binary, Logical]):
+        interp = self.interp
+        op = instr.op
+        left = instr.left.accept(self)
+        right = instr.right.accept(self)
+
+        if op not in NUMERIC_OPS:
+            def binary():
+                left(); right()
+                interp.error(f"Incorrect operator {op}")
+            return binary
+
+        numop = NUMERIC_OPS[op]
+        strop = STRING_OPS.get(op)
+
+        # Operandos con tipo probado por la inferencia: sin chequeos
+        kind = typeof(instr.left)
+        if kind == typeof(instr.right) == NUM:
+            return lambda: numop(left(), right())
+        if kind == typeof(instr.right) == STR and strop is not None:
+            return lambda: strop(left(), right())
+
+        def binary():
+            l = left()
+            r = right()
+            # Operación entre strings
+            if isinstance(l, str) and isinstance(r, str):
+                if strop is None:
+                    interp.error(f"Incorrect operator {op}")
+                return strop(l, r)
+            # Operación entre valores numéricos
+            if not (isinstance(l, NUMERIC) and isinstance(r, NUMERIC)):
+                interp.error(f"{op} The operands must be numeric")
+            return numop(l, r)
+        return binary
+
+    def visit(self, instr: Unary):
+        interp = self.interp
+        op = instr.op
+        expr = instr.expr.accept(self)
+        if op != '-':
+            return lambda: None
+        if typeof(instr.expr) == NUM:
+            return lambda: - expr()
+
+        def negate():
+            value = expr()
+            if not isinstance(value, NUMERIC):
+                interp.error(f"{op} The operand isn't numeric")
+            return - value
+        return negate
+
+    def visit(self, instr: Literal):
+        value = instr.value
+        return lambda: value
+
+    def visit(self, instr: Node):
+        output = self.interp.output
+        lineno = self.lineno
+        name = instr.__class__.__name__
+        def unknown():
+            output.message(f"{lineno} {name}")
+        return unknown
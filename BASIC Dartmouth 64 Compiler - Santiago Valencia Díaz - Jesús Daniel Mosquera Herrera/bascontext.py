@@ -4,14 +4,21 @@
 # programa en Basic.  Sirve como depósito de información sobre el programa, incluido el 
 # código fuente, informes de errores, etc.
 
-from rich      import print
+import sys
+import hashlib
 from contextlib import redirect_stdout
 
 from baslex    import Lexer
 from basparse  import Parser
-from basinterp import Interpreter
+from basinterp import Interpreter, BasicExit, RunConfig, CompiledProgram, timed
+from basresolve import Resolver
 from basast    import *
-from basrender import DotRender
+
+# rich, graphviz (basrender) y los backends opcionales se importan solo en
+# las opciones que los usan; una ejecución normal no paga su importación
+def print(*args, **kwargs):
+  from rich import print as rich_print
+  rich_print(*args, **kwargs)
 
 class Context:
   def __init__(self):
@@ -20,7 +27,10 @@ class Context:
     self.interp = Interpreter(self)
     self.source = ''
     self.ast = None
+    self.program = None   # Programa traducido a Python (-e python)
     self.have_errors = False
+    self.phases = {}      # Fase -> nanosegundos, para las estadísticas (-p/-w)
+    self.optimized = False
 
   def print_tokens(self, source):
     # Tokenize the source
@@ -33,11 +43,51 @@ class Context:
   def parse(self, source):
     self.have_errors = False
     self.source = source
-    self.ast = self.parser.parse(self.lexer.tokenize(self.source))
+    with timed(self.phases, 'tokenize'):
+      tokens = list(self.lexer.tokenize(self.source))
+    with timed(self.phases, 'parse'):
+      self.ast = self.parser.parse(iter(tokens))
+
+  def optimize(self):
+    # Optimización del AST (-O) antes de ejecutar
+    if self.ast is not None and not self.have_errors:
+      from basoptimize import Optimizer
+      with timed(self.phases, 'optimize'):
+        removed = Optimizer.optimize(self.ast.lines)
+      self.optimized = True
+      # A stderr, para no mezclarse con la salida del programa
+      sys.stderr.write(f'Optimizer: {removed} AST nodes removed\n')
+      return removed
+
+  def load_python(self, source, fname, array_base, slicing, go_next, trace, optimize):
+    # Backend Python: usar el código ya compilado en caché o traducir el programa
+    from baspython import PythonGenerator, PythonProgram
+    self.source = source
+    self.optimized = optimize
+    key = PythonProgram.cache_key(source, array_base = array_base, slicing = slicing, go_next = go_next, trace = trace, optimize = optimize)
+    with timed(self.phases, 'cache_load'):
+      self.program = PythonProgram.load(fname, key)
+    if self.program is not None:
+      return
+    self.parse(source)
+    if self.have_errors or self.ast is None:
+      return
+    if optimize:
+      self.optimize()
+    try:
+      with timed(self.phases, 'translate'):
+        self.program = PythonGenerator.generate(self.ast.lines, fname, array_base, slicing, go_next, trace)
+    except BasicExit:
+      # Error semántico (END, FOR/NEXT); ya fue reportado
+      self.have_errors = True
+      return
+    with timed(self.phases, 'cache_save'):
+      self.program.save(fname, key)
 
   def print_ast(self, source, fast, style):
     self.source = source
     self.ast = self.parser.parse(self.lexer.tokenize(self.source))
+    from basrender import DotRender
     dot = DotRender.render(self.ast)
     if style == 'dot':
       with open(fast, "w") as fout:
@@ -45,8 +95,26 @@ class Context:
     elif style == 'txt':
       print(dot)
 
-  def run(self, uppercase, array_base, slicing, go_next, trace, tabs, random_seed, fname, print_stats, write_stats, output_file, input_file):
+  def print_symtab(self, source):
+    self.source = source
+    self.ast = self.parser.parse(self.lexer.tokenize(self.source))
+    symtab = Resolver.resolve(self.ast.lines)
+    print(str(symtab))
+
+  def compile(self, config: RunConfig):
+    '''
+    Prepara el programa ya analizado (parse o load_python) una sola vez para
+    ejecutarlo muchas veces con CompiledProgram.run
+    '''
+    if self.have_errors:
+      return None
+    prog = self.program if config.engine == 'python' else self.ast.lines
+    info = {'sha256': hashlib.sha256(self.source.encode('utf-8')).hexdigest(), 'optimized': self.optimized}
+    return CompiledProgram(prog, config, self.phases, info)
+
+  def run(self, uppercase, array_base, slicing, go_next, trace, tabs, random_seed, fname, print_stats, write_stats, output_file, input_file, engine = 'closure', gosub_depth = 256, profile = False, stats_format = 'text', ir_stats = False):
     if not self.have_errors:
+      config = RunConfig(uppercase = uppercase, array_base = array_base, slicing = slicing, go_next = go_next, trace = trace, tabs = tabs, fname = fname, print_stats = print_stats, write_stats = write_stats, engine = engine, gosub_depth = gosub_depth, profile = profile, stats_format = stats_format, ir_stats = ir_stats)
       if output_file:
         base = fname.split('/')[-1]
         base1 = base.split('.')[0]
@@ -56,10 +124,10 @@ class Context:
           print(f'Redirecting INPUT to read from file: {input_file}')
         with open(fprint, 'w', encoding='utf-8') as fout:
           with redirect_stdout(fout):
-            return self.interp.interpret(self.ast.lines, verbose=False, uppercase = uppercase, array_base = array_base, slicing = slicing, go_next = go_next, trace = trace, tabs = tabs, random_seed = random_seed, fname = fname, print_stats = print_stats, write_stats = write_stats, input_file = input_file)
+            return self.compile(config).run(input_file = input_file, random_seed = random_seed)
       elif input_file:
         print(f'Redirecting INPUT to read from file: {input_file}')
-      return self.interp.interpret(self.ast.lines, verbose=False, uppercase = uppercase, array_base = array_base, slicing = slicing, go_next = go_next, trace = trace, tabs = tabs, random_seed = random_seed, fname = fname, print_stats = print_stats, write_stats = write_stats, input_file = input_file)
+      return self.compile(config).run(input_file = input_file, random_seed = random_seed)
 
   def find_source(self, node):
     indices = self.parser.index_position(node)
@@ -1,7 +1,7 @@
 # basic.py
 
 '''
-Usage: basic.py [-h] [-a style] [-o OUT] [-l] [-D] [-p] [-I] [--sym] [-S] [-R] [-u] [-ar] [-sl] [-n] [-g] [-t] [--tabs] input
+Usage: basic.py [-h] [-a style] [-o OUT] [-l] [-D] [-p] [--stats-format FORMAT] [-I] [--sym] [--parse-debug] [-S] [-R] [-u] [-ar] [-sl] [-n] [-g] [-t] [--tabs] [--gosub-depth] [--profile] [-e ENGINE] [-O] [--ir-stats] input
 
 Compiler for BASIC DARTMOUTH 64
 
@@ -16,6 +16,7 @@ Optional arguments:
   -a STYLE                                 Generate AST graph as DOT or TXT format
   -I, --ir                                 Dump the generated Intermediate representation
   --sym                                    Dump the symbol table
+  --parse-debug                            Dump the parser grammar and LALR states to parse.txt
   -S, --asm                                Store the generated assembly file
   -R, --exec                               Execute the generated program
   -v, --version                            Show the version of the BASIC interpreter
@@ -26,16 +27,21 @@ Optional arguments:
   -g, --go-next                            If no branch from a GOTO instruction exists, go to the next line
   -t, --trace                              Activate tracing to print line numbers during execution
   --tabs INT                               Set the number of spaces for comma-separated elements (default is 15)
+  --gosub-depth INT                        Set the maximum number of nested GOSUB calls (default is 256)
   -rn INT, --random INT                    Set the seed for the random number generator
   -p, --print-stats                        Print statistics on program termination
   -w, --write-stats                        Write statistics to a file on program termination
+  --stats-format FORMAT                    Statistics format for -p/-w: text (default) or json
+  --profile                                Write per-line hit counts and times to <input>_profile.txt/.json
   -of, --output-file                       Redirect PRINT output to a file
   -if INPUT_FILE, --input-file INPUT_FILE  Redirect INPUT to a file
+  -e ENGINE, --engine ENGINE               Execution engine: closure (compiled, default), visitor (reference), python (cached translation) or ir (stack VM)
+  -O, --optimize                           Optimize the AST before running (constant folding, Group elimination)
+  --ir-stats                               Print the instructions removed by each IR peephole rule and superinstruction (ir engine)
 '''
 
 from contextlib import redirect_stdout
-from rich       import print
-from bascontext import Context
+from bascontext import Context, print  # print de rich, importado al usarse
 
 import argparse
 
@@ -78,6 +84,11 @@ def parse_args():
     '--sym',
     action='store_true',
     help='Dump the symbol table')
+
+  mutex.add_argument(
+    '--parse-debug',
+    action='store_true',
+    help='Dump the parser grammar and LALR states to parse.txt')
   
   cli.add_argument(
     '-u', '--uppercase',
@@ -121,6 +132,12 @@ def parse_args():
     default=15,
     help='Set the number of spaces for comma-separated elements (default is 15)')
 
+  cli.add_argument(
+    '--gosub-depth',
+    type=int,
+    default=256,
+    help='Set the maximum number of nested GOSUB calls (default is 256)')
+
   cli.add_argument(
     '-rn', '--random',
     type=int,
@@ -138,6 +155,18 @@ def parse_args():
     default=False,
     help='Write statistics to a file on program termination')
 
+  cli.add_argument(
+    '--stats-format',
+    choices=['text', 'json'],
+    default='text',
+    help='Statistics format for -p/-w: text (default) or json')
+
+  cli.add_argument(
+    '--profile',
+    action='store_true',
+    default=False,
+    help='Write per-line hit counts and times to <input>_profile.txt/.json')
+
   cli.add_argument(
     '-of', '--output-file',
     action='store_true',
@@ -149,7 +178,30 @@ def parse_args():
     type=str,
     help='Redirect INPUT to a file')
 
-  return cli.parse_args()
+  cli.add_argument(
+    '-e', '--engine',
+    choices=['closure', 'visitor', 'python', 'ir'],
+    default='closure',
+    help='Execution engine: closure (compiled, default), visitor (reference), python (cached translation) or ir (stack VM)')
+
+  cli.add_argument(
+    '-O', '--optimize',
+    action='store_true',
+    default=False,
+    help='Optimize the AST before running (constant folding, Group elimination)')
+
+  cli.add_argument(
+    '--ir-stats',
+    action='store_true',
+    default=False,
+    help='Print the instructions removed by each IR peephole rule and superinstruction (ir engine)')
+
+  args = cli.parse_args()
+  if args.profile and args.engine in ('python', 'ir'):
+    cli.error('--profile requires the closure or visitor engine')
+  if args.ir_stats and args.engine != 'ir':
+    cli.error('--ir-stats requires the ir engine')
+  return args
 
 if __name__ == '__main__':
 
@@ -183,8 +235,20 @@ if __name__ == '__main__':
     base = fname.split('/')[-1]
     fsym = base.split('.')[0] + '_symtab.txt'
     print(f'Dumping symbol table: {fsym}')
+    with open(fsym, 'w', encoding='utf-8') as fout:
+      with redirect_stdout(fout):
+        context.print_symtab(source)
+
+  elif args.parse_debug:
+    print('Dumping parser tables: parse.txt')
+    context.parser.write_debugfile('parse.txt')
 
   else:
-    context.parse(source)
+    if args.engine == 'python':
+      context.load_python(source, fname, args.array_base, args.slicing, args.go_next, args.trace, args.optimize)
+    else:
+      context.parse(source)
+      if args.optimize:
+        context.optimize()
     if not args.no_run:
-        context.run(args.uppercase, args.array_base, args.slicing, args.go_next, args.trace, args.tabs, args.random, fname, args.print_stats, args.write_stats, args.output_file, args.input_file)
\ No newline at end of file
+        context.run(args.uppercase, args.array_base, args.slicing, args.go_next, args.trace, args.tabs, args.random, fname, args.print_stats, args.write_stats, args.output_file, args.input_file, engine=args.engine, gosub_depth=args.gosub_depth, profile=args.profile, stats_format=args.stats_format, ir_stats=args.ir_stats)
\ No newline at end of file
@@ -5,20 +5,193 @@ Analisis Semántico & Intérprete para BASIC DARTMOUTH 64
 '''
 
 import sys
+import json
 import math
 import time
 import random
-import psutil
-from contextlib import redirect_stdout
+from array import array
+from contextlib import redirect_stdout, contextmanager
+from dataclasses import dataclass, asdict, fields
 
 from typing import Dict, Union
 from basast import *
+from basresolve import Resolver
 
 class BasicExit(BaseException):
-    pass
+    '''
+    Termina la ejecución. El argumento opcional es el motivo ('end',
+    'error', 'out_of_data') que se reporta en las estadísticas JSON.
+    '''
+    @property
+    def reason(self):
+        return self.args[0] if self.args else 'exit'
+
+class BasicArray:
+    '''
+    Lista o tabla creada con DIM. Los elementos se guardan de forma contigua
+    y las tablas se indexan por filas (row-major). Los arreglos numéricos
+    usan array('d') (8 bytes por elemento); los de strings, una lista.
+    '''
+    __slots__ = ('data', 'base', 'rows', 'cols')
+
+    def __init__(self, name, base, dim1, dim2 = None):
+        self.base = base
+        self.rows = max(int(dim1) - base + 1, 0)
+        self.cols = max(int(dim2) - base + 1, 0) if dim2 is not None else 1
+        size = self.rows * self.cols
+        if name[-1] == '$':
+            self.data = [''] * size
+        else:
+            self.data = array('d', [0.0]) * size
+
+    def offset(self, x, y = None):
+        # Posición del elemento dentro de data, o -1 si está fuera de los límites
+        i = int(x) - self.base
+        j = int(y) - self.base if y is not None else 0
+        if 0 <= i < self.rows and 0 <= j < self.cols:
+            return i * self.cols + j
+        return -1
+
+class OutputBuffer:
+    '''
+    Salida de PRINT. El texto se acumula en memoria y se escribe en bloques
+    grandes: al superar un número de fragmentos pendientes en un salto de
+    línea, antes de un INPUT y al terminar el programa. Se escribe sobre el
+    sys.stdout vigente al momento de vaciar, así que respeta redirect_stdout.
+    '''
+    __slots__ = ('parts', 'column', 'threshold', 'written', 'messages', 'flush_ns')
+
+    WIDTH = 80  # Ancho de línea
+
+    def __init__(self, threshold = 1024):
+        self.parts = []
+        self.column = 0
+        self.threshold = threshold
+        self.written = 0   # Caracteres escritos (se cuentan al vaciar)
+        self.messages = 0  # De esos, los de mensajes del intérprete
+        self.flush_ns = 0  # Tiempo total escribiendo en sys.stdout
+
+    # Método Print según Peter Norvig
+    def write(self, s):
+        self.parts.append(s)
+        self.column += len(s)
+        if self.column >= self.WIDTH:
+            self.newline()
 
-class BasicContinue(Exception):
-    pass
+    def pad(self, width):
+        # Espacios hasta la siguiente columna múltiplo de width, sin pasar del ancho de línea
+        n = -self.column % width
+        if n:
+            if self.column + n >= self.WIDTH:
+                self.parts.append(' ' * (self.WIDTH - self.column))
+                self.newline()
+            else:
+                self.parts.append(' ' * n)
+                self.column += n
+
+    def newline(self):
+        self.parts.append('\n')
+        self.column = 0
+        if len(self.parts) >= self.threshold:
+            self.flush()
+
+    def message(self, s):
+        # Mensajes del intérprete: van en orden con la salida pero no mueven la columna
+        self.parts.append(s + '\n')
+        self.messages += len(s) + 1
+
+    def flush(self):
+        if self.parts:
+            start = time.perf_counter_ns()
+            text = ''.join(self.parts)
+            sys.stdout.write(text)
+            self.written += len(text)
+            self.parts.clear()
+            self.flush_ns += time.perf_counter_ns() - start
+
+    def reset(self):
+        self.parts.clear()
+        self.column = 0
+        self.written = 0
+        self.messages = 0
+        self.flush_ns = 0
+
+class LoopFrame:
+    '''
+    Ciclo FOR activo. El límite, el salto y la dirección se evalúan una
+    sola vez al entrar al ciclo; NEXT solo incrementa y compara.
+    '''
+    __slots__ = ('pc', 'var', 'limit', 'step', 'down')
+
+    def __init__(self, pc, var, limit, step):
+        self.pc = pc          # Posición de la instrucción FOR
+        self.var = var        # Variable de control
+        self.limit = limit    # Valor final
+        self.step = step      # Salto
+        self.down = step < 0  # Dirección del ciclo
+
+def _enter_loop(loops, frame):
+    # Si se vuelve a entrar a un FOR activo (por ejemplo con GOTO), se descarta
+    # su ciclo anterior junto con los ciclos internos que quedaron abiertos
+    for i in range(len(loops) - 1, -1, -1):
+        if loops[i].var == frame.var:
+            del loops[i:]
+            break
+    loops.append(frame)
+
+# Versión del esquema de --stats-format json; cambiar solo si se quitan o renombran campos
+STATS_SCHEMA = 2
+
+# Contadores de ejecución y su nombre en las estadísticas de texto
+COUNTER_LABELS = {
+    'statements_executed'       : 'Statements executed',
+    'branches_taken'            : 'Branches taken',
+    'gosub_calls'               : 'GOSUB calls',
+    'expression_nodes_estimated': 'Expression nodes (estimated)',
+    'statements_per_second'     : 'Statements per second',
+    'print_bytes_written'       : 'PRINT bytes written',
+}
+
+@contextmanager
+def timed(phases, name):
+    '''
+    Suma a phases[name] los nanosegundos que tarda el bloque
+    '''
+    start = time.perf_counter_ns()
+    try:
+        yield
+    finally:
+        phases[name] = phases.get(name, 0) + time.perf_counter_ns() - start
+
+def peak_memory():
+    '''
+    Pico de memoria residente del proceso, en bytes
+    '''
+    try:
+        import resource
+    except ImportError:
+        # Windows no tiene resource
+        import psutil
+        return psutil.Process().memory_info().peak_wset
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == 'darwin' else peak * 1024   # Linux lo reporta en KiB
+
+def _whole(value):
+    # Los arreglos numéricos guardan floats: un valor entero como 65.0 se usa
+    # como el int 65 donde Python exige enteros (CHR$, TAB, LEFT$, MID$...)
+    return int(value) if type(value) is float and value.is_integer() else value
+
+def _flatten(plist):
+    '''
+    Aplanar la lista de elementos de PRINT (el parser anida los pitem en listas)
+    '''
+    items = []
+    for pitem in plist:
+        if isinstance(pitem, list):
+            items.extend(_flatten(pitem))
+        else:
+            items.append(pitem)
+    return items
 
 def _is_truthy(value):
     if value is None:
@@ -28,9 +201,85 @@ def _is_truthy(value):
     else:
         return True
 
+@dataclass
+class RunConfig:
+    '''
+    Opciones de ejecución que no cambian entre ejecuciones de un mismo programa
+    '''
+    verbose: bool = False
+    uppercase: bool = False
+    array_base: int = 1
+    slicing: bool = False
+    go_next: bool = False
+    trace: bool = False
+    tabs: int = 15
+    fname: str = None
+    print_stats: bool = False
+    write_stats: bool = False
+    engine: str = 'closure'
+    gosub_depth: int = 256
+    profile: bool = False
+    stats_format: str = 'text'
+    ir_stats: bool = False
+
+class CompiledProgram:
+    '''
+    Programa preparado una sola vez: líneas ordenadas, slots de variables,
+    saltos resueltos, DATA, tabla de ciclos y, con el motor closure, las
+    clausuras de cada línea. Se puede ejecutar muchas veces con distintas
+    entradas (INPUT) y semillas sin repetir ese trabajo.
+
+        program = context.compile(RunConfig(array_base = 0))
+        for seed in range(1000):
+            program.run(input_lines = ['5', '7'], random_seed = seed)
+    '''
+    def __init__(self, prog, config: RunConfig, phases = None, info = None):
+        self.config = config
+        self.interp = Interpreter(prog, **asdict(config))
+        if phases is not None:
+            self.interp.phases = phases  # Tiempos de lexer/parser medidos por Context
+        if info is not None:
+            self.interp.info.update(info) # Hash del fuente, -O (para las estadísticas JSON)
+        self.code = None
+        self.valid = True
+        try:
+            if config.engine != 'python':
+                self.interp.prepare()
+            if config.engine == 'closure':
+                with timed(self.interp.phases, 'compile'):
+                    self.code = self.interp.compile()
+            elif config.engine == 'ir':
+                with timed(self.interp.phases, 'compile'):
+                    self.code = self.interp.compile_ir()
+        except BasicExit:
+            # Error semántico (END, FOR/NEXT); ya fue reportado
+            self.valid = False
+        finally:
+            self.interp.output.flush()
+
+    def run(self, input_file = None, input_lines = None, random_seed = None):
+        # Retorna el motivo de salida ('end', 'error', 'out_of_data'...), o None si el programa no es válido
+        if not self.valid:
+            return None
+        interp = self.interp
+        interp.reset(input_file = input_file, input_lines = input_lines, random_seed = random_seed)
+        reason = 'exception'
+        try:
+            interp.execute(self.code)
+        except BasicExit as e:
+            reason = e.reason
+        except KeyboardInterrupt:
+            reason = 'interrupted'
+            raise
+        finally:
+            interp.output.flush()
+            interp.report_statistics(reason)
+        return reason
+
 class Interpreter(Visitor):
-    def __init__(self, prog, verbose = False, uppercase = False, array_base = 1, slicing = False, go_next = False, trace = False, tabs = 15, random_seed = None, fname = None, print_stats = False, write_stats = False, input_file = None):
+    def __init__(self, prog, verbose = False, uppercase = False, array_base = 1, slicing = False, go_next = False, trace = False, tabs = 15, random_seed = None, fname = None, print_stats = False, write_stats = False, input_file = None, engine = 'closure', gosub_depth = 256, profile = False, stats_format = 'text', ir_stats = False):
         self.prog = prog
+        self.engine = engine # Motor de ejecución: 'closure' (compilado), 'visitor' (referencia), 'python' o 'ir'
         self.verbose = verbose
         self.uppercase = uppercase
         self.array_base = array_base
@@ -38,22 +287,20 @@ class Interpreter(Visitor):
         self.go_next = go_next
         self.trace = trace
         self.tabs = tabs
-        self.random_seed = random_seed
-        if self.random_seed is not None:
-            random.seed(self.random_seed)  # Semilla para el generador de números aleatorios
-        self.dc = 0
-        self.start_time = time.time() # Capturar el tiempo desde que inició el intérprete
-        self.pc = 0  # Contador de instrucciones ejecutadas
         self.memory_used = 0  # Uso de memoria
         self.fname = fname # Nombre del archivo
         self.print_stats = print_stats # Imprimir estadísticas en pantalla
         self.write_stats = write_stats # Escribir estadísticas en archivo de texto
-        self.input_file = input_file
-        self.input_lines = []
-        if self.input_file:
-            with open(self.input_file, 'r') as f:
-                self.input_lines = f.readlines()
-        self.input_index = 0
+        self.profile = profile # Perfilar cada línea (basprofile)
+        self.phases = {}  # Fase -> nanosegundos (estadísticas de -p/-w)
+        self.stats_format = stats_format # 'text' o 'json'
+        self.ir_stats = ir_stats # Reporte del optimizador peephole del IR
+        self.info = {'file': fname, 'sha256': None, 'optimized': False} # Datos del programa
+        self.output = OutputBuffer() # Salida de PRINT
+        self.slots = []   # Memoria de variables, listas y tablas (se dimensiona en prepare)
+        self.loops = []   # Ciclos activos
+        self.gosub = []   # Pila de retorno de GOSUB (contador de programa al que vuelve RETURN)
+        self.gosub_depth = gosub_depth # Máximo de GOSUB anidados
 
         # Diccionario de funciones predefinidas
         self.functions = {
@@ -67,13 +314,13 @@ class Interpreter(Visitor):
             'SQR'   : lambda x: math.sqrt(x),
             'INT'   : lambda x: int(x),
             'RND'   : lambda x: random.random(),
-            'TAB'   : lambda x: ' '*x,
+            'TAB'   : lambda x: ' '*_whole(x),
             'DEG'   : lambda x: x * (180.0/3.141592654),
             'PI'    : self.return_pi,
             'TIME'  : self.get_time,
             'LEN'   : self.len_str,
-            'LEFT$' : lambda x,n  : x[:n],
-            'RIGHT$': lambda x,n : x[-n:],
+            'LEFT$' : lambda x,n  : x[:_whole(n)],
+            'RIGHT$': lambda x,n : x[-_whole(n):],
             'CHR$'  : self.get_ascii,
             'sin'   : lambda x: math.sin(x),
             'cos'   : lambda x: math.cos(x),
@@ -85,27 +332,56 @@ class Interpreter(Visitor):
             'sqr'   : lambda x: math.sqrt(x),
             'int'   : lambda x: int(x),
             'rnd'   : lambda x: random.random(),
-            'tab'   : lambda x: ' '*x,
+            'tab'   : lambda x: ' '*_whole(x),
             'deg'   : lambda x: x * (180.0/3.141592654),
             'pi'    : self.return_pi,
             'time'  : self.get_time,
             'len'   : self.len_str,
-            'left$' : lambda x,n  : x[:n],
-            'right$': lambda x,n : x[-n:],
+            'left$' : lambda x,n  : x[:_whole(n)],
+            'right$': lambda x,n : x[-_whole(n):],
             'chr$'  : self.get_ascii,
         }
+        self.builtins = dict(self.functions) # DEF agrega funciones; reset las quita
+
+        self.reset(input_file = input_file, random_seed = random_seed)
     
     @classmethod
-    def interpret(cls, prog:Dict[int, Statement], verbose, uppercase, array_base, slicing, go_next, trace, tabs, random_seed, fname, print_stats, write_stats, input_file):
-        basic = cls(prog, verbose, uppercase, array_base, slicing, go_next, trace, tabs, random_seed, fname, print_stats, write_stats, input_file)
-        try:
-            basic.run()
-        except BasicExit:
-            pass
+    def interpret(cls, prog:Dict[int, Statement], verbose, uppercase, array_base, slicing, go_next, trace, tabs, random_seed, fname, print_stats, write_stats, input_file, engine = 'closure', gosub_depth = 256):
+        config = RunConfig(verbose, uppercase, array_base, slicing, go_next, trace, tabs, fname, print_stats, write_stats, engine, gosub_depth)
+        CompiledProgram(prog, config).run(input_file = input_file, random_seed = random_seed)
+
+    def reset(self, input_file = None, input_lines = None, random_seed = None):
+        '''
+        Deja el intérprete listo para una nueva ejecución del mismo programa.
+        Las listas y diccionarios se vacían en el sitio porque las clausuras
+        del motor compilado guardan referencias a ellos.
+        '''
+        self.random_seed = random_seed
+        if random_seed is not None:
+            random.seed(random_seed)  # Semilla para el generador de números aleatorios
+        self.input_file = input_file
+        if input_lines is None and input_file:
+            with open(input_file, 'r') as f:
+                input_lines = f.readlines()
+        self.input_lines = list(input_lines) if input_lines is not None else None # None: leer del teclado
+        self.input_index = 0
+        self.start_time = time.time() # Capturar el tiempo desde que inició el intérprete
+        self.run_start = time.perf_counter_ns()
+        self.pc = 0  # Contador de programa
+        self.dc = 0  # Contador de DATA
+        self.gosub.clear()
+        self.hits = None   # pc -> ejecuciones (solo con -p, -w o --profile)
+        self.taken = None  # pc -> saltos tomados
+        self.slots[:] = [None] * len(self.slots)
+        self.loops.clear()
+        self.functions.clear()
+        self.functions.update(self.builtins)
+        self.output.reset()
 
     def error(self, message):
+        self.output.flush()
         sys.stderr.write(message)
-        raise BasicExit()
+        raise BasicExit('error')
 
     def _check_numeric_operands(self, instr, left, right):
         if isinstance(left, Union[int, float]) and isinstance(right, Union[int, float]):
@@ -121,17 +397,55 @@ class Interpreter(Visitor):
 
     # Método Print según Peter Norvig
     def print_string(self, s) -> None:
-        print(s, end='')
-        self.column += len(s)
-        if self.column >= 80:
-            self.newline()
+        self.output.write(s)
 
     def pad(self, width) -> None:
-        while self.column % width != 0:
-            self.print_string(' ')
+        self.output.pad(width)
 
     def newline(self):
-        print(); self.column = 0
+        self.output.newline()
+
+    # Instrucción INPUT (compartida por ambos motores)
+    def input_prompt(self, label):
+        # Asegurarse de que 'label' es un string
+        if isinstance(label, tuple):
+        # Convertir la tupla en un string, uniendo sus elementos con un separador
+            label = ' '.join(str(item) for item in label if item is not None)
+
+        self.output.flush()
+        if label and self.input_lines is None:
+            # Remover el separador
+            label = label.rstrip(';').strip()
+            label = label.rstrip(',').strip()
+            # Escribir mensaje antes de solicitar la entrada de datos
+            sys.stdout.write(label + " ")
+
+    def input_value(self, name, lineno):
+        if self.input_lines is not None:
+        # Leer del archivo
+            if self.input_index < len(self.input_lines):
+                value = self.input_lines[self.input_index].strip()
+                self.input_index += 1
+                if name[-1] == '$' and not self.slicing:
+                    if self.uppercase == True:
+                        return value.upper()
+                    return value
+            else:
+                self.error("No more input data available in the file.")
+
+        else:
+            value = input()
+            if name[-1] == '$':
+                if self.slicing:
+                    self.error(f"Cannot proceed with INPUT instruction at line {lineno}. String slicing might be enabled.")
+                elif self.uppercase == True:
+                    return value.upper()
+                return value
+
+        try:
+            return int(value)
+        except ValueError:
+            return float(value)
 
     # Intérprete
 
@@ -173,30 +487,50 @@ class Interpreter(Visitor):
             self.error("END is not the last instruction")
 
     def check_loops(self):
-        for pc in range(len(self.stat)):
-            lineno = self.stat[pc]
-            if isinstance(self.prog[lineno], For):
-                forinst = self.prog[lineno]
-                loopvar = forinst.ident
-                for i in range(pc + 1, len(self.stat)):
-                    if isinstance(self.prog[self.stat[i]], Next):
-                        nextvar = self.prog[self.stat[i]].ident
-                        if nextvar != loopvar:
-                            continue
-                        self.loopend[pc] = i
-                        break
-                else:
-                    self.error("FOR without NEXT at line %s" % self.stat[pc])
-
-    # Instrucción GOTO
+        '''
+        Emparejar FOR y NEXT en una sola pasada. Cada FOR corresponde al
+        primer NEXT posterior con la misma variable; los FOR que esperan su
+        NEXT se apilan por variable. Retorna la tabla FOR -> NEXT; al
+        ejecutar, NEXT busca su FOR en la pila de ciclos activos.
+        '''
+        loopend = {}    # FOR -> NEXT
+        pending = {}    # variable -> pila de FOR sin NEXT
+        for pc, lineno in enumerate(self.stat):
+            instr = self.prog[lineno]
+            if isinstance(instr, For):
+                pending.setdefault(instr.ident.var, []).append(pc)
+            elif isinstance(instr, Next):
+                fors = pending.pop(instr.ident.var, None)
+                if fors:
+                    for forpc in fors:
+                        loopend[forpc] = pc
+
+        unmatched = [pc for fors in pending.values() for pc in fors]
+        if unmatched:
+            self.error("FOR without NEXT at line %s" % self.stat[min(unmatched)])
+        return loopend
+
+    def build_jumps(self):
+        '''
+        Resolver una sola vez los destinos de GOTO, IF-THEN y GOSUB.
+        Si la línea de destino no existe y --go-next está activo, el salto
+        se resuelve a la línea siguiente a la instrucción de salto.
+        '''
+        self.jumps = {}
+        for pc, lineno in enumerate(self.stat):
+            instr = self.prog[lineno]
+            if isinstance(instr, (Goto, IfStatement, GoSub)):
+                target = self.lineidx.get(instr.lineno)
+                if target is None and self.go_next:
+                    target = pc + 1
+                self.jumps[pc] = target
+
+    # Instrucción GOTO: retorna el contador de programa del destino
     def goto(self, lineno):
-        if not lineno in self.prog:
-            if self.go_next:
-                self.pc += 1
-                return
-            else:
-                self.error(f"Undefined line {lineno} in GOTO instruction, located at line {self.stat[self.pc]}")
-        self.pc = self.stat.index(lineno)
+        target = self.jumps.get(self.pc)
+        if target is None:
+            self.error(f"Undefined line {lineno} in GOTO instruction, located at line {self.stat[self.pc]}")
+        return target
 
     # Calcular el tiempo desde que se inició el intérprete
     def get_time(self):
@@ -214,98 +548,329 @@ class Interpreter(Visitor):
     
     def get_ascii(self, expr):
         if isinstance(expr, Union[int, float]):
-            return chr(expr)
+            return chr(_whole(expr))
         else:
             self.error(f"CHR$() expected a number, was obtained: {type(expr).__name__}")
 
+    def report_statistics(self, reason):
+        '''
+        Estadísticas de -p (pantalla) y -w (archivo) al terminar la ejecución.
+        El texto se produce solo al llegar a END/STOP; el JSON, con cualquier
+        motivo de salida, para poder agregar también las ejecuciones fallidas.
+        '''
+        if not (self.print_stats or self.write_stats):
+            return
+        if self.stats_format == 'json':
+            stats = json.dumps(self.statistics(reason), indent = 2)
+            emit = lambda: print(stats)
+        elif reason == 'end':
+            emit = self.print_statistics
+        else:
+            return
+
+        if self.write_stats:
+            base = self.fname.split('/')[-1]
+            base1 = base.split('.')[0]
+            fstats = base1 + ('_stats.json' if self.stats_format == 'json' else '_stats.txt')
+            print(f'Dumping {self.stats_format} file with stats: {fstats}')
+            with open(fstats, 'w', encoding='utf-8') as fout:
+                with redirect_stdout(fout):
+                    emit()
+        if self.print_stats:
+            emit()
+
+    def statistics(self, reason):
+        '''
+        Estadísticas con un esquema estable (--stats-format json). Los
+        contadores por línea son null con el backend python.
+        '''
+        phases = self.phase_times()
+        elapsed = phases['run'] + phases['output_flush']
+        counters = dict.fromkeys(COUNTER_LABELS)
+        if self.hits is not None:
+            counters.update(self.counters())
+            counters['statements_per_second'] = counters['statements_executed'] / (elapsed / 1e9) if elapsed else None
+        counters['print_bytes_written'] = self.output.written - self.output.messages
+        flags = {name: getattr(self, name) for name in ('uppercase', 'array_base', 'slicing', 'go_next', 'trace', 'tabs', 'gosub_depth', 'profile', 'random_seed')}
+        flags['optimize'] = self.info['optimized']
+        return {
+            'schema'           : STATS_SCHEMA,
+            'program'          : {'file': self.info['file'], 'sha256': self.info['sha256']},
+            'engine'           : self.engine,
+            'flags'            : flags,
+            'exit'             : reason,
+            'started_at'       : self.start_time,
+            'elapsed_ns'       : elapsed,
+            'peak_memory_bytes': peak_memory(),
+            'phases_ns'        : phases,
+            'counters'         : counters,
+        }
+
     def print_statistics(self):
         time_elapsed = time.time() - self.start_time
-        process = psutil.Process()
-        self.memory_used = process.memory_info().rss
+        self.memory_used = peak_memory()
         print(f'This program took {time_elapsed:.2f} seconds to run')
-        print(f'Memory usage: {self.memory_used} bytes')
-        print(f"Total number of processed lines: {self.pc + 1}")
+        print(f'Peak memory usage: {self.memory_used} bytes')
+        if self.hits is not None:
+            # El backend python no ejecuta línea por línea y no tiene contadores
+            counters = self.counters()
+            for name, value in counters.items():
+                print(f'{COUNTER_LABELS[name]}: {value}')
+            if time_elapsed > 0:
+                print(f"Statements per second: {counters['statements_executed'] / time_elapsed:.0f}")
+        print(f'PRINT bytes written: {self.output.written - self.output.messages}')
+        print('Phase timings:')
+        for name, ns in self.phase_times().items():
+            print(f'  {name:<14}{ns / 1e6:>12.3f} ms')
+
+    def phase_times(self):
+        '''
+        Tiempos de las fases ya terminadas más los de la ejecución en curso
+        '''
+        flush = self.output.flush_ns
+        phases = dict(self.phases)
+        phases['run'] = time.perf_counter_ns() - self.run_start - flush
+        phases['output_flush'] = flush
+        return phases
+
+    def counters(self):
+        '''
+        Totales de la ejecución a partir de las cuentas por línea. Los nodos
+        de expresión son una estimación estática: los nodos de cada línea
+        (más el cuerpo de los FN que llama) por sus ejecuciones, sin
+        distinguir los que no se evalúan, como los destinos de LET
+        '''
+        from basoptimize import count_nodes
+        hits, taken = self.hits, self.taken
+        bodies = {instr.fn: count_nodes(instr.expr) for instr in self.prog.values() if isinstance(instr, Def)}
+        executed = gosubs = nodes = 0
+        for pc, count in enumerate(hits):
+            if count:
+                instr = self.prog[self.stat[pc]]
+                executed += count
+                if isinstance(instr, GoSub):
+                    gosubs += count
+                elif not isinstance(instr, (Def, Data)):
+                    nodes += count * (count_nodes(instr, bodies) - 1)
+        return {
+            'statements_executed'       : executed,
+            'branches_taken'            : sum(taken),
+            'gosub_calls'               : gosubs,
+            'expression_nodes_estimated': nodes,
+        }
 
     # Función que inicializa y corre el intérprete de BASIC
     def run(self):
-        # Tabla de Simbolos
-        self.vars    = {}        # Todas las variables
-        self.lists   = {}        # Lista de variables
-        self.tables  = {}        # Tablas
-        self.loops   = []        # Ciclos activos
-        self.loopend = {}        # Saber cuando termina un ciclo
-        self.gosub   = None      # Retorno para Gosub
-        self.column  = 0         # Control de columnas para Print
+        if self.engine != 'python':
+            self.prepare()
+        self.execute()
+
+    def execute(self, code = None):
+        if self.engine == 'python':
+            # Backend traducido a Python (baspython): el programa ya viene compilado
+            self.prog.execute(self)
+        elif self.engine == 'ir':
+            # Máquina de pila (basinterpir): no ejecuta línea por línea y no tiene contadores
+            (code or self.compile_ir()).run()
+        else:
+            # Los errores aritméticos (división por cero, overflow, dominio de
+            # SQR/LOG) se reportan con la línea, como en los backends python e ir.
+            # Cada ciclo deja self.pc en la línea que falló
+            try:
+                if self.profile:
+                    self.run_profiled(code)
+                elif self.print_stats or self.write_stats:
+                    self.run_counted(code)
+                elif self.engine == 'visitor':
+                    self.run_visitor()
+                else:
+                    self.run_compiled(code)
+            except (ArithmeticError, ValueError) as e:
+                self.error(f"{e} at line {self.stat[self.pc]}")
+
+    def prepare(self):
+        # Tabla de Simbolos: cada variable, lista y tabla tiene un slot fijo
+        phases = self.phases
+        with timed(phases, 'resolve'):
+            self.symtab = Resolver.resolve(self.prog)
+        self.slots   = [None] * len(self.symtab) # Memoria de variables, listas y tablas
 
         self.stat = list(self.prog) # Ordenar lista de todas las lineas del programa
         self.stat.sort()
+        self.lineidx = {lineno: pc for pc, lineno in enumerate(self.stat)} # Número de línea -> contador de programa
         self.pc      = 0         # Contador de programa
 
         # Preprocesamiento antes de ejecutar
-        self.collect_data()     # Recoger todas las instrucciones DATA
-        self.check_end()        # Verificar la instrucción END
-        self.check_loops()      # Verificar ciclos FOR/NEXT
-        
+        with timed(phases, 'collect_data'):
+            self.collect_data()     # Recoger todas las instrucciones DATA
+        with timed(phases, 'check_end'):
+            self.check_end()        # Verificar la instrucción END
+        with timed(phases, 'check_loops'):
+            self.check_loops()      # Verificar ciclos FOR/NEXT
+        with timed(phases, 'build_jumps'):
+            self.build_jumps()      # Resolver los destinos de los saltos
+
+    # Motor de referencia: despacho multimethod sobre cada nodo del AST.
+    # Las instrucciones que saltan retornan el nuevo contador de programa;
+    # las demás retornan None y se continúa con la línea siguiente.
+    def run_visitor(self):
         while True:
             line  = self.stat[self.pc]
             instr = self.prog[line]
 
             if self.trace:
-                print(f"Executing line {self.stat[self.pc]}")  # Trace the current line
-
-            try:
+                self.output.message(f"Executing line {self.stat[self.pc]}")  # Trace the current line
+
+            if self.verbose:
+                self.output.message(f"{line} {instr.__class__.__name__}")
+            target = instr.accept(self)
+            self.pc = self.pc + 1 if target is None else target
+
+    def compile(self):
+        from bascompile import Compiler
+        return Compiler.compile(self)
+
+    # Máquina de pila: el programa se traduce a código IR (ircode) que
+    # ejecuta basinterpir. Usa la salida, INPUT y los errores de este intérprete.
+    # Con fuse = False no se usan superinstrucciones (perfilado de pares)
+    def compile_ir(self, fuse = True):
+        from ircode import IRGenerator
+        from basinterpir import Interpreter as IRInterpreter
+        from iroptimize import Peephole, Fusion
+        generator = IRGenerator(go_next = self.go_next, slicing = self.slicing)
+        code = generator.generate(self.prog)
+        peephole = Peephole(trace = self.trace)
+        code = peephole.optimize(code)
+        functions = {name: peephole.optimize(fcode) for name, fcode in generator.functions.items()}
+        fusion = Fusion.from_profile() if fuse else Fusion([])
+        code = fusion.fuse(code)
+        functions = {name: fusion.fuse(fcode) for name, fcode in functions.items()}
+        if self.ir_stats:
+            print(peephole.report())
+            print(fusion.report())
+        vm = IRInterpreter(self)
+        vm.load(code, functions, generator.data)
+        return vm
+
+    # Motor compilado: cada línea se convierte una sola vez en una clausura.
+    # Igual que en run_visitor, una clausura retorna el destino de un salto
+    # o None para continuar con la línea siguiente.
+    def run_compiled(self, code = None):
+        if code is None:
+            code = self.compile()
+        if self.trace or self.verbose:
+            while True:
+                if self.trace:
+                    self.output.message(f"Executing line {self.stat[self.pc]}")
                 if self.verbose:
-                    print(line, instr.__class__.__name__)
-                instr.accept(self)
-            except BasicContinue as e:
-                continue
+                    line = self.stat[self.pc]
+                    self.output.message(f"{line} {self.prog[line].__class__.__name__}")
+                target = code[self.pc]()
+                self.pc = self.pc + 1 if target is None else target
 
-            self.pc += 1
+        pc = self.pc
+        try:
+            while True:
+                target = code[pc]()
+                if target is None:
+                    pc += 1
+                else:
+                    pc = target
+        finally:
+            self.pc = pc
+
+
+    # Ciclo alternativo con --profile: mide cada línea sin afectar a los anteriores
+    def run_profiled(self, code = None):
+        from basprofile import Profiler
+        profiler = Profiler(self)
+        step = self.stepper(code)
+        if self.trace or self.verbose:
+            step = self.traced(step)
+        try:
+            profiler.run(step)
+        finally:
+            profiler.write()
+
+    # Ciclo alternativo con -p/-w: cuenta ejecuciones y saltos de cada línea
+    def run_counted(self, code = None):
+        step = self.stepper(code)
+        if self.trace or self.verbose:
+            step = self.traced(step)
+        hits = self.hits = [0] * len(self.stat)
+        taken = self.taken = [0] * len(self.stat)
+        pc = self.pc
+        try:
+            while True:
+                hits[pc] += 1
+                target = step(pc)
+                if target is None:
+                    pc += 1
+                else:
+                    taken[pc] += 1
+                    pc = target
+        finally:
+            self.pc = pc
 
+    def stepper(self, code = None):
+        '''
+        Función step(pc) que ejecuta una línea con el motor elegido y retorna
+        el destino de un salto o None (para los ciclos alternativos)
+        '''
+        if self.engine == 'visitor':
+            prog, stat = self.prog, self.stat
+            def step(pc):
+                self.pc = pc
+                return prog[stat[pc]].accept(self)
+        else:
+            if code is None:
+                code = self.compile()
+            def step(pc):
+                return code[pc]()
+        return step
+
+    def traced(self, step):
+        # step con los mensajes de -t y verbose, igual que run_compiled y run_visitor
+        def traced_step(pc):
+            line = self.stat[pc]
+            if self.trace:
+                self.output.message(f"Executing line {line}")
+            if self.verbose:
+                self.output.message(f"{line} {self.prog[line].__class__.__name__}")
+            return step(pc)
+        return traced_step
 
     # Asignaciones
     def assign(self, target, value):
         if isinstance(target, Variable):
-            var = target.var
+            slot = target.slot
             dim1 = target.dim1
             dim2 = target.dim2
             lineno = self.stat[self.pc]
             if dim1 is None and dim2 is None:
                 if isinstance(value, (int, float, str)):
-                    self.vars[var] = value
+                    self.slots[slot] = value
                 else:
-                    self.vars[var] = value.accept(self)
-            elif dim1 is not None and dim2 is None:
-                # Asignación de lista para arreglo unidimensional
-                x = dim1.accept(self)
-                if not var in self.lists:
-                    self.lists[var] = [0] * 10
-
-                if x > len(self.lists[var]):
-                    self.error(f"Dimension is too large at line {lineno}")
-
-                if isinstance(value, (int, float, str)):
-                    self.lists[var][x - 1] = value
-                else:
-                    self.lists[var][x - 1] = value.accept(self)
-    
-            elif dim1 is not None and dim2 is not None:
+                    self.slots[slot] = value.accept(self)
+            else:
+                # Asignación de lista o tabla. Si no fue declarada con DIM, se crea de tamaño 10
                 x = dim1.accept(self)
-                y = dim2.accept(self)
-                if not var in self.tables:
-                    temp = [0] * 10
-                    v = []
-                    for i in range(10):
-                        v.append(temp[:])
-                    self.tables[var] = v
-                # Si la variable existe
-                if x > len(self.tables[var]) or y > len(self.tables[var][0]):
-                    self.error("Dimensions are too large at line {lineno}")
-                
-                if isinstance(value, (int, float, str)):
-                    self.tables[var][x - 1][y - 1] = value
-                else:
-                    self.tables[var][x - 1][y - 1] = value.accept(self)
+                y = dim2.accept(self) if dim2 is not None else None
+                if self.slots[slot] is None:
+                    self.slots[slot] = BasicArray(target.var, self.array_base, 10, 10 if dim2 is not None else None)
+
+                k = self.slots[slot].offset(x, y)
+                if k < 0:
+                    if y is None:
+                        self.error(f'Index of {target.var} is out of bounds at line {lineno}')
+                    self.error(f'Indexes of {target.var} are out of bounds at line {lineno}')
+
+                if not isinstance(value, (int, float, str)):
+                    value = value.accept(self)
+                try:
+                    self.slots[slot].data[k] = value
+                except TypeError:
+                    self.error(f"Type mismatch in {target.var} at line {lineno}")
 
     # Patrón Visitor para las instrucciones de BASIC64
     def visit(self, instr: Let):
@@ -319,7 +884,7 @@ class Interpreter(Visitor):
         for target in instr.varlist:
             if self.dc >= len(self.data):
                 # No hay más datos para procesar. El programa termina de ejecutarse
-                raise BasicExit()
+                raise BasicExit('out_of_data')
             # Inicializar 'value' con un valor por defecto antes de usarlo
             value = self.data[self.dc]  # Get the current data item
         
@@ -350,12 +915,7 @@ class Interpreter(Visitor):
         pass
 
     def visit(self, instr: Print):
-        items = instr.plist
-        for pitem in items:
-
-            while isinstance(pitem, list):
-                pitem = pitem[0]
-    
+        for pitem in _flatten(instr.plist):
             if not pitem:
                 continue
             if isinstance(pitem, Node):
@@ -371,177 +931,95 @@ class Interpreter(Visitor):
             else:
                 self.error(f"Unexpected element {pitem} inside PRINT instruction at line {self.stat[self.pc]}")
 
-        if (not items) or items[-1] not in (',', ';'):
+        if (not instr.plist) or instr.plist[-1] not in (',', ';'):
             self.newline()
 
     def visit(self, instr: Input):
-        label = instr.label
-        # Asegurarse de que 'label' es un string
-        if isinstance(label, tuple):
-        # Convertir la tupla en un string, uniendo sus elementos con un separador
-            label = ' '.join(str(item) for item in label if item is not None)
-
-        if label and not self.input_file:
-            # Remover el separador
-            label = label.rstrip(';').strip()
-            label = label.rstrip(',').strip()
-            # Escribir mensaje antes de solicitar la entrada de datos
-            sys.stdout.write(label + " ")
-
+        self.input_prompt(instr.label)
         for variable in instr.vlist:
-            if self.input_file:
-            # Leer del archivo
-                if self.input_index < len(self.input_lines):
-                    value = self.input_lines[self.input_index].strip()
-                    if variable.var[-1] == '$' and not self.slicing:
-                        if self.slicing:
-                            self.error(f"Cannot proceed with INPUT instruction at line {self.stat[self.pc]}. String slicing might be enabled.")
-                        elif self.uppercase == True:
-                            value = String(value.upper())
-                        else:
-                            value = String(value)
-                    else:
-                        try:
-                            value = Number(int(value))
-                        except ValueError:
-                            value = Number(float(value))
-                    self.assign(variable, value)
-                    self.input_index += 1
-                else:
-                    self.error("No more input data available in the file.")
-
-            else:
-                value = input()
-                if variable.var[-1] == '$':
-                    if self.slicing:
-                        self.error(f"Cannot proceed with INPUT instruction at line {self.stat[self.pc]}. String slicing might be enabled.")
-                    elif self.uppercase == True:
-                        value = String(value.upper())
-                    else:
-                        value = String(value)
-                
-                else:
-                    try:
-                        value = Number(int(value))
-                    except ValueError:
-                        value = Number(float(value))
-                self.assign(variable, value)
+            self.assign(variable, self.input_value(variable.var, self.stat[self.pc]))
 
     def visit(self, instr: Goto):
         newline = instr.lineno
-        self.goto(newline)
-        raise BasicContinue()
+        return self.goto(newline)
 
     def visit(self, instr: IfStatement):
         relexpr = instr.relexpr
         newline = instr.lineno
         if _is_truthy(relexpr.accept(self)):
-            self.goto(newline)
-            raise BasicContinue
+            return self.goto(newline)
 
     def visit(self, instr: For):
         loopvar = instr.ident
-        initval = instr.low
-        finval  = instr.top
-        stepval = instr.step
+        initval = instr.low.accept(self)
+        finval  = instr.top.accept(self)
 
         # Si no hay un valor de salto especificado, establecer un valor de 1 por defecto
-        if stepval is None:
-            stepval = Number(1)
-
-        # Evaluar el valor de salto si existe
-        stepval = stepval.accept(self)
-
-        # Verificar si es un loop nuevo
-        if not self.loops or self.loops[-1][0] != self.pc:
-            # Parece ser un nuevo loop. Hacer la asignación inicial
-            newvalue = initval
-            self.assign(loopvar, initval)
-            self.loops.append((self.pc, stepval))
-        else:
-            # Es la repetición de un ciclo anterior
-            # Actualizar el valor de la variable del loop según el salto
-            stepval = Number(self.loops[-1][1])
-            newvalue = Binary('+', loopvar, stepval)
-     
-            if self.loops[-1][1] < 0:
-                relop = '>='
-            else:
-                relop = '<='
+        stepval = instr.step.accept(self) if instr.step is not None else 1
 
-            if not _is_truthy(Logical(relop, newvalue, finval).accept(self)):
-                # El ciclo se ha completado. Saltar a la instrucción NEXT
-                self.pc = self.loopend[self.pc]
-                self.loops.pop()
-            else:
-                self.assign(loopvar, newvalue)
+        # Hacer la asignación inicial y abrir el ciclo
+        self.assign(loopvar, initval)
+        _enter_loop(self.loops, LoopFrame(self.pc, loopvar.slot, finval, stepval))
 
     def visit(self, instr: Next):
         lineno = self.stat[self.pc]
+        nextvar = instr.ident.slot
+
+        # Descartar los ciclos abandonados con GOTO hasta encontrar el FOR correspondiente
+        while self.loops and self.loops[-1].var != nextvar:
+            self.loops.pop()
         if not self.loops:
-            print(f"NEXT without FOR at line {lineno}")
+            self.output.message(f"NEXT without FOR at line {lineno}")
             return
-        nextvar = instr.ident
-        self.pc = self.loops[-1][0]
-        loopinst = self.prog[self.stat[self.pc]]
-        forvar = loopinst.ident
-        if nextvar != forvar:
-            print(f"NEXT doesn't match FOR at line {lineno}")
-            return
-        raise BasicContinue()
 
-    def visit(self, instr: Union[End, Stop]):
-        if self.write_stats:
-            base = self.fname.split('/')[-1]
-            base1 = base.split('.')[0]
-            fstats = base1 + '_stats.txt'
-            print(f'Dumping text file with stats: {fstats}')
-            with open(fstats, 'w', encoding='utf-8') as fout:
-                with redirect_stdout(fout):
-                    self.print_statistics()
-            if self.print_stats:
-                self.print_statistics()
-            raise BasicExit()
-
-        elif self.print_stats:
-            self.print_statistics()
-            raise BasicExit()
-        
+        # Actualizar la variable del loop según el salto
+        frame = self.loops[-1]
+        newvalue = self.slots[nextvar] + frame.step
+        if (newvalue >= frame.limit) if frame.down else (newvalue <= frame.limit):
+            # Volver a la primera instrucción del cuerpo del ciclo
+            self.slots[nextvar] = newvalue
+            return frame.pc + 1
         else:
-            raise BasicExit()
+            # El ciclo se ha completado
+            self.loops.pop()
+
+    def visit(self, instr: Union[End, Stop]):
+        self.end_program()
+
+    def end_program(self):
+        self.output.flush()
+        raise BasicExit('end')
     
     def visit(self, instr: Def):
         fname = instr.fn
-        pname = instr.ident
+        pslot = instr.slot
         expr = instr.expr
 
-        def eval_func(pvalue, name = pname, self = self, expr = expr):
-            self.vars[name] = pvalue  # Asignar el parámetro a su valor respectivo
+        def eval_func(pvalue, slot = pslot, self = self, expr = expr):
+            self.slots[slot] = pvalue  # Asignar el parámetro a su valor respectivo
             return expr.accept(self)  # Evaluar la expresión de la función
         self.functions[fname] = eval_func
 
     def visit(self, instr: GoSub):
         newline = instr.lineno
         lineno = self.stat[self.pc]
-        if self.gosub:
-            print(f"A subroutine is already in process at line {lineno}")
-            return
-        self.gosub = self.stat[self.pc]
-        self.goto(newline)
-        raise BasicContinue()
+        if len(self.gosub) >= self.gosub_depth:
+            self.error(f"GOSUB nested more than {self.gosub_depth} levels at line {lineno}")
+        target = self.goto(newline)
+        self.gosub.append(self.pc + 1)
+        return target
 
     def visit(self, instr: Return):
         lineno = self.stat[self.pc]
         if not self.gosub:
-            print(f"RETURN without GOSUB at lien {lineno}")
+            self.output.message(f"RETURN without GOSUB at line {lineno}")
             return
-        self.goto(self.gosub)
-        self.gosub = None
+        return self.gosub.pop()
 
     def visit(self, instr: Dim):
         for item in instr.dimlist:
             if isinstance(item, Variable):
-                vname = item.var
+                slot = item.slot
                 dim1 = item.dim1
                 dim2 = item.dim2
 
@@ -551,16 +1029,12 @@ class Interpreter(Visitor):
                 if not dim2:
                     # Variable de una dimensión
                     x = dim1.accept(self)
-                    self.lists[vname] = [0] * x
+                    self.slots[slot] = BasicArray(item.var, self.array_base, x)
                 else:
                     # Variable de doble dimensión
                     x = dim1.accept(self)
                     y = dim2.accept(self)
-                    temp = [0] * y
-                    v = []
-                    for i in range(x):
-                        v.append(temp[:])
-                    self.tables[vname] = v
+                    self.slots[slot] = BasicArray(item.var, self.array_base, x, y)
 
     # Patrón Visitor para expresiones y más (Bltin, Call)
     def visit(self, instr: Group):
@@ -574,8 +1048,8 @@ class Interpreter(Visitor):
         if (name == "MID$") or (name == "mid$"):
             if isinstance(expr, list) and len(expr) == 3:
                 str_val = expr[0].accept(self)  # La cadena original 
-                start = expr[1].accept(self)  # Índice de inicio
-                length = expr[2].accept(self)  # Longitud
+                start = _whole(expr[1].accept(self))  # Índice de inicio
+                length = _whole(expr[2].accept(self))  # Longitud
                 return str_val[start - 1 : start - 1 + length]
             else:
                 self.error("Incorrect parameters for MID$")
@@ -616,30 +1090,28 @@ class Interpreter(Visitor):
         var = instr.var
         dim1 = instr.dim1
         dim2 = instr.dim2
+        value = self.slots[instr.slot]
         lineno = self.stat[self.pc]
         if not dim1 and not dim2:
-            if var in self.vars:
-                return self.vars[var]
+            if value is not None:
+                return value
             else:
                 self.error(f"Undefined variable '{var}' at line {lineno}")
   
         # Evaluación de arreglo unidimensional (lista)
         elif dim1 and not dim2:
-            if var in self.lists:
-                x = dim1.accept(self)
-                if x < self.array_base or x > len(self.lists[var]):
+            if value is not None:
+                k = value.offset(dim1.accept(self))
+                if k < 0:
                     self.error(f'Index of {var} is out of bounds at line {lineno}')
-                return self.lists[var][x - 1]
+                return value.data[k]
       
         elif dim1 and dim2:
-            if var in self.tables:
-                x = dim1.accept(self)
-                y = dim2.accept(self)
-                x = int(x)
-                y = int(y)
-                if x < self.array_base or x > len(self.tables[var]) or y < self.array_base or y > len(self.tables[var][0]):
+            if value is not None:
+                k = value.offset(dim1.accept(self), dim2.accept(self))
+                if k < 0:
                     self.error(f'Indexes of {var} are out of bounds at line {lineno}')
-                return self.tables[var][x - 1][y - 1]
+                return value.data[k]
             
         else:
             self.error(f"Undefined variable '{var}' at line {lineno}")
@@ -716,4 +1188,4 @@ class Interpreter(Visitor):
     
     def visit(self, instr: Node):
         lineno = self.stat[self.pc]
-        print(lineno, instr.__class__.__name__)
+        self.output.message(f"{lineno} {instr.__class__.__name__}")
@@ -8,16 +8,53 @@ desde el código IR generado.
 
 Para ejecutar un programa utilice:
 
-    bash % python3 -m basic64.interp someprogram.bas
+    bash % python3 basic.py -e ir someprogram.bas
+
+o directamente python3 basinterpir.py someprogram.bas.
 
 '''
 import sys
+import math
 import struct
-from baslex import Lexer
-from basparse import Parser
+import operator
 from basast import *
-from ircode import IRGenerator
+from basinterp import BasicExit, LoopFrame, _enter_loop, _whole
+
+# Operaciones binarias con la misma semántica que run_ADDF, run_LTF, ...
+# (las comparaciones dejan 1 o 0). Las usan las superinstrucciones y el
+# plegado de constantes de iroptimize
+OPERATIONS = {
+  'ADDF': operator.add,
+  'SUBF': operator.sub,
+  'MULF': operator.mul,
+  'DIVF': operator.truediv,
+  'POWF': math.pow,
+  'EQF' : lambda a, b: int(a == b),
+  'NEF' : lambda a, b: int(a != b),
+  'LEF' : lambda a, b: int(a <= b),
+  'LTF' : lambda a, b: int(a < b),
+  'GEF' : lambda a, b: int(a >= b),
+  'GTF' : lambda a, b: int(a > b),
+}
+
+COMPARISONS = ('EQF', 'NEF', 'LEF', 'LTF', 'GEF', 'GTF')
+
+
+class Function:
+  '''
+  Función ya cargada: las instrucciones que se ejecutan, decodificadas en
+  métodos y operandos, y por cada una la línea de BASIC de la que proviene
+  '''
+  __slots__ = ('code', 'argnames', 'control', 'handlers', 'operands', 'lines', 'labels')
 
+  def __init__(self, code, argnames, control, handlers, operands, lines, labels):
+    self.code = code            # Instrucciones sin las LINE
+    self.argnames = argnames
+    self.control = control      # Rótulos de IF/ELSE/ENDIF y LOOP/ENDLOOP
+    self.handlers = handlers    # Método run_<opcode> de cada instrucción
+    self.operands = operands    # Operandos de cada instrucción
+    self.lines = lines          # Línea de BASIC de cada instrucción (None en un FN)
+    self.labels = labels        # Línea de BASIC -> índice de su primera instrucción
 
 class Interpreter:
   '''
@@ -43,35 +80,54 @@ class Interpreter:
   Sólo un recordatorio de que el código intermedio se basa en una máquina de pila.
   El intérprete necesita implementar la pila y la memoria para almacenar variables.
   '''
-  def __init__(self):
+  def __init__(self, rt):
+    # Intérprete de basinterp que aporta la salida, INPUT, los errores,
+    # las funciones predefinidas y las opciones de ejecución
+    self.rt = rt
     self.code = []
     self.pc = 0
 
+    # Funciones: nombre -> Function
+    self.functions = { }
+
+    # Valores de DATA
+    self.data = []
+
+    # Perfilado (benchmarks/bench_pairs.py): Counter de pares de opcodes
+    # ejecutados uno tras otro sin salto entre ellos
+    self.pairs = None
+
+    self.reset()
+
+  def reset(self):
     # Almacenamiento de variables
     self.globals = { }
     self.vars = { }
 
-    # Pila frame stack
+    # Pila frame stack y función en ejecución
     self.frames = [ ]
+    self.function = None
 
     # La pila de operaciones
     self.stack = [ ]
 
-    # Memoria
+    # Memoria: números en memory (8 bytes por elemento) y strings en heap
     self.memory = bytearray()
+    self.heap = []
+
+    # Listas y tablas: (nombre, dimensiones) -> [dirección, filas, columnas]
+    self.arrays = { }
 
     # Rotulos flujo-control
     self.control = { }
 
-    # Tabla de funciones
-    self.functions = { }
-
-    # Tabla de índices de instrucciones IR para 'GOTO'
-    self.line_to_index = {}
-
     # Tabla de subrutinas para 'GOSUB'
     self.call_stack = []
 
+    # Ciclos FOR activos y contador de DATA
+    self.loops = []
+    self.dc = 0
+
   def push(self, value):
     self.stack.append(value)
 
@@ -79,6 +135,32 @@ class Interpreter:
     return self.stack.pop()
 
   def add_function(self, name, argnames, code):
+    # Las LINE solo marcan dónde empieza cada línea: se pasan a una tabla
+    # aparte y no se ejecutan (salvo con -t, que las usa para imprimir)
+    trace = self.rt.trace
+    body = []
+    lines = []
+    labels = { }
+    lineno = None
+    for inst in code:
+      if inst[0] == 'LINE':
+        lineno = inst[1]
+        labels[lineno] = len(body)
+        if not trace:
+          continue
+      body.append(inst)
+      lines.append(lineno)
+
+    # Resolver los saltos a índices de instrucciones. En las
+    # superinstrucciones <op>_JUMP el destino es el último operando
+    code = []
+    for inst, *args in body:
+      if inst == 'GOSUB' or inst.endswith('JUMP'):
+        if args[-1] not in labels:
+          raise Exception(f"Line number {args[-1]} not found")
+        args[-1] = labels[args[-1]]
+      code.append((inst, *args))
+
     # muestra etiquetas de flujo de control
     control = { }
     levels = []
@@ -100,28 +182,88 @@ class Interpreter:
         control[levels[-1]] = n
         levels.pop()
         levels.pop()
-    self.functions[name] = (code, argnames, control)
+
+    # Decodificar una sola vez: método de cada instrucción y sus operandos
+    handlers = [getattr(self, f'run_{inst}') for inst, *args in code]
+    operands = [tuple(args) for inst, *args in code]
+    self.functions[name] = Function(code, argnames, control, handlers, operands, lines, labels)
+
+  def load(self, code, functions, data):
+    '''
+    Carga el programa generado por IRGenerator: el código principal, los
+    cuerpos de los DEF FN y los valores de DATA
+    '''
+    self.add_function('main', [], code)
+    for name, fcode in functions.items():
+      self.add_function(name, [], fcode)
+    self.data = data
+
+  def run(self):
+    '''
+    Ejecuta el programa desde el principio. Los errores de Python en una
+    operación se reportan con la línea de BASIC que se estaba ejecutando.
+    '''
+    self.reset()
+    try:
+      self.execute('main')
+    except (TypeError, struct.error):
+      self.rt.error(f"Type mismatch at line {self.line()}")
+    except (ArithmeticError, ValueError) as e:
+      self.rt.error(f"{e} at line {self.line()}")
+
+  def line(self):
+    '''
+    Línea de BASIC en ejecución. El cuerpo de un FN no tiene líneas propias:
+    se usa la de la instrucción que lo llamó.
+    '''
+    calls = [(self.function, self.pc)] + [(function, pc) for function, pc, vars in reversed(self.frames)]
+    for function, pc in calls:
+      if function is not None and pc < len(function.lines) and function.lines[pc] is not None:
+        return function.lines[pc]
+    return None
+
+  def fault(self, message):
+    self.rt.error(f"{message} at line {self.line()}")
 
   def execute(self, name):
-    self.frames.append((self.code, self.pc, self.control, self.vars))
-    self.code, argnames, self.control = self.functions[name]
+    self.frames.append((self.function, self.pc, self.vars))
+    function = self.function = self.functions[name]
+    self.code = function.code
+    self.control = function.control
     self.vars = { }
 
-    # Map line numbers to instruction indices
-    for idx, (inst, *args) in enumerate(self.code):
-      if inst == 'LINE':
-          self.line_to_index[args[0]] = idx
-
-    for argname in argnames[::-1]:
+    for argname in function.argnames[::-1]:
       value = self.pop()
       self.vars[argname] = value
 
+    handlers = function.handlers
+    operands = function.operands
     self.pc = 0
-    while self.pc < len(self.code):
-      inst, *args = self.code[self.pc]
-      getattr(self, f'run_{inst}')(*args)
+    end = len(handlers)
+    if self.pairs is not None:
+      self.count(function)
+    else:
+      while self.pc < end:
+        handlers[self.pc](*operands[self.pc])
+        self.pc += 1
+    self.function, self.pc, self.vars = self.frames.pop()
+    if self.function is not None:
+      self.code = self.function.code
+      self.control = self.function.control
+
+  def count(self, function):
+    # Igual que el ciclo de execute, contando cada par de instrucciones
+    # consecutivas del código que se ejecutan una después de la otra
+    handlers, operands, code = function.handlers, function.operands, function.code
+    pairs = self.pairs
+    last = None
+    while self.pc < len(handlers):
+      pc = self.pc
+      handlers[pc](*operands[pc])
+      if last == pc - 1:
+        pairs[code[last][0], code[pc][0]] += 1
+      last = pc
       self.pc += 1
-    self.code, self.pc, self.control, self.vars = self.frames.pop()
 
   # Interpreter opcodes
   def run_CONSTI(self, value):
@@ -133,7 +275,9 @@ class Interpreter:
         self.push(-value)
 
   def run_ADDI(self):
-    self.push(self.pop() + self.pop())
+    right = self.pop()
+    left = self.pop()
+    self.push(left + right)
   run_ADDF = run_ADDI
 
   def run_SUBI(self):
@@ -143,7 +287,9 @@ class Interpreter:
   run_SUBF = run_SUBI
 
   def run_MULI(self):
-    self.push(self.pop() * self.pop())
+    right = self.pop()
+    left = self.pop()
+    self.push(left * right)
   run_MULF = run_MULI
 
   def run_DIVI(self):
@@ -162,24 +308,50 @@ class Interpreter:
   def run_FTOI(self):
     self.push(int(self.pop()))
 
+  def run_POWF(self):
+    right = self.pop()
+    left = self.pop()
+    self.push(math.pow(left, right))
+
   def run_PRINTI(self):
-    try:
-      print(self.pop())
-    except:
-      pass
+    self.rt.output.write(f'{self.pop()}')
+    self.rt.output.newline()
   run_PRINTF = run_PRINTI
 
   def run_PRINTB(self):
-      try:
-        print(chr(self.pop()),end='')
-      except:
-        pass
+    self.rt.output.write(chr(self.pop()))
+
+  # PRINT de BASIC: strings tal cual y números con formato 'g'
+  def run_PRINT(self):
+    value = self.pop()
+    if isinstance(value, str):
+      self.rt.output.write(value)
+    elif isinstance(value, (int, float)):
+      self.rt.output.write(f'{value:g}')
+    else:
+      self.fault(f"Unexpected element {value} inside PRINT instruction")
+
+  # Separador ',' de PRINT
+  def run_PAD(self):
+    self.rt.output.pad(self.rt.tabs)
+
+  def run_NEWLINE(self):
+    self.rt.output.newline()
+
+  def run_CONSTS(self, value):
+    self.push(value)
 
   def run_LOCAL_GET(self, name):
-    self.push(self.vars[name])
+    try:
+      self.push(self.vars[name])
+    except KeyError:
+      self.fault(f"Undefined variable '{name}'")
 
   def run_GLOBAL_GET(self, name):
-    self.push(self.globals[name])
+    try:
+      self.push(self.globals[name])
+    except KeyError:
+      self.fault(f"Undefined variable '{name}'")
 
   def run_LOCAL_SET(self, name):
     self.vars[name] = self.pop()
@@ -187,6 +359,16 @@ class Interpreter:
   def run_GLOBAL_SET(self, name):
     self.globals[name] = self.pop()
 
+  # Generadas por iroptimize: guardar sin sacar de la pila y X = X + step
+  def run_GLOBAL_TEE(self, name):
+    self.globals[name] = self.stack[-1]
+
+  def run_INCR(self, name, step):
+    try:
+      self.globals[name] += step
+    except KeyError:
+      self.fault(f"Undefined variable '{name}'")
+
   def run_LEI(self):
     right = self.pop()
     left = self.pop()
@@ -266,24 +448,137 @@ class Interpreter:
     addr = self.pop()
     self.memory[addr] = value
 
+  # Listas y tablas
+  def run_GROWS(self):
+    self.heap.extend([''] * self.pop())
+    self.push(len(self.heap))
+
+  def run_PEEKS(self):
+    self.push(self.heap[self.pop()])
+
+  def run_POKES(self):
+    value = self.pop()
+    addr = self.pop()
+    self.heap[addr] = value
+
+  def run_DIM(self, name, ndims):
+    # Deja en la pila el tamaño del arreglo para GROW (bytes) o GROWS (elementos)
+    base = self.rt.array_base
+    cols = max(int(self.pop()) - base + 1, 0) if ndims == 2 else 1
+    rows = max(int(self.pop()) - base + 1, 0)
+    self.arrays[name, ndims] = [None, rows, cols]
+    self.push(rows * cols * (1 if name[-1] == '$' else 8))
+
+  def run_BIND(self, name, ndims):
+    # GROW deja la dirección final de la memoria reservada
+    array = self.arrays[name, ndims]
+    array[0] = self.pop() - array[1] * array[2] * (1 if name[-1] == '$' else 8)
+
+  def run_AUTODIM(self, name, ndims):
+    # Listas y tablas sin DIM: se crean de tamaño 10 al asignarlas
+    if (name, ndims) not in self.arrays:
+      for _ in range(ndims):
+        self.push(10)
+      self.run_DIM(name, ndims)
+      self.run_GROWS() if name[-1] == '$' else self.run_GROW()
+      self.run_BIND(name, ndims)
+
+  def run_INDEX(self, name, ndims):
+    # Dirección de un elemento (índices en la pila)
+    base = self.rt.array_base
+    j = int(self.pop()) - base if ndims == 2 else 0
+    i = int(self.pop()) - base
+    array = self.arrays.get((name, ndims))
+    if array is None:
+      self.fault(f"Undefined variable '{name}'")
+    addr, rows, cols = array
+    if i < 0 or i >= rows or j < 0 or j >= cols:
+      self.fault(f'Index of {name} is out of bounds' if ndims == 1 else f'Indexes of {name} are out of bounds')
+    self.push(addr + (i * cols + j) * (1 if name[-1] == '$' else 8))
+
+  # Los destinos de JUMP y GOSUB ya son índices (add_function)
   def run_JUMP(self, target):
-      if target in self.line_to_index:
-            self.pc = self.line_to_index[target] - 1
-      else:
-            raise Exception(f"Line number {target} not found")
-      
+      self.pc = target - 1
+
   def run_GOSUB(self, target):
-        if target in self.line_to_index:
-            self.pc = self.line_to_index[target] - 1
-            self.call_stack.append(self.pc)
-        else:
-            raise Exception(f"Line number {target} not found")
+        depth = self.rt.gosub_depth
+        if len(self.call_stack) >= depth:
+            self.fault(f"GOSUB nested more than {depth} levels")
+        # RETURN vuelve a la instrucción siguiente al GOSUB
+        self.call_stack.append(self.pc)
+        self.pc = target - 1
 
   def run_RETGS(self):
-        try:
-          self.pc = self.call_stack.pop()
-        except:
-          pass
+        if not self.call_stack:
+          self.rt.output.message(f"RETURN without GOSUB at line {self.line()}")
+          return
+        self.pc = self.call_stack.pop()
+
+  # Ciclos FOR/NEXT: el límite y el salto se evalúan una sola vez en FOR
+  def run_FOR(self, var):
+    step = self.pop()
+    limit = self.pop()
+    _enter_loop(self.loops, LoopFrame(self.pc, var, limit, step))
+
+  def run_NEXT(self, var):
+    loops = self.loops
+    # Descartar los ciclos abandonados con GOTO hasta encontrar el FOR correspondiente
+    while loops and loops[-1].var != var:
+      loops.pop()
+    if not loops:
+      self.rt.output.message(f"NEXT without FOR at line {self.line()}")
+      return
+    frame = loops[-1]
+    value = self.globals[var] + frame.step
+    if (value >= frame.limit) if frame.down else (value <= frame.limit):
+      # Volver a la instrucción siguiente al FOR
+      self.globals[var] = value
+      self.pc = frame.pc
+    else:
+      loops.pop()
+
+  # DATA, READ e INPUT
+  def run_RESTORE(self):
+    self.dc = 0
+
+  def read(self):
+    if self.dc >= len(self.data):
+      # No hay más datos para procesar. El programa termina de ejecutarse
+      raise BasicExit('out_of_data')
+    value = self.data[self.dc]
+    self.dc += 1
+    return value
+
+  def run_READF(self):
+    value = self.read()
+    try:
+      self.push(float(value))
+    except ValueError:
+      self.rt.error(f"The value {value} could not be read.")
+
+  def run_READS(self):
+    value = self.read()
+    self.push(value if isinstance(value, str) else str(value))
+
+  def run_INPUT(self, label):
+    self.rt.input_prompt(label)
+
+  def run_INPUTV(self, name):
+    self.push(self.rt.input_value(name, self.line()))
+
+  # Funciones predefinidas
+  def run_BLTIN(self, name, nargs):
+    args = self.stack[len(self.stack) - nargs:]
+    del self.stack[len(self.stack) - nargs:]
+    if name in ('MID$', 'mid$'):
+      s, start, length = args
+      start = _whole(start)
+      self.push(s[start - 1 : start - 1 + _whole(length)])
+      return
+    func = self.rt.functions.get(name)
+    if func is None:
+      self.rt.error(f"Undefined function {name}")
+    self.push(func(*args))
 
   def run_IF(self):
     if not self.pop():
@@ -305,51 +600,95 @@ class Interpreter:
   def run_ENDLOOP(self):
     self.pc = self.control[self.pc]
 
+  # Solo se ejecuta con -t
   def run_LINE(self, line):
-    pass
+    self.rt.output.message(f"Executing line {line}")
 
   def run_CALL(self, name):
+    if name not in self.functions:
+      self.rt.error(f"Undefined function {name}")
     self.execute(name)
 
   def run_RET(self):
     self.pc = len(self.code)
 
-def run(module):
-  interpreter = Interpreter()
-  has_main = False
-  for func in module.functions.values():
-    argnames = func.parmnames
-    interpreter.add_function(func.name, argnames, func.code)
+  def run_END(self):
+    self.rt.end_program()
 
-  interpreter.execute('main')
+  def run_ERROR(self, message):
+    self.rt.error(message)
 
-def main():
-    
-    context = None
-    l = Lexer()
-    p = Parser(context)
+# Superinstrucciones (iroptimize.Fusion): por cada operación binaria, la
+# operación con sus operandos en variables o constantes, seguida de un
+# GLOBAL_SET o, en las comparaciones, de IF; JUMP; ENDIF
+def _superinstructions(name, op):
+  def run_GLOBALS(self, a, b):
+    try:
+      self.stack.append(op(self.globals[a], self.globals[b]))
+    except KeyError:
+      self.fault(f"Undefined variable '{a if a not in self.globals else b}'")
+
+  def run_GLOBAL(self, name):
+    try:
+      self.stack[-1] = op(self.stack[-1], self.globals[name])
+    except KeyError:
+      self.fault(f"Undefined variable '{name}'")
+
+  def run_CONST(self, value):
+    self.stack[-1] = op(self.stack[-1], value)
 
+  def run_SET(self, name):
+    right = self.stack.pop()
+    self.globals[name] = op(self.stack.pop(), right)
+
+  def run_GLOBAL_SET(self, name, target):
+    try:
+      self.globals[target] = op(self.stack.pop(), self.globals[name])
+    except KeyError:
+      self.fault(f"Undefined variable '{name}'")
+
+  def run_JUMP(self, target):
+    right = self.stack.pop()
+    if op(self.stack.pop(), right):
+      self.pc = target - 1
+
+  def run_CONST_JUMP(self, value, target):
+    if op(self.stack.pop(), value):
+      self.pc = target - 1
+
+  def run_GLOBAL_CONST_JUMP(self, name, value, target):
+    try:
+      if op(self.globals[name], value):
+        self.pc = target - 1
+    except KeyError:
+      self.fault(f"Undefined variable '{name}'")
+
+  handlers = {'GLOBALS': run_GLOBALS, 'GLOBAL': run_GLOBAL, 'CONST': run_CONST, 'SET': run_SET, 'GLOBAL_SET': run_GLOBAL_SET}
+  if name in COMPARISONS:
+    handlers.update({'JUMP': run_JUMP, 'CONST_JUMP': run_CONST_JUMP, 'GLOBAL_CONST_JUMP': run_GLOBAL_CONST_JUMP})
+  return handlers
+
+for _name, _op in OPERATIONS.items():
+  for _suffix, _handler in _superinstructions(_name, _op).items():
+    setattr(Interpreter, f'run_{_name}_{_suffix}', _handler)
+
+def main():
     if len(sys.argv) != 2:
         print("Uso: python basinterpir.py <archivo.bas>")
         sys.exit(1)
-    
-    source_file = sys.argv[1]
 
+    from bascontext import Context
+    source_file = sys.argv[1]
     try:
         with open(source_file, 'r') as file:
             source_code = file.read()
-            tokens = l.tokenize(source_code)
-            ast = p.parse(tokens)
-            generator = IRGenerator()
-            generated_code = generator.generate(ast)
-            print(generated_code)
-            interpreter = Interpreter()
-            interpreter.add_function('main', [], generated_code)
-            interpreter.execute('main')
     except FileNotFoundError:
         print(f"File '{source_file}' wasn't found.")
-    except Exception as e:
-        print(f"An error occurred during program execution: {e}")
+        sys.exit(1)
+
+    context = Context()
+    context.parse(source_code)
+    context.run(False, 1, False, False, False, 15, None, source_file, False, False, False, None, engine='ir')
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,153 @@
+# basoptimize.py
+
+'''
+Optimizador del AST para BASIC DARTMOUTH 64
+
+Pasada opcional (-O) entre el análisis sintáctico y la ejecución:
+
+  * Elimina los nodos Group que el parser crea para cada paréntesis.
+  * Pliega subexpresiones constantes (Binary, Unary y Bltin puras) en un
+    único Number o String.
+  * Reescribe X^2 como X*X para evitar math.pow.
+
+Las expresiones que fallarían al evaluarse (división por cero, LOG de un
+negativo, ...) no se pliegan, de modo que el error se sigue reportando en
+tiempo de ejecución con su número de línea.
+'''
+
+import math
+import operator
+from dataclasses import fields
+from typing import Dict
+
+from basast import *
+
+# Operadores aritméticos con la misma semántica que los motores de ejecución
+FOLD_OPS = {
+    '+': operator.add,
+    '-': operator.sub,
+    '*': operator.mul,
+    '/': operator.truediv,
+    '^': math.pow,
+}
+
+# Funciones predefinidas sin efectos secundarios (RND, TIME y TAB no se pliegan)
+PURE_FUNCTIONS = {
+    'SIN'   : math.sin,
+    'COS'   : math.cos,
+    'TAN'   : math.tan,
+    'ATN'   : math.atan,
+    'EXP'   : math.exp,
+    'ABS'   : abs,
+    'LOG'   : math.log,
+    'SQR'   : math.sqrt,
+    'INT'   : int,
+    'DEG'   : lambda x: x * (180.0/3.141592654),
+    'PI'    : lambda: 3.141592654,
+}
+
+def count_nodes(value, bodies = None):
+    '''
+    Cantidad de nodos del AST alcanzables desde value. Con bodies (FN ->
+    nodos de su cuerpo) cada llamada a un FN suma también los de su cuerpo
+    '''
+    if isinstance(value, Node):
+        count = 1 + bodies.get(value.name, 0) if bodies and isinstance(value, Call) else 1
+        return count + sum(count_nodes(getattr(value, f.name), bodies) for f in fields(value))
+    if isinstance(value, (list, tuple)):
+        return sum(count_nodes(item, bodies) for item in value)
+    if isinstance(value, dict):
+        return sum(count_nodes(item, bodies) for item in value.values())
+    return 0
+
+def _is_number(node):
+    return isinstance(node, Number) and not isinstance(node.value, bool)
+
+def _is_string(node):
+    return isinstance(node, String) and node.expr is None
+
+
+class Optimizer(Visitor):
+    '''
+    Cada visit devuelve el nodo optimizado (el mismo nodo o uno nuevo).
+    Las instrucciones se modifican en el sitio.
+    '''
+
+    @classmethod
+    def optimize(cls, prog: Dict[int, Statement]):
+        '''
+        Optimiza el programa en el sitio y retorna la cantidad de nodos eliminados
+        '''
+        before = count_nodes(prog)
+        optimizer = cls()
+        for lineno in sorted(prog):
+            prog[lineno] = prog[lineno].accept(optimizer)
+        return before - count_nodes(prog)
+
+    def walk(self, value):
+        if isinstance(value, Node):
+            return value.accept(self)
+        if isinstance(value, list):
+            return [self.walk(item) for item in value]
+        if isinstance(value, tuple):
+            return tuple(self.walk(item) for item in value)
+        return value
+
+    def visit(self, node: Group):
+        return self.walk(node.expr)
+
+    def visit(self, node: Logical):
+        node.left = self.walk(node.left)
+        node.right = self.walk(node.right)
+        return node
+
+    def visit(self, node: Binary):
+        left = node.left = self.walk(node.left)
+        right = node.right = self.walk(node.right)
+        op = node.op
+
+        if _is_number(left) and _is_number(right) and op in FOLD_OPS:
+            try:
+                return Number(FOLD_OPS[op](left.value, right.value))
+            except (ArithmeticError, ValueError):
+                return node
+
+        if _is_string(left) and _is_string(right) and op == '+':
+            return String(left.value + right.value)
+
+        # X^2 -> X*X (solo variables simples: evaluarlas dos veces es gratis)
+        if (op == '^' and _is_number(right) and right.value == 2
+                and isinstance(left, Variable) and left.dim1 is None
+                and left.var[-1] != '$'):
+            return Binary('*', left, left)
+        return node
+
+    def visit(self, node: Unary):
+        expr = node.expr = self.walk(node.expr)
+        if node.op == '-' and _is_number(expr):
+            return Number(-expr.value)
+        return node
+
+    def visit(self, node: Bltin):
+        node.expr = self.walk(node.expr)
+        func = PURE_FUNCTIONS.get(node.name.upper())
+        if func is None:
+            return node
+
+        if node.expr is None:
+            args = []
+        elif isinstance(node.expr, list):
+            args = node.expr
+        else:
+            args = [node.expr]
+        if not all(_is_number(arg) for arg in args):
+            return node
+        try:
+            return Number(func(*(arg.value for arg in args)))
+        except (ArithmeticError, ValueError, TypeError):
+            return node
+
+    def visit(self, node: Node):
+        for f in fields(node):
+            setattr(node, f.name, self.walk(getattr(node, f.name)))
+        return node
@@ -1,6 +1,8 @@
 # basparse.py
 
-from rich import print
+import os
+import hashlib
+import marshal
 import sly
 
 from baslex    import Lexer
@@ -9,10 +11,100 @@ from basast    import *
 class SyntaxError(Exception):
     pass
 
+# Caché de las tablas LALR, junto a los .pyc del módulo
+TABLES_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), '__pycache__', 'basparse.lrtab')
+
+class CachedLRTable:
+    '''
+    Tablas LALR leídas del caché. Solo contiene lo que usa sly.Parser.parse;
+    el detalle de los estados (parse.txt) se obtiene con Parser.write_debugfile
+    '''
+    def __init__(self, lr_action, lr_goto, defaulted_states, sr_conflicts, rr_conflicts):
+        self.lr_action = lr_action
+        self.lr_goto = lr_goto
+        self.defaulted_states = defaulted_states
+        self.sr_conflicts = sr_conflicts
+        self.rr_conflicts = rr_conflicts
+
+def grammar_hash(grammar):
+    '''
+    Hash de todo lo que determina las tablas: producciones, precedencias,
+    terminales y versión de sly
+    '''
+    h = hashlib.sha256()
+    h.update(f'{sly.__version__} {marshal.version}'.encode())
+    for p in grammar.Productions:
+        h.update(repr((p.name, p.prod, p.prec)).encode())
+    h.update(repr(sorted(grammar.Precedence.items())).encode())
+    h.update(repr(sorted(grammar.Terminals)).encode())
+    return h.digest()
+
+def load_tables(key):
+    try:
+        with open(TABLES_FILE, 'rb') as fin:
+            blob = fin.read()
+    except OSError:
+        return None
+    if not blob.startswith(key):
+        return None
+    try:
+        return CachedLRTable(*marshal.loads(blob[len(key):]))
+    except (ValueError, EOFError, TypeError):
+        return None
+
+def save_tables(key, lrtable):
+    blob = key + marshal.dumps((lrtable.lr_action, lrtable.lr_goto, lrtable.defaulted_states, lrtable.sr_conflicts, lrtable.rr_conflicts))
+    try:
+        os.makedirs(os.path.dirname(TABLES_FILE), exist_ok=True)
+        with open(TABLES_FILE + '.tmp', 'wb') as fout:
+            fout.write(blob)
+        os.replace(TABLES_FILE + '.tmp', TABLES_FILE)
+    except OSError:
+        pass  # Sin caché: el próximo arranque vuelve a construir las tablas
+
 class Parser(sly.Parser):
 
     expected_shift_reduce = 2
-    debugfile = 'parse.txt'
+    debugfile = None        # parse.txt solo a pedido (Parser.write_debugfile)
+
+    # sly construye las tablas LALR al crear la clase, en cada importación.
+    # Se reemplaza ese paso (sly.Parser.__build_lrtables) para leerlas del
+    # caché cuando la gramática no ha cambiado.
+    @classmethod
+    def _Parser__build_lrtables(cls):
+        key = grammar_hash(cls._grammar)
+        lrtable = load_tables(key)
+        if lrtable is not None:
+            cls.report_conflicts(lrtable)
+            cls._lrtable = lrtable
+            return True
+        sly.Parser._Parser__build_lrtables.__func__(cls)
+        save_tables(key, cls._lrtable)
+        return True
+
+    @classmethod
+    def report_conflicts(cls, lrtable):
+        # Las mismas advertencias que sly da al construir las tablas, para
+        # que con el caché no se pierdan los conflictos inesperados
+        for count, expected, kind in ((len(lrtable.sr_conflicts), cls.expected_shift_reduce, 'shift/reduce'),
+                                      (len(lrtable.rr_conflicts), getattr(cls, 'expected_reduce_reduce', None), 'reduce/reduce')):
+            if count != expected:
+                if count == 1:
+                    cls.log.warning('1 %s conflict', kind)
+                elif count > 1:
+                    cls.log.warning('%d %s conflicts', count, kind)
+
+    @classmethod
+    def write_debugfile(cls, filename = 'parse.txt'):
+        # Gramática y estados del autómata, como el debugfile de sly. Las
+        # tablas del caché no guardan los estados: se construyen de nuevo
+        lrtable = cls._lrtable
+        if isinstance(lrtable, CachedLRTable):
+            lrtable = sly.yacc.LRTable(cls._grammar)
+        with open(filename, 'w') as f:
+            f.write(str(cls._grammar))
+            f.write('\n')
+            f.write(str(lrtable))
 
     tokens = Lexer.tokens
 
@@ -426,12 +518,14 @@ class Parser(sly.Parser):
         if self.context:
             self.context.error(lineno, f"Syntax Error: {value}")
         else:
+            from rich import print
             print(f"Syntax Error: {value} at line {lineno}")
 
     def __init__(self, context = None):
         self.context = context
 
 def test(txt):
+    from rich import print
     l = Lexer()
     p = Parser()
     try:
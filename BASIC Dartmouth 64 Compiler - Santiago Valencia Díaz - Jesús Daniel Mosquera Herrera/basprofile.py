@@ -0,0 +1,138 @@
+# basprofile.py
+
+'''
+Perfilador por línea para BASIC DARTMOUTH 64 (--profile)
+
+Reemplaza el ciclo principal del intérprete por uno que mide cada
+instrucción con perf_counter_ns, de modo que sin --profile el ciclo normal
+no paga ningún chequeo. Por cada línea se registran:
+
+  * hits: cantidad de ejecuciones
+  * self: tiempo de la propia instrucción (incluye las funciones FN que use)
+  * cum:  para GOSUB, el tiempo desde la llamada hasta su RETURN; para el
+          resto de las líneas es igual a self
+
+Al terminar se escribe <programa>_profile.txt y <programa>_profile.json,
+ordenados por tiempo propio, además de un resumen por tipo de instrucción.
+'''
+
+import json
+import time
+
+class Profiler:
+    def __init__(self, interp):
+        self.interp = interp
+        size = len(interp.stat)
+        # Las cuentas quedan también en el intérprete para -p/-w
+        self.hits = interp.hits = [0] * size    # pc -> ejecuciones
+        self.taken = interp.taken = [0] * size  # pc -> saltos tomados
+        self.self_ns = [0] * size    # pc -> tiempo propio
+        self.cum_ns = [0] * size     # pc -> tiempo de los GOSUB hasta su RETURN
+        self.calls = []              # GOSUB activos: (pc, inicio)
+        self.total_ns = 0
+
+    def run(self, step):
+        '''
+        Ciclo principal perfilado. step(pc) ejecuta una línea y retorna el
+        destino de un salto o None, igual que en run_compiled/run_visitor.
+        '''
+        interp = self.interp
+        hits, taken, self_ns, cum_ns, calls = self.hits, self.taken, self.self_ns, self.cum_ns, self.calls
+        gosub = interp.gosub
+        clock = time.perf_counter_ns
+        pc = interp.pc
+        begin = clock()
+        try:
+            while True:
+                depth = len(gosub)
+                start = clock()
+                try:
+                    target = step(pc)
+                finally:
+                    # END, STOP y los errores terminan con BasicExit: se cuenta la línea igual
+                    end = clock()
+                    hits[pc] += 1
+                    self_ns[pc] += end - start
+                if len(gosub) > depth:
+                    calls.append((pc, start))
+                elif len(gosub) < depth and calls:
+                    caller, called = calls.pop()
+                    cum_ns[caller] += end - called
+                if target is None:
+                    pc += 1
+                else:
+                    taken[pc] += 1
+                    pc = target
+        finally:
+            end = clock()
+            interp.pc = pc
+            # Subrutinas que no llegaron a su RETURN
+            while calls:
+                caller, called = calls.pop()
+                cum_ns[caller] += end - called
+            self.total_ns = end - begin
+
+    def lines(self):
+        '''
+        Una entrada por cada línea ejecutada, de mayor a menor tiempo propio
+        '''
+        interp = self.interp
+        rows = []
+        for pc, hits in enumerate(self.hits):
+            if hits:
+                lineno = interp.stat[pc]
+                rows.append({
+                    'line'     : lineno,
+                    'statement': interp.prog[lineno].__class__.__name__,
+                    'hits'     : hits,
+                    'self_ns'  : self.self_ns[pc],
+                    'cum_ns'   : self.cum_ns[pc] or self.self_ns[pc],
+                })
+        rows.sort(key = lambda row: (-row['self_ns'], row['line']))
+        return rows
+
+    def statements(self):
+        '''
+        Totales por tipo de instrucción, de mayor a menor tiempo propio
+        '''
+        totals = {}
+        for row in self.lines():
+            entry = totals.setdefault(row['statement'], {'statement': row['statement'], 'hits': 0, 'self_ns': 0})
+            entry['hits'] += row['hits']
+            entry['self_ns'] += row['self_ns']
+        return sorted(totals.values(), key = lambda row: (-row['self_ns'], row['statement']))
+
+    def report(self):
+        total = self.total_ns or 1
+        lines = self.lines()
+        text = [f'Profile of {self.interp.fname} ({self.interp.engine} engine): {self.total_ns / 1e6:.3f} ms']
+        text.append('')
+        text.append(f'{"Line":>8}  {"Statement":<12}{"Hits":>10}{"Self ms":>12}{"Cum ms":>12}{"Self %":>9}')
+        for row in lines:
+            text.append(f'{row["line"]:>8}  {row["statement"]:<12}{row["hits"]:>10}'
+                        f'{row["self_ns"] / 1e6:>12.3f}{row["cum_ns"] / 1e6:>12.3f}{100 * row["self_ns"] / total:>8.1f}%')
+        text.append('')
+        text.append(f'{"Statement":<12}{"Hits":>10}{"Self ms":>12}{"Self %":>9}')
+        for row in self.statements():
+            text.append(f'{row["statement"]:<12}{row["hits"]:>10}{row["self_ns"] / 1e6:>12.3f}{100 * row["self_ns"] / total:>8.1f}%')
+        return '\n'.join(text) + '\n'
+
+    def to_json(self):
+        return {
+            'program'   : self.interp.fname,
+            'engine'    : self.interp.engine,
+            'total_ns'  : self.total_ns,
+            'lines'     : self.lines(),
+            'statements': self.statements(),
+        }
+
+    def write(self):
+        base = (self.interp.fname or 'basic').split('/')[-1]
+        base1 = base.split('.')[0]
+        ftext = base1 + '_profile.txt'
+        fjson = base1 + '_profile.json'
+        print(f'Dumping profile: {ftext}, {fjson}')
+        with open(ftext, 'w', encoding='utf-8') as fout:
+            fout.write(self.report())
+        with open(fjson, 'w', encoding='utf-8') as fout:
+            json.dump(self.to_json(), fout, indent = 2)
@@ -0,0 +1,553 @@
+# baspython.py
+
+'''
+Traductor de BASIC DARTMOUTH 64 a Python
+
+Backend alternativo a ircode.IRGenerator. El programa se traduce a un módulo
+Python con una única función main(rt):
+
+  * Las variables de BASIC son variables locales de main (v_X, l_X, t_X).
+  * Las líneas se agrupan en bloques, uno por cada destino de salto (GOTO,
+    IF-THEN, GOSUB, cuerpo de un FOR). Un ciclo while despacha el bloque
+    actual L con un árbol de comparaciones.
+  * Los errores de ejecución se reportan con el número de línea de BASIC a
+    partir de la línea del código generado donde ocurrieron.
+
+El módulo se compila con compile() y el objeto de código se guarda en
+__bascache__/ junto al archivo .bas, indexado por un hash del código fuente
+y de las opciones que cambian el código generado. Una segunda ejecución del
+mismo programa no pasa por el lexer, el parser ni el generador.
+'''
+
+import os
+import re
+import sys
+import math
+import hashlib
+import marshal
+import importlib.util
+
+from typing import Dict, Union
+
+from basast import *
+from basinterp import Interpreter, BasicExit, BasicArray, LoopFrame, _enter_loop, _whole, _flatten
+
+VERSION = 3             # Cambiar cuando cambie el código generado
+CACHE_DIR = '__bascache__'
+
+# Operadores de BASIC -> Python
+PY_OPS = {
+    '+' : '+',
+    '-' : '-',
+    '*' : '*',
+    '/' : '/',
+    '=' : '==',
+    '<>': '!=',
+    '<' : '<',
+    '<=': '<=',
+    '>' : '>',
+    '>=': '>=',
+}
+
+class BasicFault(Exception):
+    '''
+    Error de ejecución dentro del código generado. Al reportarlo se le
+    agrega el número de línea de BASIC.
+    '''
+
+# Funciones de soporte para el código generado
+def _text(value):
+    if isinstance(value, str):
+        return value
+    if isinstance(value, (int, float)):
+        return f'{value:g}'
+    raise BasicFault(f"Unexpected element {value} inside PRINT instruction")
+
+def _number(value):
+    try:
+        return float(value)
+    except ValueError:
+        raise BasicFault(f"The value {value} could not be read")
+
+def _string(value):
+    return value if isinstance(value, str) else str(value)
+
+def _mid(s, start, length):
+    start = _whole(start)
+    return s[start - 1 : start - 1 + _whole(length)]
+
+def _load1(values, x, name):
+    if values is None:
+        raise BasicFault(f"Undefined variable '{name}'")
+    i = int(x) - values.base
+    if i < 0 or i >= values.rows:
+        raise BasicFault(f'Index of {name} is out of bounds')
+    return values.data[i]
+
+def _load2(table, x, y, name):
+    if table is None:
+        raise BasicFault(f"Undefined variable '{name}'")
+    i = int(x) - table.base
+    j = int(y) - table.base
+    if i < 0 or i >= table.rows or j < 0 or j >= table.cols:
+        raise BasicFault(f'Indexes of {name} are out of bounds')
+    return table.data[i * table.cols + j]
+
+def _store1(values, value, x, name, base):
+    # Si la lista no fue declarada con DIM, se crea de tamaño 10
+    if values is None:
+        values = BasicArray(name, base, 10)
+    i = int(x) - base
+    if i < 0 or i >= values.rows:
+        raise BasicFault(f'Index of {name} is out of bounds')
+    try:
+        values.data[i] = value
+    except TypeError:
+        raise BasicFault(f"Type mismatch in {name}")
+    return values
+
+def _store2(table, value, x, y, name, base):
+    if table is None:
+        table = BasicArray(name, base, 10, 10)
+    i = int(x) - base
+    j = int(y) - base
+    if i < 0 or i >= table.rows or j < 0 or j >= table.cols:
+        raise BasicFault(f'Indexes of {name} are out of bounds')
+    try:
+        table.data[i * table.cols + j] = value
+    except TypeError:
+        raise BasicFault(f"Type mismatch in {name}")
+    return table
+
+# Nombres globales visibles desde el código generado
+RUNTIME = {
+    'math'        : math,
+    'BasicExit'   : BasicExit,
+    'BasicArray'  : BasicArray,
+    'LoopFrame'   : LoopFrame,
+    '_enter_loop' : _enter_loop,
+    '_text'       : _text,
+    '_number'     : _number,
+    '_string'     : _string,
+    '_mid'        : _mid,
+    '_load1'      : _load1,
+    '_load2'      : _load2,
+    '_store1'     : _store1,
+    '_store2'     : _store2,
+}
+
+def _pyname(prefix, name):
+    return prefix + name.replace('$', '_S')
+
+def _basname(pyname):
+    name = pyname.split('_', 1)[1]
+    return name[:-2] + '$' if name.endswith('_S') else name
+
+
+class PythonProgram:
+    '''
+    Programa ya traducido: objeto de código del módulo y, por cada línea del
+    módulo, la línea de BASIC de la que proviene.
+    '''
+    def __init__(self, filename, code, linemap):
+        self.filename = filename
+        self.code = code
+        self.linemap = linemap
+
+    # Caché en disco
+    @staticmethod
+    def cache_key(source, **flags):
+        h = hashlib.sha256()
+        h.update(f'{VERSION}\0{sorted(flags.items())}\0'.encode())
+        h.update(source.encode('utf-8'))
+        return h.digest()
+
+    @staticmethod
+    def cache_path(fname):
+        folder, base = os.path.split(os.path.abspath(fname))
+        base = base.rsplit('.', 1)[0]
+        return os.path.join(folder, CACHE_DIR, f'{base}.{sys.implementation.cache_tag}.bpc')
+
+    @classmethod
+    def load(cls, fname, key):
+        header = importlib.util.MAGIC_NUMBER + key
+        try:
+            with open(cls.cache_path(fname), 'rb') as fin:
+                blob = fin.read()
+        except OSError:
+            return None
+        if not blob.startswith(header):
+            return None
+        try:
+            return cls(*marshal.loads(blob[len(header):]))
+        except (ValueError, EOFError, TypeError):
+            return None
+
+    def save(self, fname, key):
+        path = self.cache_path(fname)
+        blob = importlib.util.MAGIC_NUMBER + key + marshal.dumps((self.filename, self.code, self.linemap))
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path + '.tmp', 'wb') as fout:
+                fout.write(blob)
+            os.replace(path + '.tmp', path)
+        except OSError:
+            pass  # Sin caché: la próxima ejecución vuelve a traducir
+
+    # Ejecución
+    def execute(self, rt):
+        namespace = dict(RUNTIME)
+        exec(self.code, namespace)
+        try:
+            namespace['main'](rt)
+        except BasicFault as e:
+            rt.error(f"{e} at line {self.lineno(e)}")
+        except NameError as e:
+            # Variable o función de usuario usada antes de asignarla
+            lineno = self.lineno(e)
+            found = re.search(r"'(\w+)'", str(e))
+            pyname = found.group(1) if found else '?_?'
+            if pyname.startswith('fn_'):
+                rt.error(f"Undefined function FN{_basname(pyname)} at line {lineno}")
+            rt.error(f"Undefined variable '{_basname(pyname)}' at line {lineno}")
+        except TypeError as e:
+            rt.error(f"Type mismatch at line {self.lineno(e)}")
+        except (ArithmeticError, ValueError) as e:
+            rt.error(f"{e} at line {self.lineno(e)}")
+
+    def lineno(self, exc):
+        # Línea de BASIC del último marco del código generado en el traceback
+        lineno = None
+        tb = exc.__traceback__
+        while tb is not None:
+            if tb.tb_frame.f_code.co_filename == self.filename:
+                lineno = self.linemap[tb.tb_lineno - 1]
+            tb = tb.tb_next
+        return lineno
+
+
+class PythonGenerator(Visitor):
+    '''
+    Genera el código fuente de main(rt). Cada visit de una instrucción emite
+    líneas con self.emit; cada visit de una expresión devuelve un string con
+    la expresión de Python equivalente.
+    '''
+    def __init__(self, interp):
+        self.interp = interp
+        self.lines = []         # Código generado
+        self.linemap = []       # Línea de BASIC de cada línea generada
+        self.indent = 0
+        self.lineno = None
+        self.pc = None
+        self.builtins = {}      # Funciones predefinidas usadas: nombre -> local
+        self.arrays = set()     # Listas y tablas usadas
+        self.params = set()     # Parámetros de DEF
+        self.trace = False      # Imprimir cada línea ejecutada (-t)
+        self.functions = {instr.fn for instr in interp.prog.values() if isinstance(instr, Def)}
+
+    @classmethod
+    def generate(cls, prog: Dict[int, Statement], fname, array_base, slicing, go_next, trace):
+        '''
+        Traduce el programa y lo compila. Los chequeos semánticos del
+        intérprete (END, FOR/NEXT, DATA) se hacen aquí, una sola vez.
+        '''
+        interp = Interpreter(prog, array_base=array_base, slicing=slicing, go_next=go_next, fname=fname)
+        interp.prepare()
+        generator = cls(interp)
+        generator.trace = trace
+        source, linemap = generator.module()
+        filename = f'<basic:{fname}>'
+        return PythonProgram(filename, compile(source, filename, 'exec'), linemap)
+
+    def emit(self, line):
+        self.lines.append('    ' * self.indent + line)
+        self.linemap.append(self.lineno)
+
+    def module(self):
+        interp = self.interp
+        stat = interp.stat
+
+        # Un bloque empieza en cada destino de salto
+        labels = {0}
+        for pc, lineno in enumerate(stat):
+            instr = interp.prog[lineno]
+            if interp.jumps.get(pc) is not None:
+                labels.add(interp.jumps[pc])
+            if isinstance(instr, (For, GoSub)) and pc + 1 < len(stat):
+                labels.add(pc + 1)
+        self.starts = sorted(labels)
+        self.block = {pc: k for k, pc in enumerate(self.starts)}
+
+        self.indent = 2
+        self.dispatch(0, len(self.starts))
+        body, bodymap = self.lines, self.linemap
+
+        # Prólogo: enlazar en locales todo lo que usa el ciclo principal
+        self.lines, self.linemap, self.lineno = [], [], None
+        self.indent = 0
+        self.emit(f'# Generado por baspython a partir de {interp.fname}')
+        self.emit('def main(rt):')
+        self.indent = 1
+        self.emit('output = rt.output')
+        self.emit('_write = output.write')
+        self.emit('_pad = output.pad')
+        self.emit('_newline = output.newline')
+        self.emit('_message = output.message')
+        self.emit('_error = rt.error')
+        self.emit('_input_prompt = rt.input_prompt')
+        self.emit('_input_value = rt.input_value')
+        self.emit('_end = rt.end_program')
+        self.emit('_tabs = rt.tabs')
+        self.emit('_pow = math.pow')
+        self.emit(f'_data = {interp.data!r}')
+        self.emit('_dc = 0')
+        self.emit('_loops = []')
+        self.emit('_gosub = []')
+        self.emit('_gosub_depth = rt.gosub_depth')
+        for name, local in sorted(self.builtins.items()):
+            self.emit(f'{local} = rt.functions[{name!r}]')
+        for local in sorted(self.arrays):
+            self.emit(f'{local} = None')
+        if self.params:
+            # Los parámetros de DEF se asignan desde la función (nonlocal)
+            self.emit('if 0:')
+            for local in sorted(self.params):
+                self.emit(f'    {local} = None')
+        self.emit('L = 0')
+        self.emit('while True:')
+
+        source = '\n'.join(self.lines + body) + '\n'
+        return source, tuple(self.linemap + bodymap)
+
+    def dispatch(self, lo, hi):
+        # Árbol de comparaciones sobre el bloque L (búsqueda binaria)
+        if hi - lo == 1:
+            self.emit_block(lo)
+            return
+        mid = (lo + hi) // 2
+        self.emit(f'if L < {mid}:')
+        self.indent += 1
+        self.dispatch(lo, mid)
+        self.indent -= 1
+        self.emit('else:')
+        self.indent += 1
+        self.dispatch(mid, hi)
+        self.indent -= 1
+
+    def emit_block(self, k):
+        interp = self.interp
+        start = self.starts[k]
+        end = self.starts[k + 1] if k + 1 < len(self.starts) else len(interp.stat)
+        for pc in range(start, end):
+            self.pc = pc
+            self.lineno = interp.stat[pc]
+            if self.trace:
+                self.emit(f"_message('Executing line {self.lineno}')")
+            interp.prog[self.lineno].accept(self)
+        if k + 1 < len(self.starts):
+            self.emit(f'L = {k + 1}')
+        else:
+            self.emit('pass')
+
+    def error(self, message):
+        return f'_error({message!r})'
+
+    def jump(self, newline):
+        target = self.interp.jumps[self.pc]
+        if target is None:
+            self.emit(self.error(f"Undefined line {newline} in GOTO instruction, located at line {self.lineno}"))
+        else:
+            self.emit(f'L = {self.block[target]}')
+            self.emit('continue')
+
+    # Asignaciones
+    def store(self, target: Variable, value):
+        base = self.interp.array_base
+        name = target.var
+        if target.dim1 is None and target.dim2 is None:
+            self.emit(f'{_pyname("v_", name)} = {value}')
+        elif target.dim2 is None:
+            local = self.array('l_', name)
+            self.emit(f'{local} = _store1({local}, {value}, {target.dim1.accept(self)}, {name!r}, {base})')
+        else:
+            local = self.array('t_', name)
+            self.emit(f'{local} = _store2({local}, {value}, {target.dim1.accept(self)}, {target.dim2.accept(self)}, {name!r}, {base})')
+
+    def array(self, prefix, name):
+        local = _pyname(prefix, name)
+        self.arrays.add(local)
+        return local
+
+    # Instrucciones
+    def visit(self, instr: Let):
+        if self.interp.slicing:
+            self.emit(self.error(f"Cannot proceed with LET instruction at line {self.lineno}. String slicing might be enabled."))
+            return
+        self.store(instr.var, instr.expr.accept(self))
+
+    def visit(self, instr: Read):
+        ndata = len(self.interp.data)
+        for target in instr.varlist:
+            # Sin más datos el programa termina de ejecutarse
+            self.emit(f'if _dc >= {ndata}: raise BasicExit("out_of_data")')
+            if target.var[-1] == '$':
+                if self.interp.slicing:
+                    self.emit(self.error(f"Cannot proceed with READ instruction at line {self.lineno}. String slicing might be enabled."))
+                self.store(target, '_string(_data[_dc])')
+            else:
+                self.store(target, '_number(_data[_dc])')
+            self.emit('_dc += 1')
+
+    def visit(self, instr: Restore):
+        self.emit('_dc = 0')
+
+    def visit(self, instr: Union[Data, Remark]):
+        pass
+
+    def visit(self, instr: Print):
+        for pitem in _flatten(instr.plist):
+            if not pitem or pitem == ';':
+                continue
+            if pitem == ',':
+                self.emit('_pad(_tabs)')
+            elif isinstance(pitem, str):
+                self.emit(f'_write({pitem!r})')
+            elif isinstance(pitem, String):
+                self.emit(f'_write({pitem.value!r})')
+            else:
+                self.emit(f'_write(_text({pitem.accept(self)}))')
+        if (not instr.plist) or instr.plist[-1] not in (',', ';'):
+            self.emit('_newline()')
+
+    def visit(self, instr: Input):
+        self.emit(f'_input_prompt({instr.label!r})')
+        for variable in instr.vlist:
+            self.store(variable, f'_input_value({variable.var!r}, {self.lineno})')
+
+    def visit(self, instr: Goto):
+        self.jump(instr.lineno)
+
+    def visit(self, instr: IfStatement):
+        self.emit(f'if {instr.relexpr.accept(self)}:')
+        self.indent += 1
+        self.jump(instr.lineno)
+        self.indent -= 1
+
+    def visit(self, instr: For):
+        var = instr.ident.var
+        step = instr.step.accept(self) if instr.step is not None else '1'
+        # Límite y salto se evalúan una sola vez al entrar al ciclo
+        self.store(instr.ident, instr.low.accept(self))
+        self.emit(f'_enter_loop(_loops, LoopFrame({self.block[self.pc + 1]}, {var!r}, {instr.top.accept(self)}, {step}))')
+
+    def visit(self, instr: Next):
+        var = instr.ident.var
+        local = _pyname('v_', var)
+        # Descartar los ciclos abandonados con GOTO hasta encontrar el FOR correspondiente
+        self.emit(f'while _loops and _loops[-1].var != {var!r}: _loops.pop()')
+        self.emit('if not _loops:')
+        self.emit(f"    _message('NEXT without FOR at line {self.lineno}')")
+        self.emit('else:')
+        self.indent += 1
+        self.emit('_frame = _loops[-1]')
+        self.emit(f'_value = {local} + _frame.step')
+        self.emit('if (_value >= _frame.limit) if _frame.down else (_value <= _frame.limit):')
+        self.emit(f'    {local} = _value')
+        self.emit('    L = _frame.pc')
+        self.emit('    continue')
+        self.emit('_loops.pop()')
+        self.indent -= 1
+
+    def visit(self, instr: Union[End, Stop]):
+        self.emit('_end()')
+
+    def visit(self, instr: Def):
+        param = _pyname('v_', instr.ident)
+        self.params.add(param)
+        self.emit(f'def {_pyname("fn_", instr.fn[2:])}(_value):')
+        self.emit(f'    nonlocal {param}')
+        self.emit(f'    {param} = _value')
+        self.emit(f'    return {instr.expr.accept(self)}')
+
+    def visit(self, instr: GoSub):
+        self.emit('if len(_gosub) >= _gosub_depth:')
+        self.emit(f"    _error(f'GOSUB nested more than {{_gosub_depth}} levels at line {self.lineno}')")
+        self.emit(f'_gosub.append({self.block.get(self.pc + 1)})')
+        self.jump(instr.lineno)
+
+    def visit(self, instr: Return):
+        self.emit('if not _gosub:')
+        self.emit(f"    _message('RETURN without GOSUB at line {self.lineno}')")
+        self.emit('else:')
+        self.emit('    L = _gosub.pop()')
+        self.emit('    continue')
+
+    def visit(self, instr: Dim):
+        base = self.interp.array_base
+        for item in instr.dimlist:
+            if self.interp.slicing:
+                self.emit(self.error(f"The dimension at line {self.lineno} could not be initialized. String slicing might be enabled."))
+            if item.dim2 is None:
+                self.emit(f'{self.array("l_", item.var)} = BasicArray({item.var!r}, {base}, {item.dim1.accept(self)})')
+            else:
+                self.emit(f'{self.array("t_", item.var)} = BasicArray({item.var!r}, {base}, {item.dim1.accept(self)}, {item.dim2.accept(self)})')
+
+    # Expresiones
+    def visit(self, instr: Group):
+        return instr.expr.accept(self)
+
+    def visit(self, instr: Bltin):
+        name = instr.name
+        expr = instr.expr
+        if isinstance(expr, Node):
+            expr = [expr]
+
+        # Implementación propia para MID$()
+        if name in ('MID$', 'mid$'):
+            if isinstance(expr, list) and len(expr) == 3:
+                return f'_mid({", ".join(e.accept(self) for e in expr)})'
+            return self.error("Incorrect parameters for MID$")
+
+        if name not in self.interp.functions:
+            return self.error(f"Undefined function {name}")
+        local = self.builtins.setdefault(name, _pyname('b_', name))
+        args = ', '.join(e.accept(self) for e in expr or [])
+        return f'{local}({args})'
+
+    def visit(self, instr: Call):
+        expr = instr.expr
+        if isinstance(expr, Node):
+            expr = [expr]
+        if instr.name not in self.functions:
+            return self.error(f"Undefined function {instr.name}")
+        args = ', '.join(e.accept(self) for e in expr)
+        return f'{_pyname("fn_", instr.name[2:])}({args})'
+
+    def visit(self, instr: Variable):
+        name = instr.var
+        if instr.dim1 is None and instr.dim2 is None:
+            return _pyname('v_', name)
+        elif instr.dim2 is None:
+            return f'_load1({self.array("l_", name)}, {instr.dim1.accept(self)}, {name!r})'
+        else:
+            return f'_load2({self.array("t_", name)}, {instr.dim1.accept(self)}, {instr.dim2.accept(self)}, {name!r})'
+
+    def visit(self, instr: Union[Binary, Logical]):
+        left = instr.left.accept(self)
+        right = instr.right.accept(self)
+        if instr.op == '^':
+            return f'_pow({left}, {right})'
+        if instr.op not in PY_OPS:
+            return self.error(f"Incorrect operator {instr.op}")
+        return f'({left} {PY_OPS[instr.op]} {right})'
+
+    def visit(self, instr: Unary):
+        if instr.op != '-':
+            return 'None'
+        return f'(-{instr.expr.accept(self)})'
+
+    def visit(self, instr: Literal):
+        return f'({instr.value!r})'
+
+    def visit(self, instr: Node):
+        self.emit(f"_message('{self.lineno} {instr.__class__.__name__}')")
@@ -0,0 +1,91 @@
+# basresolve.py
+
+'''
+Resolución de símbolos para BASIC DARTMOUTH 64
+
+Recorre el AST antes de la ejecución y asigna a cada variable, lista y tabla
+una posición fija (slot) dentro de una única lista de memoria. Cada nodo
+Variable (y el parámetro de cada DEF) queda anotado con su slot, de modo que
+los motores de ejecución acceden por índice en lugar de buscar por nombre.
+'''
+
+from dataclasses import fields
+from typing import Dict
+
+from basast import *
+
+class SymbolTable:
+    '''
+    Tabla de símbolos resuelta. Variables, listas y tablas tienen espacios
+    de nombres separados (A, A(I) y A(I,J) son símbolos distintos) pero
+    comparten la numeración de slots.
+    '''
+    def __init__(self):
+        self.scalars = {}   # Variables
+        self.lists   = {}   # Listas
+        self.tables  = {}   # Tablas
+        self.names   = []   # slot -> nombre
+
+    def __len__(self):
+        return len(self.names)
+
+    def _define(self, names, name):
+        if name not in names:
+            names[name] = len(self.names)
+            self.names.append(name)
+        return names[name]
+
+    def scalar(self, name):
+        return self._define(self.scalars, name)
+
+    def list(self, name):
+        return self._define(self.lists, name)
+
+    def table(self, name):
+        return self._define(self.tables, name)
+
+    def __str__(self):
+        lines = ['Symtab:']
+        for title, names in (('Variables:', self.scalars), ('Listas:', self.lists), ('Tablas:', self.tables)):
+            lines.append(title)
+            for name, slot in names.items():
+                kind = 'string' if name[-1] == '$' else 'numeric'
+                lines.append(f'  {slot:<6}{name:<10}{kind}')
+        return '\n'.join(lines)
+
+
+class Resolver(Visitor):
+    def __init__(self):
+        self.symtab = SymbolTable()
+
+    @classmethod
+    def resolve(cls, prog: Dict[int, Statement]):
+        resolver = cls()
+        for lineno in sorted(prog):
+            prog[lineno].accept(resolver)
+        return resolver.symtab
+
+    def walk(self, value):
+        if isinstance(value, Node):
+            value.accept(self)
+        elif isinstance(value, (list, tuple)):
+            for item in value:
+                self.walk(item)
+
+    def visit(self, node: Variable):
+        if node.dim1 is None and node.dim2 is None:
+            node.slot = self.symtab.scalar(node.var)
+        elif node.dim2 is None:
+            node.slot = self.symtab.list(node.var)
+        else:
+            node.slot = self.symtab.table(node.var)
+        self.walk(node.dim1)
+        self.walk(node.dim2)
+
+    def visit(self, node: Def):
+        node.slot = self.symtab.scalar(node.ident)
+        self.walk(node.expr)
+
+    def visit(self, node: Node):
+        for f in fields(node):
+            self.walk(getattr(node, f.name))
@@ -0,0 +1,180 @@
+# bastypes.py
+
+'''
+Inferencia de tipos para BASIC DARTMOUTH 64
+
+El sufijo '$' indica el tipo que debería tener cada variable, pero LET, FOR
+o los argumentos de un FN pueden guardar un valor de otro tipo. Esta pasada
+anota cada expresión con su tipo (NUM, STR o None si no se puede probar),
+de modo que el compilador emite las operaciones sin chequeos cuando ambos
+operandos están probados y conserva los chequeos en el resto.
+
+Se supone que cada variable tiene el tipo de su nombre y se descartan las
+que reciben algún valor de otro tipo, repitiendo hasta que nada cambie.
+Las listas y tablas numéricas (array('d')) siempre contienen números.
+Debe ejecutarse después de Resolver, ya que usa el slot de cada Variable.
+'''
+
+from dataclasses import fields
+from typing import Dict, Union
+
+from basast import *
+
+NUM = 'num'
+STR = 'str'
+
+# Tipo del resultado de cada función predefinida
+BLTIN_TYPES = {
+    'SIN' : NUM, 'COS'  : NUM, 'TAN'   : NUM, 'ATN' : NUM, 'EXP'  : NUM,
+    'ABS' : NUM, 'LOG'  : NUM, 'SQR'   : NUM, 'INT' : NUM, 'RND'  : NUM,
+    'DEG' : NUM, 'PI'   : NUM, 'TIME'  : NUM, 'LEN' : NUM,
+    'TAB' : STR, 'LEFT$': STR, 'RIGHT$': STR, 'CHR$': STR, 'MID$' : STR,
+}
+
+COMPARE_OPS = {'=', '<>', '<', '<=', '>', '>='}
+ARITH_OPS   = {'+', '-', '*', '/', '^'}
+
+def declared(name):
+    # Tipo indicado por el nombre de la variable o función
+    return STR if name[-1] == '$' else NUM
+
+def refine(assumed, observed):
+    # Descartar los supuestos que no se cumplen; True si alguno cambió
+    changed = False
+    for key, kinds in observed.items():
+        if assumed[key] is not None and any(kind != assumed[key] for kind in kinds):
+            assumed[key] = None
+            changed = True
+    return changed
+
+def typeof(node):
+    # Tipo anotado en una expresión (None si no fue probado o no se infirió)
+    return getattr(node, 'type', None)
+
+
+class TypeInference(Visitor):
+    '''
+    Las visitas de expresiones anotan node.type y retornan el tipo; las de
+    instrucciones registran los tipos que se guardan en cada slot.
+    '''
+    def __init__(self, slicing = False):
+        self.slicing = slicing
+        self.slots = {}       # slot -> tipo supuesto
+        self.functions = {}   # FN -> tipo supuesto del resultado
+        self.params = {}      # FN -> slots de sus parámetros
+        self.writes = {}      # slot -> tipos guardados en la pasada actual
+        self.results = {}     # FN -> tipos de sus definiciones en la pasada actual
+
+    @classmethod
+    def infer(cls, prog: Dict[int, Statement], slicing = False):
+        '''
+        Anota el programa en el sitio y retorna el tipo de cada slot que
+        recibe algún valor (None si no se pudo probar)
+        '''
+        inference = cls(slicing)
+        for instr in prog.values():
+            if isinstance(instr, Def):
+                inference.functions[instr.fn] = declared(instr.fn)
+                inference.params.setdefault(instr.fn, []).append(instr.slot)
+                inference.slots.setdefault(instr.slot, declared(instr.ident))
+
+        changed = True
+        while changed:
+            inference.writes = {}
+            inference.results = {}
+            for lineno in sorted(prog):
+                prog[lineno].accept(inference)
+            changed = refine(inference.slots, inference.writes)
+            changed |= refine(inference.functions, inference.results)
+        return inference.slots
+
+    def typed(self, node, kind):
+        node.type = kind
+        return kind
+
+    def walk(self, value):
+        if isinstance(value, Node):
+            return value.accept(self)
+        if isinstance(value, (list, tuple)):
+            for item in value:
+                self.walk(item)
+
+    def store(self, target: Variable, kind):
+        target.accept(self)
+        if target.dim1 is not None and target.var[-1] != '$':
+            return    # array('d') convierte o rechaza el valor
+        self.slots.setdefault(target.slot, declared(target.var))
+        self.writes.setdefault(target.slot, []).append(kind)
+
+    # Instrucciones
+    def visit(self, instr: Let):
+        self.store(instr.var, instr.expr.accept(self))
+
+    def visit(self, instr: Read):
+        # READ convierte el dato según el nombre de la variable
+        for target in instr.varlist:
+            self.store(target, declared(target.var))
+
+    def visit(self, instr: Input):
+        # Con slicing, INPUT desde archivo lee los strings como números
+        for target in instr.vlist:
+            kind = declared(target.var)
+            self.store(target, None if kind == STR and self.slicing else kind)
+
+    def visit(self, instr: For):
+        low = instr.low.accept(self)
+        instr.top.accept(self)
+        step = instr.step.accept(self) if instr.step is not None else NUM
+        # NEXT suma el salto a la variable de control
+        self.store(instr.ident, low if low == step else None)
+
+    def visit(self, instr: Def):
+        self.results.setdefault(instr.fn, []).append(instr.expr.accept(self))
+
+    # Expresiones
+    def visit(self, instr: Call):
+        args = instr.expr if isinstance(instr.expr, list) else [instr.expr]
+        kinds = [arg.accept(self) for arg in args]
+        for slot in self.params.get(instr.name, []):
+            self.writes.setdefault(slot, []).extend(kinds)
+        return self.typed(instr, self.functions.get(instr.name))
+
+    def visit(self, instr: Bltin):
+        self.walk(instr.expr)
+        return self.typed(instr, BLTIN_TYPES.get(instr.name.upper()))
+
+    def visit(self, instr: Variable):
+        self.walk(instr.dim1)
+        self.walk(instr.dim2)
+        if instr.dim1 is not None and instr.var[-1] != '$':
+            return self.typed(instr, NUM)
+        return self.typed(instr, self.slots.get(instr.slot, declared(instr.var)))
+
+    def visit(self, instr: Union[Binary, Logical]):
+        left = instr.left.accept(self)
+        right = instr.right.accept(self)
+        if left is None or left != right:
+            return self.typed(instr, None)
+        if instr.op in COMPARE_OPS:
+            return self.typed(instr, NUM)
+        if instr.op in ARITH_OPS and (left == NUM or instr.op == '+'):
+            return self.typed(instr, left)
+        return self.typed(instr, None)
+
+    def visit(self, instr: Unary):
+        kind = instr.expr.accept(self)
+        return self.typed(instr, NUM if instr.op == '-' and kind == NUM else None)
+
+    def visit(self, instr: Group):
+        return self.typed(instr, instr.expr.accept(self))
+
+    def visit(self, instr: String):
+        self.walk(instr.expr)
+        return self.typed(instr, STR)
+
+    def visit(self, instr: Number):
+        return self.typed(instr, NUM)
+
+    def visit(self, instr: Node):
+        for f in fields(instr):
+            self.walk(getattr(instr, f.name))
@@ -0,0 +1,90 @@
+# bench_goto.py
+
+'''
+Microbenchmark de saltos: ciclos cerrados hechos solo con GOTO, IF ... THEN,
+GOSUB/RETURN y FOR/NEXT. Casi todo el tiempo se va en despachar saltos, así
+que mide el costo del mecanismo de control de flujo de cada motor.
+
+Cada programa se prepara una sola vez (CompiledProgram) y se ejecuta varias
+veces; se reporta la mediana y el costo por salto.
+
+Uso:
+    python benchmarks/bench_goto.py [-n RUNS] [-j JUMPS] [-e closure,visitor]
+'''
+
+import io
+import os
+import sys
+import time
+import argparse
+import statistics
+from contextlib import redirect_stdout
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from baslex import Lexer
+from basparse import Parser
+from basinterp import RunConfig, CompiledProgram
+
+# Cada programa hace aproximadamente un salto por iteración
+PROGRAMS = {
+    'goto': '''
+10 LET I = 0
+20 LET I = I + 1
+30 IF I >= {n} THEN 50
+40 GOTO 20
+50 END
+''',
+    'if-then': '''
+10 LET I = 0
+20 LET I = I + 1
+30 IF I < {n} THEN 20
+40 END
+''',
+    'gosub': '''
+10 FOR I = 1 TO {n}
+20 GOSUB 50
+30 NEXT I
+40 GOTO 70
+50 LET J = I
+60 RETURN
+70 END
+''',
+    'for-next': '''
+10 FOR I = 1 TO {n}
+20 NEXT I
+30 END
+''',
+}
+
+def load(source, engine):
+    ast = Parser().parse(Lexer().tokenize(source.lstrip()))
+    return CompiledProgram(ast.lines, RunConfig(engine = engine))
+
+def measure(program, runs):
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        with redirect_stdout(io.StringIO()):
+            program.run()
+        times.append(time.perf_counter() - start)
+    return statistics.median(times)
+
+def main():
+    cli = argparse.ArgumentParser(description='Tight jump loops on each engine')
+    cli.add_argument('-n', '--runs', type=int, default=5, help='Runs per program (default is 5)')
+    cli.add_argument('-j', '--jumps', type=int, default=200000, help='Loop iterations (default is 200000)')
+    cli.add_argument('-e', '--engines', default='closure,visitor', help='Comma separated engines')
+    args = cli.parse_args()
+
+    print(f'{"program":<12}{"engine":<10}{"median":>12}{"per iter":>12}')
+    for name, source in PROGRAMS.items():
+        for engine in args.engines.split(','):
+            jumps = args.jumps if engine != 'visitor' else args.jumps // 10
+            program = load(source.format(n = jumps), engine)
+            elapsed = measure(program, args.runs)
+            print(f'{name:<12}{engine:<10}{elapsed * 1000:>10.1f}ms{elapsed / jumps * 1e9:>10.0f}ns')
+
+if __name__ == '__main__':
+    main()
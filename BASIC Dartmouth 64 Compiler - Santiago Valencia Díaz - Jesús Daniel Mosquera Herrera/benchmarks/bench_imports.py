@@ -0,0 +1,72 @@
+# bench_imports.py
+
+'''
+Presupuesto de importación de una ejecución normal de basic.py.
+
+Ejecuta `python -X importtime basic.py program.bas` varias veces y suma el
+tiempo acumulado de los módulos importados en el nivel superior (mediana de
+las ejecuciones). Falla (código de salida 1) si se pasa del presupuesto o si
+se importa alguno de los módulos que solo deben cargarse a pedido.
+
+Uso:
+    python benchmarks/bench_imports.py [-n RUNS] [--budget MS] [program.bas]
+'''
+
+import os
+import sys
+import argparse
+import statistics
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Solo se importan con -a dot/txt, -p/-w o al reportar errores de sintaxis
+LAZY_MODULES = ('rich', 'graphviz', 'psutil', 'basrender')
+
+BUDGET_MS = 130
+
+def importtime(program):
+    '''
+    Devuelve {módulo: tiempo acumulado en us} de una ejecución
+    '''
+    proc = subprocess.run([sys.executable, '-X', 'importtime', 'basic.py', program],
+                          cwd=ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True, check=True)
+    modules = {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line.split('|')
+        depth = (len(name) - len(name.lstrip()) + 1) // 2  # Un espacio en el nivel superior
+        modules[name.strip()] = (int(cumulative), depth)
+    return modules
+
+def main():
+    cli = argparse.ArgumentParser(description='Import-time budget for a plain basic.py run')
+    cli.add_argument('-n', '--runs', type=int, default=10, help='Processes to measure (default is 10)')
+    cli.add_argument('--budget', type=float, default=BUDGET_MS, help=f'Budget in ms (default is {BUDGET_MS})')
+    cli.add_argument('--top', type=int, default=10, help='Slowest top-level imports to show')
+    cli.add_argument('program', nargs='?', default=os.path.join('samples', 'hola.bas'), help='BASIC program to run')
+    args = cli.parse_args()
+
+    runs = [importtime(args.program) for _ in range(args.runs)]
+    totals = [sum(us for us, depth in run.values() if depth == 1) for run in runs]
+    total = statistics.median(totals) / 1000
+
+    last = runs[-1]
+    top = sorted(((us, name) for name, (us, depth) in last.items() if depth == 1), reverse=True)[:args.top]
+    for us, name in top:
+        print(f'{name:<32}{us / 1000:>8.1f}ms')
+    print(f'{"total (median)":<32}{total:>8.1f}ms  budget {args.budget:.0f}ms')
+
+    failed = False
+    loaded = [name for name in LAZY_MODULES if name in last]
+    if loaded:
+        print(f'FAIL: imported on a plain run: {", ".join(loaded)}')
+        failed = True
+    if total > args.budget:
+        print('FAIL: import budget exceeded')
+        failed = True
+    sys.exit(1 if failed else 0)
+
+if __name__ == '__main__':
+    main()
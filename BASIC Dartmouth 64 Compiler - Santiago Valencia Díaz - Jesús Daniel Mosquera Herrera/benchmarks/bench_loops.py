@@ -0,0 +1,93 @@
+# bench_loops.py
+
+'''
+Escalabilidad de Interpreter.check_loops con programas sintéticos.
+
+Se generan programas de 10k a 1M líneas directamente como AST (sin pasar por
+el parser) con dos formas:
+
+  * sequential: muchos ciclos pequeños seguidos (FOR / LET / NEXT).
+  * nested:     todos los FOR al principio y todos los NEXT al final, el peor
+                caso para una búsqueda hacia adelante desde cada FOR.
+
+Se compara la pasada única actual con la búsqueda cuadrática anterior; esta
+última solo se mide hasta --quadratic-limit líneas.
+
+Uso:
+    python benchmarks/bench_loops.py [--sizes 10000,100000,1000000] [--quadratic-limit 20000]
+'''
+
+import os
+import sys
+import time
+import argparse
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from basast import For, Next, Let, Number, Variable, End
+from basinterp import Interpreter
+
+def sequential(size):
+    prog = {}
+    lineno = 10
+    for i in range((size - 1) // 3):
+        var = Variable('I%d' % (i % 10))
+        prog[lineno] = For(var, Number(1), Number(10))
+        prog[lineno + 1] = Let(Variable('X'), var)
+        prog[lineno + 2] = Next(var)
+        lineno += 3
+    prog[lineno] = End()
+    return prog
+
+def nested(size):
+    prog = {}
+    depth = (size - 1) // 2
+    for i in range(depth):
+        prog[i + 1] = For(Variable('I%d' % (i % 26)), Number(1), Number(10))
+    for i in range(depth):
+        prog[depth + i + 1] = Next(Variable('I%d' % ((depth - 1 - i) % 26)))
+    prog[2 * depth + 1] = End()
+    return prog
+
+def quadratic_check_loops(interp):
+    # Implementación anterior: buscar hacia adelante el NEXT de cada FOR
+    loopend = {}
+    for pc in range(len(interp.stat)):
+        forinst = interp.prog[interp.stat[pc]]
+        if isinstance(forinst, For):
+            for i in range(pc + 1, len(interp.stat)):
+                nextinst = interp.prog[interp.stat[i]]
+                if isinstance(nextinst, Next) and nextinst.ident.var == forinst.ident.var:
+                    loopend[pc] = i
+                    break
+    return loopend
+
+def measure(prog, check):
+    interp = Interpreter(prog, verbose=False)
+    interp.stat = sorted(prog)
+    start = time.perf_counter()
+    loopend = check(interp)
+    return time.perf_counter() - start, loopend
+
+def main():
+    parser = argparse.ArgumentParser(description='check_loops scaling benchmark')
+    parser.add_argument('--sizes', default='10000,100000,1000000')
+    parser.add_argument('--quadratic-limit', type=int, default=20000)
+    args = parser.parse_args()
+
+    print(f'{"shape":<12}{"lines":>10}{"single pass":>14}{"quadratic":>14}')
+    for shape in (sequential, nested):
+        for size in map(int, args.sizes.split(',')):
+            prog = shape(size)
+            fast, loopend = measure(prog, Interpreter.check_loops)
+            if size <= args.quadratic_limit:
+                slow, expected = measure(prog, quadratic_check_loops)
+                assert loopend == expected
+                slow = f'{slow * 1000:11.1f} ms'
+            else:
+                slow = f'{"-":>14}'
+            print(f'{shape.__name__:<12}{size:>10}{fast * 1000:11.1f} ms{slow}')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,78 @@
+# bench_pairs.py
+
+'''
+Perfil de pares de opcodes de la máquina de pila (basinterpir).
+
+Ejecuta los programas de ejemplo en el motor IR sin superinstrucciones y
+cuenta cada par de instrucciones que se ejecutan una tras otra sin salto
+entre ellas. Muestra los pares más frecuentes y las superinstrucciones que
+iroptimize.select() elegiría con ellos. Con --write el perfil se guarda en
+irpairs.json, que es el que usa el motor IR al compilar.
+
+Uso:
+    python benchmarks/bench_pairs.py [-s mandel,prime] [-t TOP] [--write] [-o FILE]
+'''
+
+import io
+import os
+import sys
+import json
+import argparse
+from collections import Counter
+from contextlib import redirect_stdout, redirect_stderr
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from baslex import Lexer
+from basparse import Parser
+from basinterp import RunConfig, CompiledProgram
+from iroptimize import PAIRS_FILE, select
+from bench_samples import SAMPLES, INPUTS, ARRAY_BASE
+
+def profile(sample, pairs):
+    fname = os.path.join(ROOT, 'samples', sample + '.bas')
+    finput = os.path.join(ROOT, 'samples', INPUTS[sample]) if sample in INPUTS else None
+    with open(fname, encoding='utf-8') as fin:
+        ast = Parser().parse(Lexer().tokenize(fin.read()))
+    program = CompiledProgram(ast.lines, RunConfig(array_base = ARRAY_BASE.get(sample, 1), fname = fname, engine = 'ir'))
+    program.code = program.interp.compile_ir(fuse = False)
+    program.code.pairs = pairs
+    with redirect_stdout(io.StringIO()), redirect_stderr(io.StringIO()) as err:
+        reason = program.run(input_file = finput, random_seed = 1)
+    if reason != 'end':
+        # Un perfil de una ejecución que terminó con un error no sirve para elegir superinstrucciones
+        raise RuntimeError(f'{sample} exited with {reason!r} instead of END: {err.getvalue().strip()}')
+
+def main():
+    cli = argparse.ArgumentParser(description='Count opcode pairs executed by the IR stack VM')
+    cli.add_argument('-s', '--samples', default=','.join(SAMPLES), help='Comma separated samples (without .bas)')
+    cli.add_argument('-t', '--top', type=int, default=20, help='Pairs to show (default is 20)')
+    cli.add_argument('--write', action='store_true', help='Save the profile used to select superinstructions')
+    cli.add_argument('-o', '--output', default=PAIRS_FILE, help='Profile file (default is irpairs.json)')
+    args = cli.parse_args()
+
+    samples = args.samples.split(',')
+    pairs = Counter()
+    for sample in samples:
+        profile(sample, pairs)
+
+    total = sum(pairs.values())
+    print(f'{total} pairs executed')
+    print(f'{"first":<14}{"second":<14}{"count":>12}{"share":>8}')
+    for (first, second), count in pairs.most_common(args.top):
+        print(f'{first:<14}{second:<14}{count:>12}{100 * count / total:>7.1f}%')
+    print()
+    print(f'{"superinstruction":<26}{"count":>12}')
+    for sup in select(pairs):
+        print(f'{sup.name:<26}{sup.score(pairs):>12}')
+
+    if args.write:
+        # Un par por línea, para que los cambios del perfil se lean en un diff
+        rows = ',\n'.join(f'    {json.dumps([first, second, count])}' for (first, second), count in sorted(pairs.items()))
+        with open(args.output, 'w', encoding='utf-8') as fout:
+            fout.write(f'{{\n  "samples": {json.dumps(samples)},\n  "pairs": [\n{rows}\n  ]\n}}\n')
+        print(f'Profile written to {args.output}')
+
+if __name__ == '__main__':
+    main()
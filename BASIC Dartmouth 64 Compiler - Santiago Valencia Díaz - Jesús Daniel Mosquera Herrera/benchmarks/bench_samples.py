@@ -0,0 +1,208 @@
+# bench_samples.py
+
+'''
+Benchmark de los programas de ejemplo (samples/) en cada motor.
+
+Cada combinación programa/motor se ejecuta en un proceso aparte, para que
+la memoria máxima (RSS) sea solo la suya: el programa se prepara una vez
+(CompiledProgram), se descartan las primeras ejecuciones (warmup) y se
+miden las siguientes. Se reporta la mediana y el percentil 95 del tiempo de
+ejecución y la memoria máxima del proceso.
+
+Los resultados se agregan a un historial JSON. Cada medición se compara con
+la última del historial hecha en la misma máquina y versión de Python; si
+la mediana empeora más que --threshold (o la memoria más que
+--memory-threshold) el programa termina con código 1.
+
+Uso:
+    python benchmarks/bench_samples.py [-n RUNS] [-w WARMUP] [-e closure,visitor]
+                                       [-s mandel,prime] [--threshold 0.10]
+                                       [--history FILE] [--no-save]
+'''
+
+import io
+import os
+import sys
+import json
+import math
+import time
+import platform
+import argparse
+import subprocess
+import statistics
+from datetime import datetime, timezone
+from contextlib import redirect_stdout
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+SAMPLES = ['mandel', 'mandel2', 'game_of_life', 'pi_spigot', 'prime', 'sqrt1', 'sqrt2', 'sqrt3', 'calendar']
+
+# Entrada de los programas que usan INPUT
+INPUTS = {
+    'calendar' : 'game_input.txt',
+    'pi_spigot': 'game_input.txt',
+}
+
+# Base de los arreglos de los programas que no usan la de omisión (1), como -ar 0
+ARRAY_BASE = {
+    'game_of_life': 0,
+    'prime'       : 0,
+}
+
+ENGINES = ['closure', 'visitor', 'python', 'ir']
+
+HISTORY = os.path.join(ROOT, 'benchmarks', 'history.json')
+
+def load(fname, engine, array_base = 1):
+    from bascontext import Context
+    from basinterp import RunConfig
+    with open(fname, encoding='utf-8') as fin:
+        source = fin.read()
+    context = Context()
+    if engine == 'python':
+        context.load_python(source, fname, array_base, False, False, False, False)
+    else:
+        context.parse(source)
+    return context.compile(RunConfig(array_base = array_base, fname = fname, engine = engine))
+
+def child(sample, engine, runs, warmup):
+    '''
+    Ejecución dentro del proceso hijo: imprime los tiempos y la memoria
+    máxima como JSON en la última línea
+    '''
+    from basinterp import peak_memory
+    fname = os.path.join(ROOT, 'samples', sample + '.bas')
+    finput = os.path.join(ROOT, 'samples', INPUTS[sample]) if sample in INPUTS else None
+    times = []
+    with redirect_stdout(io.StringIO()):
+        program = load(fname, engine, ARRAY_BASE.get(sample, 1))
+        for n in range(warmup + runs):
+            sys.stdout.seek(0)
+            sys.stdout.truncate()
+            start = time.perf_counter_ns()
+            reason = program.run(input_file = finput, random_seed = 1)
+            elapsed = time.perf_counter_ns() - start
+            if reason != 'end':
+                # No se mide una ejecución que terminó con un error (el mensaje ya está en stderr)
+                raise RuntimeError(f'{sample} ({engine}) exited with {reason!r} instead of END')
+            if n >= warmup:
+                times.append(elapsed)
+    print(json.dumps({'times_ns': times, 'peak_memory_bytes': peak_memory()}))
+
+def percentile(values, fraction):
+    # Percentil por el método del rango más cercano
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(len(ordered) * fraction) - 1)]
+
+def measure(sample, engine, runs, warmup):
+    command = [sys.executable, os.path.abspath(__file__), '--child', sample, engine, str(runs), str(warmup)]
+    proc = subprocess.run(command, cwd = ROOT, capture_output = True, text = True, stdin = subprocess.DEVNULL)
+    if proc.returncode != 0 or not proc.stdout.strip():
+        raise RuntimeError(f'{sample} ({engine}) failed:\n{proc.stderr.strip()}')
+    result = json.loads(proc.stdout.strip().splitlines()[-1])
+    times = result['times_ns']
+    return {
+        'sample'           : sample,
+        'engine'           : engine,
+        'runs'             : len(times),
+        'warmup'           : warmup,
+        'median_ns'        : int(statistics.median(times)),
+        'p95_ns'           : percentile(times, 0.95),
+        'min_ns'           : min(times),
+        'peak_memory_bytes': result['peak_memory_bytes'],
+    }
+
+def machine():
+    return {
+        'host'    : platform.node(),
+        'python'  : platform.python_version(),
+        'platform': platform.platform(),
+    }
+
+def read_history(fname):
+    if not os.path.exists(fname):
+        return []
+    with open(fname, encoding='utf-8') as fin:
+        return json.load(fin)
+
+def baseline(history, env, sample, engine):
+    # Última medición comparable: misma máquina y versión de Python
+    for entry in reversed(history):
+        if entry['machine']['host'] != env['host'] or entry['machine']['python'] != env['python']:
+            continue
+        for result in entry['results']:
+            if result['sample'] == sample and result['engine'] == engine:
+                return result
+    return None
+
+def compare(result, base, args):
+    '''
+    Lista de regresiones de result respecto a base. Las diferencias de
+    tiempo menores que --min-delta se ignoran (ruido en los programas cortos)
+    '''
+    problems = []
+    if base is None:
+        return problems
+    old, new = base['median_ns'], result['median_ns']
+    if new - old > args.min_delta * 1e6 and new > old * (1 + args.threshold):
+        problems.append(f'median {old / 1e6:.1f}ms -> {new / 1e6:.1f}ms (+{100 * (new - old) / old:.0f}%)')
+    old, new = base['peak_memory_bytes'], result['peak_memory_bytes']
+    if old and new > old * (1 + args.memory_threshold):
+        problems.append(f'memory {old / 2**20:.1f}MiB -> {new / 2**20:.1f}MiB (+{100 * (new - old) / old:.0f}%)')
+    return problems
+
+def main():
+    if len(sys.argv) == 6 and sys.argv[1] == '--child':
+        sample, engine, runs, warmup = sys.argv[2], sys.argv[3], int(sys.argv[4]), int(sys.argv[5])
+        return child(sample, engine, runs, warmup)
+
+    cli = argparse.ArgumentParser(description='Run the bundled samples on each engine and check for regressions')
+    cli.add_argument('-n', '--runs', type=int, default=5, help='Measured runs per sample (default is 5)')
+    cli.add_argument('-w', '--warmup', type=int, default=1, help='Discarded runs before measuring (default is 1)')
+    cli.add_argument('-e', '--engines', default=','.join(ENGINES), help='Comma separated engines')
+    cli.add_argument('-s', '--samples', default=','.join(SAMPLES), help='Comma separated samples (without .bas)')
+    cli.add_argument('--threshold', type=float, default=0.10, help='Allowed median time regression (default is 0.10)')
+    cli.add_argument('--memory-threshold', type=float, default=0.20, help='Allowed peak memory regression (default is 0.20)')
+    cli.add_argument('--min-delta', type=float, default=1.0, help='Ignore time regressions below this many ms (default is 1.0)')
+    cli.add_argument('--history', default=HISTORY, help='JSON history file (default is benchmarks/history.json)')
+    cli.add_argument('--no-save', action='store_true', help='Compare with the history without appending to it')
+    args = cli.parse_args()
+    if args.runs < 1 or args.warmup < 0:
+        cli.error('--runs must be at least 1 and --warmup not negative')
+
+    env = machine()
+    history = read_history(args.history)
+    results = []
+    failures = 0
+    print(f'{"sample":<14}{"engine":<10}{"median":>10}{"p95":>10}{"memory":>10}  vs. previous')
+    for sample in args.samples.split(','):
+        for engine in args.engines.split(','):
+            result = measure(sample, engine, args.runs, args.warmup)
+            base = baseline(history, env, sample, engine)
+            problems = compare(result, base, args)
+            results.append(result)
+            if base is None:
+                status = 'new'
+            elif problems:
+                status = 'REGRESSION: ' + ', '.join(problems)
+                failures += 1
+            else:
+                status = f'{100 * (result["median_ns"] - base["median_ns"]) / base["median_ns"]:+.0f}%'
+            print(f'{sample:<14}{engine:<10}{result["median_ns"] / 1e6:>8.1f}ms{result["p95_ns"] / 1e6:>8.1f}ms'
+                  f'{result["peak_memory_bytes"] / 2**20:>7.1f}MiB  {status}')
+
+    if not args.no_save:
+        history.append({
+            'date'   : datetime.now(timezone.utc).isoformat(timespec = 'seconds'),
+            'machine': env,
+            'results': results,
+        })
+        with open(args.history, 'w', encoding='utf-8') as fout:
+            json.dump(history, fout, indent = 2)
+    if failures:
+        print(f'{failures} regression(s) above the configured thresholds')
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
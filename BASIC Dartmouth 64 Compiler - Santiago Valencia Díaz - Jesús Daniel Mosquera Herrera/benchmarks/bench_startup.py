@@ -0,0 +1,57 @@
+# bench_startup.py
+
+'''
+Tiempo de arranque en frío de basic.py con y sin el caché de tablas LALR.
+
+Cada medición es un proceso nuevo de Python. En el caso "tables built" se
+borra el caché antes de cada ejecución, de modo que sly construye las tablas
+como antes; en "tables cached" se leen del archivo.
+
+Uso:
+    python benchmarks/bench_startup.py [-n RUNS] [program.bas]
+'''
+
+import os
+import sys
+import time
+import argparse
+import statistics
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from basparse import TABLES_FILE
+
+def run_once(cmd, clear_cache):
+    if clear_cache and os.path.exists(TABLES_FILE):
+        os.remove(TABLES_FILE)
+    start = time.perf_counter()
+    subprocess.run(cmd, cwd=ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=True)
+    return time.perf_counter() - start
+
+def measure(cmd, runs):
+    # Se alternan los dos casos para que el ruido de la máquina afecte a ambos por igual
+    built, cached = [], []
+    for _ in range(runs):
+        built.append(run_once(cmd, clear_cache=True))
+        cached.append(run_once(cmd, clear_cache=False))
+    return statistics.median(built), statistics.median(cached)
+
+def main():
+    cli = argparse.ArgumentParser(description='Cold-start time with and without cached parse tables')
+    cli.add_argument('-n', '--runs', type=int, default=20, help='Processes per case (default is 20)')
+    cli.add_argument('program', nargs='?', default=os.path.join('samples', 'hola.bas'), help='BASIC program to run')
+    args = cli.parse_args()
+
+    cases = [
+        ('import basparse', [sys.executable, '-c', 'import basparse']),
+        ('basic.py ' + args.program, [sys.executable, 'basic.py', args.program]),
+    ]
+    print(f'{"command":<32}{"tables built":>16}{"tables cached":>16}{"saved":>10}')
+    for name, cmd in cases:
+        built, cached = measure(cmd, args.runs)
+        print(f'{name:<32}{built * 1000:>14.1f}ms{cached * 1000:>14.1f}ms{(built - cached) * 1000:>8.1f}ms')
+
+if __name__ == '__main__':
+    main()
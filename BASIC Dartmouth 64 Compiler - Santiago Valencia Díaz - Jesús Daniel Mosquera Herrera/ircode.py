@@ -1,41 +1,131 @@
-from baslex import Lexer
-from basparse import Parser
+'''
+Generador de código intermedio (IR) para BASIC DARTMOUTH 64
+
+El programa se traduce a una lista de tuplas (opcode, *operandos) para la
+máquina de pila de basinterpir.py. Cada línea de BASIC empieza con un
+('LINE', lineno) y los saltos usan el número de línea de destino:
+
+  * Variables: GLOBAL_GET / GLOBAL_SET por nombre. El parámetro de un DEF
+    comparte la variable global del mismo nombre, como en el intérprete.
+  * Listas y tablas: DIM reserva memoria con GROW (números, 8 bytes por
+    elemento) o GROWS (strings); INDEX calcula la dirección de un elemento
+    y PEEKF/POKEF o PEEKS/POKES leen y escriben en ella.
+  * FOR/NEXT: los ciclos activos se llevan en tiempo de ejecución (FOR y
+    NEXT), igual que en los demás motores, porque un GOTO puede salir de
+    un ciclo o un NEXT compartir varios FOR.
+  * Cada DEF FN se genera como una función aparte (self.functions); los
+    argumentos y el resultado pasan por la pila.
+  * Los valores de DATA se juntan en self.data.
+
+Uso:
+
+    generator = IRGenerator()
+    code = generator.generate(program)
+'''
+
 from typing import Any, List, Dict
 from basast import *
+from basinterp import _flatten
+
+# Operadores de BASIC -> opcode. Los valores son dinámicos (números o
+# strings), así que se usan las operaciones de punto flotante
+BINARY_OPS = {
+    '+' : 'ADDF',
+    '-' : 'SUBF',
+    '*' : 'MULF',
+    '/' : 'DIVF',
+    '^' : 'POWF',
+    '=' : 'EQF',
+    '<>': 'NEF',
+    '<=': 'LEF',
+    '<' : 'LTF',
+    '>=': 'GEF',
+    '>' : 'GTF',
+}
 
 class IRGenerator:
-    def __init__(self):
+    def __init__(self, go_next = False, slicing = False):
         self.code = []
-        self.loop_stack = []
-        self.step_stack = []
-        self.data_stack = []
-        self.data_index = 0
+        self.functions = {}     # FN -> código de su cuerpo
+        self.data = []          # Valores de todas las instrucciones DATA
+        self.go_next = go_next
+        self.slicing = slicing
+        self.lines = []         # Números de línea en orden
+        self.lineno = None      # Línea que se está generando
 
     def visit(self, node, *args, **kwargs):
         method = 'visit_' + type(node).__name__
         visitor = getattr(self, method, self.generic_visit)
         return visitor(node, *args, **kwargs)
-    
+
     def generic_visit(self, node, *args, **kwargs):
         raise Exception("No visit_{} method".format(type(node).__name__))
 
     def visit_NoneType(self, node):
         pass
-    
+
     def visit_Program(self, node: Program):
         for line in sorted(node.lines.keys()):
+            self.lineno = line
+            self.code.append(('LINE', line))
             self.visit(node.lines[line])
-        
+
+    def error(self, message):
+        self.code.append(('ERROR', message))
+
+    def jump(self, opcode, target):
+        # Si la línea no existe y --go-next está activo, se salta a la siguiente
+        if target not in self.index:
+            if not self.go_next:
+                self.error(f"Undefined line {target} in GOTO instruction, located at line {self.lineno}")
+                return
+            target = self.lines[self.index[self.lineno] + 1]
+        self.code.append((opcode, target))
+
+    # Asignaciones
+    def store(self, target: Variable, value):
+        '''
+        Guarda en target el valor que deja en la pila value (una función que
+        genera el código); en listas y tablas el índice se evalúa primero
+        '''
+        if target.dim1 is None and target.dim2 is None:
+            value()
+            self.code.append(('GLOBAL_SET', target.var))
+            return
+        ndims = 1 if target.dim2 is None else 2
+        # Si la lista o tabla no fue declarada con DIM, se crea de tamaño 10
+        self.code.append(('AUTODIM', target.var, ndims))
+        self.address(target, ndims)
+        value()
+        self.code.append(('POKES' if target.var[-1] == '$' else 'POKEF', ))
+
+    def address(self, target: Variable, ndims):
+        self.visit(target.dim1)
+        if ndims == 2:
+            self.visit(target.dim2)
+        self.code.append(('INDEX', target.var, ndims))
+
+    # Instrucciones
     def visit_Let(self, node: Let):
-        self.visit(node.expr)
-        varname = node.var
-        self.code.append(('LOCAL_SET', varname.var))
+        if self.slicing:
+            self.error(f"Cannot proceed with LET instruction at line {self.lineno}. String slicing might be enabled.")
+            return
+        self.store(node.var, lambda: self.visit(node.expr))
 
     def visit_Read(self, node: Read):
-        pass
+        for target in node.varlist:
+            if target.var[-1] == '$':
+                if self.slicing:
+                    self.error(f"Cannot proceed with READ instruction at line {self.lineno}. String slicing might be enabled.")
+                self.store(target, lambda: self.code.append(('READS', )))
+            else:
+                self.store(target, lambda: self.code.append(('READF', )))
 
     def visit_Data(self, node: Data):
-        pass
+        pass    # Los valores se juntan en generate()
+
+    def visit_Restore(self, node: Restore):
+        self.code.append(('RESTORE', ))
 
     def visit_Group(self, node: Group):
         self.visit(node.expr)
@@ -43,116 +133,154 @@ class IRGenerator:
     def visit_IfStatement(self, node: IfStatement):
         self.visit(node.relexpr)
         self.code.append(('IF', ))
-        self.code.append(('JUMP', node.lineno))
+        self.jump('JUMP', node.lineno)
         self.code.append(('ENDIF', ))
-    
+
     def visit_Print(self, node: Print):
-        for expr in node.plist:
-            if isinstance(expr, String):
-                self.visit_String(expr)  # Visit the String node directly
-                self.code.append(('PRINTB', ))
+        for expr in _flatten(node.plist):
+            if not expr or expr == ';':
+                continue    # ';' no agrega espacio
+            if expr == ',':
+                self.code.append(('PAD', ))
             elif isinstance(expr, str):
-                for char in expr:
-                    self.code.append(('CONSTI', ord(char)))
-                    self.code.append(('PRINTB', ))
+                self.code.append(('CONSTS', expr))
+                self.code.append(('PRINT', ))
             else:
                 self.visit(expr)
-                self.code.append(('PRINTI', ))
+                self.code.append(('PRINT', ))
+        if (not node.plist) or node.plist[-1] not in (',', ';'):
+            self.code.append(('NEWLINE', ))
 
     def visit_list(self, nodes: List[Any]):
         for node in nodes:
             self.visit(node)
 
     def visit_String(self, node: String):
-        for char in node.value:
-            self.code.append(('CONSTI', ord(char)))
-            self.code.append(('PRINTB', ))
+        self.code.append(('CONSTS', node.value))
 
     def visit_Input(self, node: Input):
-        pass
+        self.code.append(('INPUT', node.label))
+        for target in node.vlist:
+            self.store(target, lambda: self.code.append(('INPUTV', target.var)))
 
     def visit_Goto(self, node: Goto):
-        self.code.append(('JUMP', node.lineno))
+        self.jump('JUMP', node.lineno)
 
     def visit_GoSub(self, node: GoSub):
-        self.code.append(('GOSUB', node.lineno))
+        self.jump('GOSUB', node.lineno)
 
     def visit_Return(self, node: Return):
         self.code.append(('RETGS', ))
-        
+
     def visit_Remark(self, node: Remark):
         pass  # No se necesita hacer nada específico para "Remark"
 
     def visit_For(self, node: For):
-        self.visit(node.low)
-        self.code.append(('LOCAL_SET', node.ident.var))
-
-        self.code.append(('LOOP', ))
-
+        # Límite y salto se evalúan una sola vez al entrar al ciclo
+        self.store(node.ident, lambda: self.visit(node.low))
         self.visit(node.top)
-        self.code.append(('CONSTI', 1))
-        self.code.append(('ADDI', ))
-        self.code.append(('LOCAL_GET', node.ident.var))
-        self.code.append(('LEI', ))
-        self.code.append(('CBREAK', ))
-
         if node.step:
             self.visit(node.step)
-            self.step_stack.append(node.step)
         else:
-            self.step_stack.append(1)
+            self.code.append(('CONSTI', 1))
+        self.code.append(('FOR', node.ident.var))
 
     def visit_Next(self, node: Next):
-        self.code.append(('LOCAL_GET', node.ident.var))
-        step = self.step_stack.pop()
-        self.code.append(('CONSTI', step))
-        self.code.append(('ADDI',))
-        self.code.append(('LOCAL_SET', node.ident.var))
-        self.code.append(('ENDLOOP',))
+        self.code.append(('NEXT', node.ident.var))
+
+    def visit_Dim(self, node: Dim):
+        for item in node.dimlist:
+            if self.slicing:
+                self.error(f"The dimension at line {self.lineno} could not be initialized. String slicing might be enabled.")
+            ndims = 1 if item.dim2 is None else 2
+            self.visit(item.dim1)
+            if ndims == 2:
+                self.visit(item.dim2)
+            # DIM deja en la pila el tamaño; GROW reserva la memoria y BIND
+            # guarda la dirección donde empieza el arreglo
+            self.code.append(('DIM', item.var, ndims))
+            self.code.append(('GROWS' if item.var[-1] == '$' else 'GROW', ))
+            self.code.append(('BIND', item.var, ndims))
 
     def visit_Binary(self, node: Binary):
         self.visit(node.left)
         self.visit(node.right)
-        op_map = {'+': 'ADDI', '-': 'SUBI', '*': 'MULI', '/': 'DIVI', '=': 'EQI', '<>': 'NEI', '<=': 'LEI', '<': 'LTI', '>=': 'GEI', '>': 'GTI'}
-        if node.op in op_map:
-            self.code.append((op_map[node.op],))
+        if node.op in BINARY_OPS:
+            self.code.append((BINARY_OPS[node.op],))
+        else:
+            self.error(f"Incorrect operator {node.op}")
 
     def visit_Logical(self, node: Logical):
-        self.visit(node.left)
-        self.visit(node.right)
-        op_map = {'=': 'EQI', '<>': 'NEI', '<=': 'LEI', '<': 'LTI', '>=': 'GEI', '>': 'GTI'}
-        if node.op in op_map:
-            self.code.append((op_map[node.op],))
-    
+        self.visit_Binary(node)
+
     def visit_Unary(self, node: Unary):
-        self.visit(node.expr)
         if node.op == '-':
+            self.visit(node.expr)
             self.code.append(('NEG',))
+        else:
+            self.code.append(('CONSTI', None))
 
     def visit_Variable(self, node: Variable):
-        self.code.append(('LOCAL_GET', node.var))
+        if node.dim1 is None and node.dim2 is None:
+            self.code.append(('GLOBAL_GET', node.var))
+            return
+        self.address(node, 1 if node.dim2 is None else 2)
+        self.code.append(('PEEKS' if node.var[-1] == '$' else 'PEEKF', ))
 
     def visit_Number(self, node: Number):
-        self.code.append(('CONSTI', node.value))
-    
+        self.code.append(('CONSTF' if isinstance(node.value, float) else 'CONSTI', node.value))
+
+    def visit_Bltin(self, node: Bltin):
+        args = node.expr
+        if isinstance(args, Node):
+            args = [args]
+        args = args or []
+        if node.name in ('MID$', 'mid$') and len(args) != 3:
+            self.error("Incorrect parameters for MID$")
+            return
+        for e in args:
+            self.visit(e)
+        self.code.append(('BLTIN', node.name, len(args)))
+
     def visit_Def(self, node: Def):
-        fname = node.fn.name
+        # El cuerpo del FN se genera como una función aparte
+        code, self.code = self.code, [('GLOBAL_SET', node.ident)]
         self.visit(node.expr)
-        self.code.append(('CALL', fname))
+        self.code.append(('RET', ))
+        self.functions[node.fn], self.code = self.code, code
 
     def visit_Call(self, node: Call):
-        for e in node.expr:
+        args = node.expr
+        if isinstance(args, Node):
+            args = [args]
+        for e in args:
             self.visit(e)
         self.code.append(('CALL', node.name))
 
     def visit_Stop(self, node: Stop):
-        self.code.append(('RET', ))
+        self.code.append(('END', ))
 
     def visit_End(self, node: End):
-        self.code.append(('RET', ))
+        self.code.append(('END', ))
+
+    def constant(self, item):
+        # Valor de un elemento de DATA: string, número o número negativo
+        if isinstance(item, str):
+            return item
+        if isinstance(item, Literal):
+            return item.value
+        if isinstance(item, Unary) and item.op == '-':
+            return - self.constant(item.expr)
+        if isinstance(item, Group):
+            return self.constant(item.expr)
+        raise Exception("DATA values must be constants, not {}".format(type(item).__name__))
 
     def generate(self, program):
-        for lineno, statement in program.lines.items():
-            self.code.append(('LINE', lineno))
-            self.visit(statement)
-        return self.code
\ No newline at end of file
+        lines = program.lines if isinstance(program, Program) else program
+        self.lines = sorted(lines)
+        self.index = {lineno: n for n, lineno in enumerate(self.lines)}
+        for lineno in self.lines:
+            if isinstance(lines[lineno], Data):
+                self.data.extend(self.constant(item) for item in lines[lineno].mixedlist)
+        self.visit(Program(lines))
+        return self.code
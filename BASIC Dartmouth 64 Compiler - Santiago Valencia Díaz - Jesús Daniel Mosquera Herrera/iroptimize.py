@@ -0,0 +1,348 @@
+# iroptimize.py
+
+'''
+Optimizador peephole del código IR (ircode.py)
+
+Se ejecuta entre IRGenerator.generate() y la carga en la máquina de pila
+(basinterpir). Cada regla de RULES mira las instrucciones a partir de una
+posición y, si reconoce su patrón, propone un reemplazo. Las pasadas se
+repiten hasta que ninguna regla cambia nada:
+
+  * constant folding: CONSTI 2; CONSTI 3; MULF -> CONSTI 6, y NEG de una
+    constante. Lo que fallaría (división por cero, tipos mezclados) no se
+    pliega, así el error se sigue reportando al ejecutar.
+  * store/load forwarding: GLOBAL_SET X; GLOBAL_GET X -> GLOBAL_TEE X, que
+    guarda el valor sin sacarlo de la pila. Puede cruzar el LINE de una
+    línea a la que no salta nadie.
+  * increment fusion: GLOBAL_GET X; CONSTI 1; ADDF; GLOBAL_SET X -> INCR X 1
+  * jump threading: un JUMP o GOSUB a una línea que empieza con otro JUMP
+    va directo al destino final y un JUMP a la línea siguiente se quita
+    (no con -t, que debe imprimir las líneas por las que pasa).
+  * dead code: lo que sigue a JUMP, RET, END o ERROR no se ejecuta hasta
+    la próxima línea a la que se salta o el próximo rótulo de un IF.
+
+Los LINE se dejan: son los rótulos de los saltos y la tabla de líneas de
+los mensajes de error. basinterpir los saca del código al cargarlo.
+
+Después, Fusion junta en superinstrucciones las secuencias que más se
+ejecutan (MULF_GLOBALS, ADDF_SET, GTF_JUMP, ...). Cuáles usar se decide con
+los pares de opcodes de una ejecución de perfilado guardados en irpairs.json
+(benchmarks/bench_pairs.py). Ningún patrón cruza un LINE, así que nunca se
+salta al medio de una superinstrucción.
+
+Uso:
+
+    peephole = Peephole()
+    code = peephole.optimize(code)
+    print(peephole.report())
+
+    fusion = Fusion.from_profile()
+    code = fusion.fuse(code)
+'''
+
+import os
+import json
+
+# Operaciones que se pueden plegar: las mismas de la máquina de pila
+from basinterpir import OPERATIONS as FOLD_OPS, COMPARISONS
+
+CONSTANTS = ('CONSTI', 'CONSTF', 'CONSTS')
+
+# Después de estas instrucciones no se sigue con la siguiente
+TERMINATORS = ('JUMP', 'RET', 'END', 'ERROR')
+
+# Rótulos de flujo de control: una región de código muerto termina en ellos
+CONTROL = ('ELSE', 'LOOP', 'CBREAK', 'ENDLOOP')
+
+def _is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+def _constant(value):
+    if isinstance(value, str):
+        return ('CONSTS', value)
+    return ('CONSTF' if isinstance(value, float) else 'CONSTI', value)
+
+# Reglas. Cada una recibe el optimizador, el código y una posición, y
+# retorna None o (cantidad de instrucciones que reemplaza, reemplazo)
+
+def fold_constants(peephole, code, i):
+    first = code[i]
+    if first[0] not in CONSTANTS or first[1] is None:
+        return None
+    second = code[i + 1] if i + 1 < len(code) else ('', )
+    try:
+        if second[0] == 'NEG':
+            return 2, [_constant(-first[1])]
+        third = code[i + 2] if i + 2 < len(code) else ('', )
+        if second[0] in CONSTANTS and second[1] is not None and third[0] in FOLD_OPS:
+            return 3, [_constant(FOLD_OPS[third[0]](first[1], second[1]))]
+    except (ArithmeticError, ValueError, TypeError):
+        pass
+    return None
+
+def fuse_increment(peephole, code, i):
+    window = code[i:i + 4]
+    if len(window) < 4:
+        return None
+    get, const, op, store = window
+    if get[0] != 'GLOBAL_GET' or store != ('GLOBAL_SET', get[1]):
+        return None
+    if const[0] not in ('CONSTI', 'CONSTF') or not _is_number(const[1]):
+        return None
+    if op[0] == 'ADDF':
+        step = const[1]
+    elif op[0] == 'SUBF' and const[1] != 0:
+        # X - 0 no se cambia por X + -0: con X = -0.0 el resultado sería 0.0
+        step = -const[1]
+    else:
+        return None
+    return 4, [('INCR', get[1], step)]
+
+def forward_store(peephole, code, i):
+    if code[i][0] != 'GLOBAL_SET':
+        return None
+    name = code[i][1]
+    j = i + 1
+    if j < len(code) and code[j][0] == 'LINE' and code[j][1] not in peephole.targets:
+        j += 1
+    if j < len(code) and code[j] == ('GLOBAL_GET', name):
+        return j - i + 1, [('GLOBAL_TEE', name)] + code[i + 1:j]
+    return None
+
+def thread_jump(peephole, code, i):
+    opcode, *args = code[i]
+    if opcode not in ('JUMP', 'GOSUB') or peephole.trace:
+        return None
+    target = args[0]
+    if opcode == 'JUMP':
+        # Un salto a la línea que sigue no hace falta
+        j = i + 1
+        while j < len(code) and code[j][0] == 'LINE':
+            if code[j][1] == target:
+                return 1, []
+            j += 1
+    seen = {target}
+    while True:
+        first = peephole.first(code, target)
+        if first is None or first[0] != 'JUMP' or first[1] in seen:
+            break
+        target = first[1]
+        seen.add(target)
+    if target == args[0]:
+        return None
+    return 1, [(opcode, target)]
+
+def remove_dead_code(peephole, code, i):
+    if code[i][0] not in TERMINATORS:
+        return None
+    # Un IF muerto se quita solo junto con su ENDIF
+    end = j = i + 1
+    depth = 0
+    while j < len(code):
+        opcode = code[j][0]
+        if opcode == 'LINE' and code[j][1] in peephole.targets or opcode in CONTROL:
+            break
+        if opcode == 'IF':
+            depth += 1
+        elif opcode == 'ENDIF':
+            if depth == 0:
+                break
+            depth -= 1
+        j += 1
+        if depth == 0:
+            end = j
+    if end == i + 1:
+        return None
+    return end - i, [code[i]]
+
+RULES = [
+    ('constant folding', fold_constants),
+    ('increment fusion', fuse_increment),
+    ('store/load forwarding', forward_store),
+    ('jump threading', thread_jump),
+    ('dead code', remove_dead_code),
+]
+
+class Peephole:
+    '''
+    Aplica RULES a uno o más cuerpos de código y lleva la cuenta de cuántas
+    veces se aplicó cada regla y cuántas instrucciones quitó
+    '''
+    def __init__(self, trace = False):
+        self.trace = trace
+        self.applied = {name: 0 for name, rule in RULES}
+        self.removed = {name: 0 for name, rule in RULES}
+        self.before = 0
+        self.after = 0
+        self.targets = set()  # Líneas a las que salta un JUMP o GOSUB
+        self.starts = { }     # Línea -> posición de su LINE
+
+    def optimize(self, code):
+        self.before += len(code)
+        changed = True
+        while changed:
+            code, changed = self.sweep(code)
+        self.after += len(code)
+        return code
+
+    def sweep(self, code):
+        '''
+        Una pasada por el código. Las reglas ven el código del principio de
+        la pasada; lo que habilite un reemplazo se toma en la siguiente.
+        '''
+        self.targets = {inst[1] for inst in code if inst[0] in ('JUMP', 'GOSUB')}
+        self.starts = {inst[1]: n for n, inst in enumerate(code) if inst[0] == 'LINE'}
+        result = []
+        changed = False
+        i = 0
+        while i < len(code):
+            for name, rule in RULES:
+                match = rule(self, code, i)
+                if match is not None:
+                    size, replacement = match
+                    self.applied[name] += 1
+                    self.removed[name] += size - len(replacement)
+                    result.extend(replacement)
+                    i += size
+                    changed = True
+                    break
+            else:
+                result.append(code[i])
+                i += 1
+        return result, changed
+
+    def first(self, code, lineno):
+        # Primera instrucción que se ejecuta al saltar a la línea lineno
+        n = self.starts.get(lineno)
+        if n is None:
+            return None
+        while n < len(code) and code[n][0] == 'LINE':
+            n += 1
+        return code[n] if n < len(code) else None
+
+    def report(self):
+        text = [f'IR peephole: {self.before} -> {self.after} instructions']
+        text.append(f'  {"Rule":<24}{"Applied":>9}{"Removed":>9}')
+        for name, rule in RULES:
+            text.append(f'  {name:<24}{self.applied[name]:>9}{self.removed[name]:>9}')
+        return '\n'.join(text)
+
+# Superinstrucciones: secuencias frecuentes que la máquina de pila ejecuta
+# como una sola instrucción (basinterpir._superinstructions)
+
+# Pares de opcodes de una ejecución de perfilado (benchmarks/bench_pairs.py)
+PAIRS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'irpairs.json')
+
+# Familias: nombre, patrón y cola. En el patrón OP es cualquier operación
+# de FOLD_OPS, CMP una comparación y CONST una constante. La cola es parte
+# de la superinstrucción pero no cuenta para elegirla: cuando el IF no salta
+# no se ejecutan ni el JUMP ni el ENDIF
+FAMILIES = [
+    ('{}_GLOBAL_CONST_JUMP', ('GLOBAL_GET', 'CONST', 'CMP', 'IF'), ('JUMP', 'ENDIF')),
+    ('{}_CONST_JUMP', ('CONST', 'CMP', 'IF'), ('JUMP', 'ENDIF')),
+    ('{}_JUMP', ('CMP', 'IF'), ('JUMP', 'ENDIF')),
+    ('{}_GLOBALS', ('GLOBAL_GET', 'GLOBAL_GET', 'OP'), ()),
+    ('{}_GLOBAL_SET', ('GLOBAL_GET', 'OP', 'GLOBAL_SET'), ()),
+    ('{}_GLOBAL', ('GLOBAL_GET', 'OP'), ()),
+    ('{}_CONST', ('CONST', 'OP'), ()),
+    ('{}_SET', ('OP', 'GLOBAL_SET'), ()),
+]
+
+WILDCARDS = {
+    'OP'   : tuple(FOLD_OPS),
+    'CMP'  : COMPARISONS,
+    'CONST': ('CONSTI', 'CONSTF', 'CONSTS'),
+}
+
+class Superinstruction:
+    '''
+    Una familia aplicada a una operación concreta, por ejemplo MULF_GLOBALS
+    para GLOBAL_GET a; GLOBAL_GET b; MULF. Sus operandos son los de las
+    instrucciones que reemplaza, en orden.
+    '''
+    def __init__(self, name, pattern, tail):
+        self.name = name
+        self.pattern = pattern      # Opcodes posibles en cada posición
+        self.tail = tail
+        self.size = len(pattern) + len(tail)
+
+    def score(self, pairs):
+        # Veces que se ejecutó la secuencia, acotadas por su par menos frecuente
+        return min(sum(pairs.get((a, b), 0) for a in first for b in second)
+                   for first, second in zip(self.pattern, self.pattern[1:]))
+
+    def match(self, code, i):
+        window = code[i:i + self.size]
+        if len(window) < self.size:
+            return False
+        for inst, allowed in zip(window, self.pattern + self.tail):
+            if inst[0] not in allowed or (inst[0] in WILDCARDS['CONST'] and inst[1] is None):
+                return False
+        return True
+
+    def build(self, code, i):
+        return (self.name, *(arg for inst in code[i:i + self.size] for arg in inst[1:]))
+
+def candidates():
+    for template, pattern, tail in FAMILIES:
+        wildcard = 'CMP' if 'CMP' in pattern else 'OP'
+        for op in WILDCARDS[wildcard]:
+            concrete = tuple((op, ) if item == wildcard else WILDCARDS.get(item, (item, )) for item in pattern)
+            yield Superinstruction(template.format(op), concrete, tuple((item, ) for item in tail))
+
+def load_pairs(fname = PAIRS_FILE):
+    '''
+    Pares de opcodes -> veces que se ejecutaron seguidos. Sin archivo no
+    hay perfil y no se elige ninguna superinstrucción.
+    '''
+    try:
+        with open(fname, encoding='utf-8') as fin:
+            profile = json.load(fin)
+    except OSError:
+        return {}
+    return {(first, second): count for first, second, count in profile['pairs']}
+
+def select(pairs, share = 0.005, limit = 16):
+    '''
+    Las superinstrucciones más ejecutadas según el perfil: hasta limit, y
+    solo las que cubren al menos share del total de pares
+    '''
+    total = sum(pairs.values())
+    ranked = sorted(((sup.score(pairs), sup) for sup in candidates()), key = lambda item: -item[0])
+    return [sup for score, sup in ranked[:limit] if total and score >= share * total]
+
+class Fusion:
+    '''
+    Reemplaza las secuencias de las superinstrucciones elegidas. Se prueba
+    primero la más larga, de izquierda a derecha y en una sola pasada.
+    '''
+    def __init__(self, selected):
+        self.selected = sorted(selected, key = lambda sup: -sup.size)
+        self.applied = {sup.name: 0 for sup in selected}
+        self.removed = 0
+
+    @classmethod
+    def from_profile(cls, fname = PAIRS_FILE):
+        return cls(select(load_pairs(fname)))
+
+    def fuse(self, code):
+        result = []
+        i = 0
+        while i < len(code):
+            for sup in self.selected:
+                if sup.match(code, i):
+                    result.append(sup.build(code, i))
+                    self.applied[sup.name] += 1
+                    self.removed += sup.size - 1
+                    i += sup.size
+                    break
+            else:
+                result.append(code[i])
+                i += 1
+        return result
+
+    def report(self):
+        text = [f'IR superinstructions: {self.removed} instructions removed']
+        for sup in self.selected:
+            text.append(f'  {sup.name:<24}{self.applied[sup.name]:>9}')
+        return '\n'.join(text)
@@ -0,0 +1,615 @@
+import io
+import os
+import json
+import sys
+import subprocess
+import tempfile
+import unittest
+from contextlib import redirect_stdout, redirect_stderr
+from textwrap import dedent
+
+from sly.yacc import SlyLogger
+
+from baslex import Lexer
+from basparse import Parser, grammar_hash, load_tables
+from basinterp import Interpreter, RunConfig, CompiledProgram
+from basresolve import Resolver
+from basoptimize import Optimizer
+from bascontext import Context
+from bastypes import TypeInference, NUM, STR
+from baspython import PythonGenerator, PythonProgram
+from basast import Binary, Number, Variable
+from ircode import IRGenerator
+from iroptimize import Peephole, Fusion, select
+
+def run_program(source, engine='closure', array_base=1, go_next=False):
+    ast = Parser().parse(Lexer().tokenize(dedent(source).lstrip()))
+    prog = ast.lines
+    if engine == 'python':
+        prog = PythonGenerator.generate(prog, 'test.bas', array_base, False, go_next, False)
+    out = io.StringIO()
+    with redirect_stdout(out):
+        Interpreter.interpret(prog, verbose=False, uppercase=False, array_base=array_base, slicing=False, go_next=go_next, trace=False, tabs=15, random_seed=None, fname='test.bas', print_stats=False, write_stats=False, input_file=None, engine=engine)
+    return out.getvalue()
+
+class TestEngines(unittest.TestCase):
+
+    def assertSameOutput(self, program, expected):
+        for engine in ('closure', 'visitor', 'python', 'ir'):
+            self.assertEqual(run_program(program, engine=engine), expected)
+
+    def test_arithmetic_and_print(self):
+        program = """
+        10 LET X = 5
+        20 LET Y = (X + 1) * 2 ^ 2
+        30 PRINT X, Y; "OK"
+        40 END
+        """
+        self.assertSameOutput(program, '5              24OK\n')
+
+    def test_print_string_then_expression(self):
+        # El parser anida el pitem que sigue a un string sin separador
+        program = """
+        10 LET X = 7
+        20 PRINT "X = "X
+        30 PRINT "X = "X; "Y"; X + 1
+        40 END
+        """
+        self.assertSameOutput(program, 'X = 7\nX = 7Y8\n')
+
+    def test_for_next_and_arrays(self):
+        program = """
+        10 DIM A(5)
+        20 FOR I = 1 TO 5
+        30   LET A(I) = I * I
+        40 NEXT I
+        50 LET S = 0
+        60 FOR I = 5 TO 1 STEP -1
+        70   LET S = S + A(I)
+        80 NEXT I
+        90 PRINT S
+        100 END
+        """
+        self.assertSameOutput(program, '55\n')
+
+    def test_for_limit_and_step_evaluated_once(self):
+        program = """
+        10 LET N = 3
+        20 LET S = 1
+        30 FOR I = 1 TO N STEP S
+        40   LET N = 10
+        50   LET S = 5
+        60   PRINT I;
+        70 NEXT I
+        80 PRINT
+        90 END
+        """
+        self.assertSameOutput(program, '123\n')
+
+    def test_typed_arrays(self):
+        program = """
+        10 DIM T(2, 3), N$(2)
+        20 FOR I = 0 TO 2
+        30   FOR J = 0 TO 3
+        40     LET T(I, J) = 10 * I + J
+        50   NEXT J
+        60 NEXT I
+        70 LET N$(0) = "A"
+        80 PRINT T(2, 3); T(1, 0); N$(0); N$(1); "!"
+        90 END
+        """
+        for engine in ('closure', 'visitor', 'python', 'ir'):
+            self.assertEqual(run_program(program, engine=engine, array_base=0), '2310A!\n')
+
+    def test_array_values_as_string_arguments(self):
+        # Los arreglos numéricos devuelven floats; CHR$, MID$, LEFT$, RIGHT$ y TAB esperan enteros
+        program = """
+        10 DIM A(3)
+        20 LET A(1) = 65
+        30 LET A(2) = 3
+        40 PRINT CHR$(A(1)); MID$("HELLO", A(1) - 63, 2); LEFT$("HELLO", A(1) - 62); RIGHT$("HELLO", A(2)); TAB(A(2)); "!"
+        50 END
+        """
+        self.assertSameOutput(program, 'AELHELLLO   !\n')
+
+    def test_read_data_gosub_and_functions(self):
+        program = """
+        10 DEF FND(X) = 2 * X
+        20 READ A, B$
+        30 GOSUB 100
+        40 PRINT B$; FND(A)
+        50 GOTO 999
+        100 LET A = A + 1
+        110 RETURN
+        120 DATA 20, "N="
+        999 END
+        """
+        self.assertSameOutput(program, 'N=42\n')
+
+    def test_goto_out_of_inner_loop(self):
+        program = """
+        10 FOR Y = 1 TO 3
+        20   FOR X = 1 TO 10
+        30     IF X = 2 THEN 50
+        40   NEXT X
+        50   PRINT Y; X;
+        60 NEXT Y
+        70 PRINT
+        80 END
+        """
+        self.assertEqual(run_program(program), '122232\n')
+
+    def test_go_next_on_undefined_line(self):
+        program = """
+        10 GOSUB 40
+        20 GOTO 25
+        30 PRINT "NEXT"
+        35 GOTO 99
+        40 PRINT "SUB"
+        50 RETURN
+        99 END
+        """
+        for engine in ('closure', 'visitor', 'python', 'ir'):
+            self.assertEqual(run_program(program, engine=engine, go_next=True), 'SUB\nNEXT\n')
+
+    def test_nested_and_recursive_gosub(self):
+        program = """
+        10 LET N = 4
+        20 GOSUB 100
+        30 PRINT "DONE"
+        40 GOTO 999
+        100 PRINT N;
+        110 LET N = N - 1
+        120 IF N = 0 THEN 140
+        130 GOSUB 100
+        140 GOSUB 200
+        150 RETURN
+        200 PRINT "*";
+        210 RETURN
+        999 END
+        """
+        self.assertSameOutput(program, '4321****DONE\n')
+
+    def test_gosub_depth_limit(self):
+        program = """
+        10 GOSUB 10
+        20 END
+        """
+        for engine in ('closure', 'visitor', 'python', 'ir'):
+            err = io.StringIO()
+            with redirect_stderr(err):
+                run_program(program, engine=engine)
+            self.assertEqual(err.getvalue(), 'GOSUB nested more than 256 levels at line 10')
+
+    def test_division_by_zero_reports_line(self):
+        program = """
+        10 LET A = 1
+        20 LET B = 0
+        30 PRINT A / B
+        40 END
+        """
+        for engine in ('closure', 'visitor', 'python', 'ir'):
+            err = io.StringIO()
+            with redirect_stderr(err):
+                run_program(program, engine=engine)
+            self.assertEqual(err.getvalue(), 'division by zero at line 30')
+
+    def test_print_wraps_at_80_columns(self):
+        program = """
+        10 FOR I = 1 TO 6
+        20   PRINT "ABCDEFGHIJKLMNOP",
+        30 NEXT I
+        40 PRINT
+        50 END
+        """
+        expected = ('ABCDEFGHIJKLMNOP              ' * 2 + 'ABCDEFGHIJKLMNOP    \n') * 2 + '\n'
+        self.assertSameOutput(program, expected)
+
+class TestPythonBackend(unittest.TestCase):
+
+    def test_runtime_error_reports_basic_line(self):
+        program = """
+        10 DIM A(3)
+        20 LET A(4) = 1
+        30 END
+        """
+        err = io.StringIO()
+        with redirect_stderr(err):
+            run_program(program, engine='python')
+        self.assertEqual(err.getvalue(), 'Index of A is out of bounds at line 20')
+
+    def test_cache_keyed_by_source_and_flags(self):
+        ast = Parser().parse(Lexer().tokenize('10 PRINT "HI"\n20 END\n'))
+        program = PythonGenerator.generate(ast.lines, 'hi.bas', 1, False, False, False)
+        with tempfile.TemporaryDirectory() as tmp:
+            fname = os.path.join(tmp, 'hi.bas')
+            key = PythonProgram.cache_key('source', array_base=1)
+            self.assertIsNone(PythonProgram.load(fname, key))
+            program.save(fname, key)
+            cached = PythonProgram.load(fname, key)
+            self.assertEqual(cached.code, program.code)
+            self.assertEqual(cached.linemap, program.linemap)
+            self.assertIsNone(PythonProgram.load(fname, PythonProgram.cache_key('source', array_base=0)))
+
+class TestIRBackend(unittest.TestCase):
+
+    # time.bas imprime tiempos medidos y sin.bas no termina
+    skip = {'time.bas', 'sin.bas'}
+    inputs = {'game.bas': 'game_input.txt', 'calendar.bas': 'game_input.txt', 'pi_spigot.bas': 'game_input.txt'}
+
+    def run_sample(self, fname, engine):
+        with open(fname, encoding='utf-8') as fin:
+            ast = Parser().parse(Lexer().tokenize(fin.read()))
+        finput = os.path.join(os.path.dirname(fname), self.inputs.get(os.path.basename(fname), 'input_test.txt'))
+        out = io.StringIO()
+        with redirect_stdout(out), redirect_stderr(out):
+            CompiledProgram(ast.lines, RunConfig(fname=fname, engine=engine)).run(input_file=finput, random_seed=1)
+        return out.getvalue()
+
+    def test_samples_match_closure_engine(self):
+        # El visitor es el motor de referencia: también debe coincidir, incluidos los mensajes de error
+        folder = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'samples')
+        for name in sorted(os.listdir(folder)):
+            if name.endswith('.bas') and name not in self.skip:
+                fname = os.path.join(folder, name)
+                expected = self.run_sample(fname, 'closure')
+                for engine in ('ir', 'visitor'):
+                    with self.subTest(sample=name, engine=engine):
+                        self.assertEqual(self.run_sample(fname, engine), expected)
+
+    def test_runtime_error_reports_basic_line(self):
+        program = """
+        10 DIM A(3)
+        20 LET A(4) = 1
+        30 END
+        """
+        err = io.StringIO()
+        with redirect_stderr(err):
+            run_program(program, engine='ir')
+        self.assertEqual(err.getvalue(), 'Index of A is out of bounds at line 20')
+
+class TestIRPeephole(unittest.TestCase):
+
+    program = """
+    10 LET A = 2 * 3 + -1
+    20 LET B = A
+    30 LET B = B + 1
+    40 IF B < 9 THEN 30
+    50 GOTO 80
+    60 PRINT "DEAD"
+    70 END
+    80 GOTO 90
+    90 PRINT A; B
+    100 END
+    """
+
+    def test_rules(self):
+        ast = Parser().parse(Lexer().tokenize(dedent(self.program).lstrip()))
+        peephole = Peephole()
+        code = peephole.optimize(IRGenerator().generate(ast.lines))
+        self.assertIn(('CONSTI', 5), code)
+        self.assertIn(('GLOBAL_TEE', 'A'), code)
+        self.assertIn(('INCR', 'B', 1), code)
+        self.assertNotIn(('CONSTS', 'DEAD'), code)
+        self.assertNotIn(('JUMP', 80), code)
+        self.assertNotIn(('JUMP', 90), code)
+        self.assertEqual(peephole.removed, {'constant folding': 5, 'increment fusion': 3, 'store/load forwarding': 1,
+                                            'jump threading': 2, 'dead code': 7})
+        self.assertEqual(peephole.before - peephole.after, 18)
+
+    def test_same_output(self):
+        self.assertEqual(run_program(self.program, engine='ir'), run_program(self.program))
+
+    def test_superinstructions_from_pair_profile(self):
+        pairs = {('GLOBAL_GET', 'GLOBAL_GET'): 100, ('GLOBAL_GET', 'MULF'): 100, ('GLOBAL_GET', 'CONSTI'): 60,
+                 ('CONSTI', 'LTF'): 60, ('LTF', 'IF'): 60, ('ADDF', 'GLOBAL_SET'): 1}
+        selected = select(pairs)
+        self.assertEqual({sup.name for sup in selected}, {'MULF_GLOBALS', 'MULF_GLOBAL', 'LTF_GLOBAL_CONST_JUMP',
+                                                          'LTF_CONST_JUMP', 'LTF_JUMP', 'LTF_CONST'})
+        program = """
+        10 LET A = 3
+        20 LET B = 0
+        30 LET B = B + A * A
+        40 IF B < 50 THEN 30
+        50 PRINT B
+        60 END
+        """
+        ast = Parser().parse(Lexer().tokenize(dedent(program).lstrip()))
+        fusion = Fusion(selected)
+        code = fusion.fuse(IRGenerator().generate(ast.lines))
+        self.assertIn(('MULF_GLOBALS', 'A', 'A'), code)
+        self.assertIn(('LTF_GLOBAL_CONST_JUMP', 'B', 50, 30), code)
+        self.assertIn(('ADDF', ), code)
+        self.assertEqual(fusion.removed, 7)
+        self.assertEqual(run_program(program, engine='ir'), run_program(program))
+
+class TestParserTables(unittest.TestCase):
+
+    def test_cached_tables_match_parser(self):
+        cached = load_tables(grammar_hash(Parser._grammar))
+        self.assertIsNotNone(cached)
+        self.assertEqual(cached.lr_action, Parser._lrtable.lr_action)
+        self.assertEqual(cached.lr_goto, Parser._lrtable.lr_goto)
+        self.assertEqual(cached.defaulted_states, Parser._lrtable.defaulted_states)
+
+    def test_stale_cache_is_ignored(self):
+        self.assertIsNone(load_tables(b'not the grammar hash'))
+        self.assertEqual(len(grammar_hash(Parser._grammar)), 32)
+
+    def test_cached_conflicts_are_reported(self):
+        cached = load_tables(grammar_hash(Parser._grammar))
+        self.assertEqual(len(cached.sr_conflicts), Parser.expected_shift_reduce)
+        log, Parser.log = Parser.log, SlyLogger(io.StringIO())
+        try:
+            Parser.report_conflicts(cached)
+            self.assertEqual(Parser.log.f.getvalue(), '')
+            cached.sr_conflicts.append((0, 'NEWLINE', 'shift'))
+            Parser.report_conflicts(cached)
+            self.assertEqual(Parser.log.f.getvalue(), 'WARNING: 3 shift/reduce conflicts\n')
+        finally:
+            Parser.log = log
+
+class TestStartup(unittest.TestCase):
+
+    def test_heavy_modules_are_lazy(self):
+        code = 'import sys, bascontext; print(sorted({"rich", "graphviz", "psutil", "basrender"} & set(sys.modules)))'
+        here = os.path.dirname(os.path.abspath(__file__))
+        out = subprocess.run([sys.executable, '-c', code], cwd=here, capture_output=True, text=True, check=True)
+        self.assertEqual(out.stdout.strip(), '[]')
+
+class TestCompiledProgram(unittest.TestCase):
+
+    program = """
+    10 INPUT A, B
+    20 IF A > 0 THEN 40
+    30 DEF FNF(X) = X * 100
+    40 GOSUB 100
+    50 PRINT A + B; INT(RND(1) * 1000)
+    60 GOTO 999
+    100 FOR I = 1 TO 3
+    110   LET L(I) = A + I
+    120 NEXT I
+    130 RETURN
+    999 END
+    """
+
+    def run_many(self, engine):
+        ast = Parser().parse(Lexer().tokenize(dedent(self.program).lstrip()))
+        prog = ast.lines
+        if engine == 'python':
+            prog = PythonGenerator.generate(prog, 'test.bas', 1, False, False, False)
+        compiled = CompiledProgram(prog, RunConfig(engine=engine))
+        results = []
+        for inputs, seed in ((['1', '2'], 7), (['10', '20'], 8), (['1', '2'], 7)):
+            out = io.StringIO()
+            with redirect_stdout(out):
+                compiled.run(input_lines=inputs, random_seed=seed)
+            results.append(out.getvalue())
+        return results
+
+    def test_run_many_times(self):
+        for engine in ('closure', 'visitor', 'python', 'ir'):
+            first, second, again = self.run_many(engine)
+            self.assertTrue(first.startswith('3'))
+            self.assertTrue(second.startswith('30'))
+            self.assertEqual(first, again)
+
+class TestProfiler(unittest.TestCase):
+
+    def test_hits_and_gosub_time(self):
+        program = """
+        10 FOR I = 1 TO 3
+        20   GOSUB 100
+        30 NEXT I
+        40 GOTO 999
+        100 LET X = I * 2
+        110 RETURN
+        999 END
+        """
+        ast = Parser().parse(Lexer().tokenize(dedent(program).lstrip()))
+        for engine in ('closure', 'visitor'):
+            compiled = CompiledProgram(ast.lines, RunConfig(engine=engine, fname='prof.bas', profile=True))
+            cwd = os.getcwd()
+            with tempfile.TemporaryDirectory() as tmp:
+                os.chdir(tmp)
+                try:
+                    with redirect_stdout(io.StringIO()):
+                        compiled.run()
+                    with open('prof_profile.json') as f:
+                        profile = json.load(f)
+                    self.assertTrue(os.path.exists('prof_profile.txt'))
+                finally:
+                    os.chdir(cwd)
+            lines = {row['line']: row for row in profile['lines']}
+            self.assertEqual({line: row['hits'] for line, row in lines.items()}, {10: 1, 20: 3, 30: 3, 40: 1, 100: 3, 110: 3, 999: 1})
+            self.assertGreaterEqual(lines[20]['cum_ns'], lines[100]['self_ns'] + lines[110]['self_ns'])
+            self.assertEqual({row['statement']: row['hits'] for row in profile['statements']}['Return'], 3)
+
+    def test_trace_with_profile(self):
+        ast = Parser().parse(Lexer().tokenize('10 PRINT "A"\n20 END\n'))
+        for engine in ('closure', 'visitor'):
+            out = io.StringIO()
+            cwd = os.getcwd()
+            with tempfile.TemporaryDirectory() as tmp:
+                os.chdir(tmp)
+                try:
+                    with redirect_stdout(out):
+                        CompiledProgram(ast.lines, RunConfig(engine=engine, fname='prof.bas', trace=True, profile=True)).run()
+                finally:
+                    os.chdir(cwd)
+            self.assertTrue(out.getvalue().startswith('Executing line 10\nA\nExecuting line 20\n'))
+
+class TestStatistics(unittest.TestCase):
+
+    def test_counters(self):
+        program = """
+        10 FOR I = 1 TO 3
+        20   GOSUB 100
+        30 NEXT I
+        40 GOTO 999
+        100 PRINT I;
+        110 RETURN
+        999 END
+        """
+        ast = Parser().parse(Lexer().tokenize(dedent(program).lstrip()))
+        for engine in ('closure', 'visitor'):
+            out = io.StringIO()
+            with redirect_stdout(out):
+                CompiledProgram(ast.lines, RunConfig(engine=engine, print_stats=True)).run()
+            stats = dict(line.split(': ') for line in out.getvalue().splitlines()[1:] if ': ' in line)
+            self.assertEqual(stats['Statements executed'], '15')
+            self.assertEqual(stats['Branches taken'], '9')
+            self.assertEqual(stats['GOSUB calls'], '3')
+            self.assertEqual(stats['Expression nodes (estimated)'], '9')
+            self.assertEqual(stats['PRINT bytes written'], '3')
+            phases = [line.split()[0] for line in out.getvalue().splitlines() if line.startswith('  ')]
+            self.assertEqual(phases, ['resolve', 'collect_data', 'check_end', 'check_loops', 'build_jumps'] + (['compile'] if engine == 'closure' else []) + ['run', 'output_flush'])
+
+    def test_trace_with_stats(self):
+        ast = Parser().parse(Lexer().tokenize('10 PRINT "A"\n20 END\n'))
+        for engine in ('closure', 'visitor'):
+            out = io.StringIO()
+            with redirect_stdout(out):
+                CompiledProgram(ast.lines, RunConfig(engine=engine, trace=True, print_stats=True)).run()
+            self.assertTrue(out.getvalue().startswith('Executing line 10\nA\nExecuting line 20\n'))
+
+    def test_json_on_error_exit(self):
+        ast = Parser().parse(Lexer().tokenize('10 PRINT "A"\n20 GOTO 30\n40 END\n'))
+        out = io.StringIO()
+        with redirect_stdout(out), redirect_stderr(io.StringIO()):
+            CompiledProgram(ast.lines, RunConfig(print_stats=True, stats_format='json')).run()
+        stats = json.loads(out.getvalue()[2:])
+        self.assertEqual(stats['schema'], 2)
+        self.assertEqual(stats['exit'], 'error')
+        self.assertEqual(stats['counters']['statements_executed'], 2)
+        self.assertEqual(stats['counters']['print_bytes_written'], 2)
+        self.assertEqual(set(stats), {'schema', 'program', 'engine', 'flags', 'exit', 'started_at', 'elapsed_ns', 'peak_memory_bytes', 'phases_ns', 'counters'})
+
+class TestResolver(unittest.TestCase):
+
+    def test_slots_per_namespace(self):
+        program = dedent("""
+        10 DIM A(3), B(2, 2)
+        20 LET A = 1
+        30 LET A(1) = A
+        40 DEF FNF(X) = X + B(1, 1)
+        50 END
+        """).lstrip()
+        ast = Parser().parse(Lexer().tokenize(program))
+        symtab = Resolver.resolve(ast.lines)
+        self.assertEqual(symtab.lists, {'A': 0})
+        self.assertEqual(symtab.tables, {'B': 1})
+        self.assertEqual(symtab.scalars, {'A': 2, 'X': 3})
+        self.assertEqual(ast.lines[30].var.slot, 0)
+        self.assertEqual(ast.lines[30].expr.slot, 2)
+        self.assertEqual(ast.lines[40].slot, 3)
+
+class TestLoopTables(unittest.TestCase):
+
+    def prepare(self, program):
+        ast = Parser().parse(Lexer().tokenize(dedent(program).lstrip()))
+        interp = Interpreter(ast.lines)
+        interp.prepare()
+        return interp
+
+    def test_for_next_tables(self):
+        interp = self.prepare("""
+        10 FOR I = 1 TO 2
+        20   FOR J = 1 TO 2
+        30   NEXT J
+        40   FOR I = 1 TO 3
+        50 NEXT I
+        60 END
+        """)
+        self.assertEqual(interp.check_loops(), {0: 4, 1: 2, 3: 4})
+
+    def test_for_without_next(self):
+        err = io.StringIO()
+        with redirect_stderr(err):
+            run_program("""
+            10 FOR I = 1 TO 2
+            20 FOR J = 1 TO 2
+            30 NEXT I
+            40 END
+            """)
+        self.assertEqual(err.getvalue(), 'FOR without NEXT at line 20')
+
+class TestTypeInference(unittest.TestCase):
+
+    def test_types_by_slot(self):
+        ast = Parser().parse(Lexer().tokenize(dedent("""
+        10 DEF FNA(X) = X * 2
+        20 LET A = FNA(3) + 1
+        30 LET B = 1
+        40 LET B = "X"
+        50 LET N$ = "A" + "B"
+        60 LET C = A - B
+        70 END
+        """).lstrip()))
+        symtab = Resolver.resolve(ast.lines)
+        slots = TypeInference.infer(ast.lines)
+        self.assertEqual(slots[symtab.scalars['A']], NUM)
+        self.assertEqual(slots[symtab.scalars['B']], None)
+        self.assertEqual(slots[symtab.scalars['N$']], STR)
+        self.assertEqual(ast.lines[20].expr.type, NUM)
+        self.assertEqual(ast.lines[50].expr.type, STR)
+        self.assertIsNone(ast.lines[60].expr.type)
+
+    def test_unproven_operations_keep_checks(self):
+        program = """
+        10 LET A = "X"
+        20 LET B = 1
+        30 PRINT B + 1
+        40 PRINT A + 1
+        50 END
+        """
+        for engine in ('closure', 'visitor'):
+            err = io.StringIO()
+            with redirect_stderr(err):
+                self.assertEqual(run_program(program, engine=engine), '2\n')
+            self.assertEqual(err.getvalue(), '+ The operands must be numeric')
+
+class TestOptimizer(unittest.TestCase):
+
+    def parse(self, program):
+        return Parser().parse(Lexer().tokenize(dedent(program).lstrip()))
+
+    def test_folding_and_groups(self):
+        ast = self.parse("""
+        10 LET A = (2 * 3) + -(1)
+        20 LET B = X ^ 2
+        30 LET C = SQR(16) + RND(1)
+        40 LET D = 1 / 0
+        50 END
+        """)
+        removed = Optimizer.optimize(ast.lines)
+        self.assertEqual(ast.lines[10].expr, Number(5))
+        self.assertEqual(ast.lines[20].expr, Binary('*', Variable('X'), Variable('X')))
+        self.assertEqual(ast.lines[30].expr.left, Number(4.0))
+        self.assertIsInstance(ast.lines[40].expr, Binary)
+        self.assertEqual(removed, 8)
+
+    def test_same_output(self):
+        program = """
+        10 LET X = 3
+        20 PRINT (X + 1) ^ 2; X ^ 2; 180.0 / 3.141592654 * 0; LEFT$("AB" + "CD", 3)
+        30 END
+        """
+        ast = self.parse(program)
+        Optimizer.optimize(ast.lines)
+        out = io.StringIO()
+        with redirect_stdout(out):
+            Interpreter.interpret(ast.lines, verbose=False, uppercase=False, array_base=1, slicing=False, go_next=False, trace=False, tabs=15, random_seed=None, fname='test.bas', print_stats=False, write_stats=False, input_file=None)
+        self.assertEqual(out.getvalue(), run_program(program))
+
+    def test_report_goes_to_stderr(self):
+        context = Context()
+        context.parse('10 LET A = 2 * 3\n20 END\n')
+        out, err = io.StringIO(), io.StringIO()
+        with redirect_stdout(out), redirect_stderr(err):
+            context.optimize()
+        self.assertEqual(out.getvalue(), '')
+        self.assertEqual(err.getvalue(), 'Optimizer: 2 AST nodes removed\n')
+
+if __name__ == '__main__':
+    unittest.main()